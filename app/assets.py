@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# app/assets.py
+# 静的ファイルの指紋付き配信。
+# - build()：app/static の各ファイルを内容ハッシュ付きの名前で app/static/dist へコピーし、
+#   .gz（と brotli があれば .br）を事前に作って manifest.json（元の名前 → 指紋付きの名前）を書く
+# - StaticAssets：/static のマウント。指紋付きの名前は起動時に読んだ manifest の索引だけで返す
+#   （リクエストごとの stat なし）。Accept-Encoding で .br / .gz を選び、Cache-Control: immutable を付ける。
+#   索引にない名前は従来どおり StaticFiles（再検証あり）
+# - asset_url("app.css")：テンプレートから指紋付きの URL を引く（manifest が無ければ素の /static/…）
+#   python -m app.assets [--clean]   （起動時も manifest が無いか古ければ自動で作る）
+
+import argparse, gzip, hashlib, json, mimetypes, os, shutil
+from pathlib import Path
+from typing import Optional
+
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+
+from .compression import accepted_encodings
+
+try:
+    import brotli  # 任意（無ければ .br は作らない）
+except ImportError:
+    brotli = None
+
+STATIC_DIR = Path("app/static")
+DIST = "dist"
+MANIFEST = "manifest.json"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# 圧縮してもこれより小さくならないものは圧縮版を作らない
+MIN_SAVING = 0.9
+
+
+def _sources(root: Path):
+    for p in sorted(root.rglob("*")):
+        if p.is_file() and DIST not in p.relative_to(root).parts:
+            yield p
+
+
+def _fingerprint(rel: Path, data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    return (rel.parent / f"{rel.stem}.{digest}{rel.suffix}").as_posix()
+
+
+def build(root: Path = STATIC_DIR, clean: bool = False) -> dict:
+    # manifest（元の名前 → dist/指紋付きの名前）を返す。古い指紋のファイルは clean=True のときだけ消す
+    # （キャッシュされた HTML が古い名前を参照していても配信できるように）
+    out = root / DIST
+    if clean and out.exists():
+        shutil.rmtree(out)
+    manifest = {}
+    for src in _sources(root):
+        rel = src.relative_to(root)
+        data = src.read_bytes()
+        name = _fingerprint(rel, data)
+        dest = out / name
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if not dest.exists():
+            dest.write_bytes(data)
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data) * MIN_SAVING:
+                dest.with_name(dest.name + ".gz").write_bytes(gz)
+            if brotli is not None:
+                br = brotli.compress(data, quality=11)
+                if len(br) < len(data) * MIN_SAVING:
+                    dest.with_name(dest.name + ".br").write_bytes(br)
+        manifest[rel.as_posix()] = f"{DIST}/{name}"
+    (out / MANIFEST).parent.mkdir(parents=True, exist_ok=True)
+    (out / MANIFEST).write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    return manifest
+
+
+def load(root: Path = STATIC_DIR) -> dict:
+    # manifest を読む。無いか、元ファイルのほうが新しければ作り直す（起動時に 1 回だけ）
+    path = root / DIST / MANIFEST
+    if path.exists():
+        built = path.stat().st_mtime
+        if all(src.stat().st_mtime <= built for src in _sources(root)):
+            return json.loads(path.read_text(encoding="utf-8"))
+    return build(root)
+
+
+class _Asset:
+    __slots__ = ("media_type", "variants")
+
+    def __init__(self, media_type: str, variants: dict):
+        self.media_type = media_type
+        # エンコーディング（"br" / "gzip" / ""）→ (ファイルパス, stat)
+        self.variants = variants
+
+
+class StaticAssets(StaticFiles):
+    def __init__(self, *, directory: os.PathLike | str, manifest: dict, **kw):
+        super().__init__(directory=directory, **kw)
+        root = Path(directory)
+        self.index: dict[str, _Asset] = {}
+        for target in manifest.values():
+            path = root / target
+            if not path.exists():
+                continue
+            variants = {"": (str(path), path.stat())}
+            for enc, suffix in (("br", ".br"), ("gzip", ".gz")):
+                p = path.with_name(path.name + suffix)
+                if p.exists():
+                    variants[enc] = (str(p), p.stat())
+            media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            self.index[target] = _Asset(media_type, variants)
+
+    async def get_response(self, path: str, scope):
+        asset = self.index.get(path.replace(os.sep, "/"))
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        accepted = accepted_encodings(dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1"))
+        enc = next((e for e in ("br", "gzip") if e in asset.variants and e in accepted), "")
+        file, stat = asset.variants[enc]
+        headers = {"Cache-Control": IMMUTABLE}
+        if len(asset.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if enc:
+            headers["Content-Encoding"] = enc
+        return FileResponse(file, stat_result=stat, media_type=asset.media_type, headers=headers)
+
+
+_manifest: dict = {}
+
+
+def init(root: Path = STATIC_DIR) -> dict:
+    global _manifest
+    _manifest = load(root)
+    return _manifest
+
+
+def asset_url(name: str) -> str:
+    return "/static/" + _manifest.get(name, name)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="静的ファイルの指紋付きビルド")
+    ap.add_argument("--clean", action="store_true", help="古い指紋のファイルを消してから作る")
+    args = ap.parse_args(argv)
+    manifest = build(clean=args.clean)
+    for src, dst in manifest.items():
+        print(f"{src} -> {dst}")
+    if brotli is None:
+        print("(brotli が無いので .br は作っていません: pip install brotli)")
+
+
+if __name__ == "__main__":
+    main()
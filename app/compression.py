@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# app/compression.py
+# レスポンス圧縮（gzip / brotli）。本文全体を溜めずに、届いたチャンクごとに圧縮して流す。
+# - 対象：許可リストの Content-Type、2xx / 4xx / 5xx、既に Content-Encoding が無いもの
+# - しきい値未満（Content-Length か 1 チャンクで終わる本文で判断）はそのまま
+# - ルート単位の除外：dependencies=[Depends(no_compression)] か、ハンドラ内で no_compression(request)
+# - 圧縮したときは ETag を弱い ETag（W/"…"）にする（If-None-Match は弱い比較なので 304 はそのまま効く）
+#   COMPRESS_MIN_SIZE       = しきい値（バイト、既定 1024）
+#   COMPRESS_GZIP_LEVEL     = gzip のレベル（既定 6）
+#   COMPRESS_BROTLI_QUALITY = brotli の品質（既定 4。brotli が入っていなければ gzip のみ）
+# 比較は scripts/bench_compression.py
+
+import os, zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+
+try:
+    import brotli  # 任意
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE = (
+    "text/html", "text/css", "text/plain", "text/csv", "text/javascript",
+    "application/json", "application/javascript", "application/x-ndjson", "image/svg+xml",
+)
+
+
+def accepted_encodings(header: str) -> set[str]:
+    # Accept-Encoding のうち q=0 でないもの
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        params = params.strip().replace(" ", "")
+        try:
+            q = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            q = 0.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def no_compression(request: Request) -> None:
+    # 小さな JSON やリダイレクトなど、圧縮しても得にならないルート用
+    request.scope["compress"] = False
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int = COMPRESS_GZIP_LEVEL):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31：gzip ヘッダ付き
+
+    def chunk(self, data: bytes) -> bytes:
+        # 途中のチャンクは SYNC_FLUSH で区切り、受け取った分はすぐ展開できるようにする
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._z.compress(data) + self._z.flush()
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int = COMPRESS_BROTLI_QUALITY):
+        self._c = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._c.process(data) + self._c.finish()
+
+
+def _compressible_status(status: int) -> bool:
+    # 1xx・204・206・3xx（リダイレクトや 304）は本文が無いか、変えてはいけない
+    return status >= 200 and status not in (204, 206) and not 300 <= status < 400
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE, gzip_level: int = COMPRESS_GZIP_LEVEL,
+                 brotli_quality: int = COMPRESS_BROTLI_QUALITY, content_types: tuple = COMPRESSIBLE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level, self.brotli_quality = gzip_level, brotli_quality
+        self.content_types = frozenset(content_types)
+
+    def _encoder(self, scope):
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            return BrotliEncoder(self.brotli_quality)
+        if "gzip" in accepted:
+            return GzipEncoder(self.gzip_level)
+        return None
+
+    def _eligible(self, scope, start: dict) -> bool:
+        # 圧縮の対象になりうるか（Vary を付けるかどうかもこれで決める）
+        if scope.get("compress") is False or scope["method"] == "HEAD":
+            return False
+        if not _compressible_status(start["status"]):
+            return False
+        headers = Headers(raw=start["headers"])
+        if "content-encoding" in headers:
+            return False
+        return headers.get("content-type", "").split(";")[0].strip().lower() in self.content_types
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None  # None：未決定 / False：そのまま流す
+
+        async def send_wrapper(message):
+            nonlocal start, encoder
+            kind = message["type"]
+            if kind == "http.response.start":
+                start = message  # 本文の最初のチャンクを見てからヘッダを確定する
+                return
+            if kind != "http.response.body":
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+
+            body, more = message.get("body", b""), message.get("more_body", False)
+            if encoder is None:
+                encoder = self._decide(scope, start, body, more)
+                if encoder and not more:
+                    # 1 チャンクで完結：まとめて圧縮して長さを付ける
+                    data = encoder.finish(body)
+                    MutableHeaders(scope=start)["content-length"] = str(len(data))
+                    await send(start)
+                    await send({"type": kind, "body": data, "more_body": False})
+                    return
+                await send(start)
+                start = None
+            if not encoder:
+                await send(message)
+            elif more:
+                out = encoder.chunk(body)
+                if out:
+                    await send({"type": kind, "body": out, "more_body": True})
+            else:
+                await send({"type": kind, "body": encoder.finish(body), "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _decide(self, scope, start: dict, body: bytes, more: bool):
+        if not self._eligible(scope, start):
+            return False
+        headers = MutableHeaders(scope=start)
+        headers.add_vary_header("Accept-Encoding")
+        length = headers.get("content-length")
+        size = int(length) if length is not None else (None if more else len(body))
+        if size is not None and size < self.minimum_size:
+            return False
+        encoder = self._encoder(scope)
+        if encoder is None:
+            return False
+        del headers["content-length"]
+        headers["content-encoding"] = encoder.name
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["etag"] = "W/" + etag
+        return encoder
@@ -3,8 +3,11 @@
 # 日本語を既定とする簡易辞書。Cookie "lang" で切替。
 # 画面テキストは全てこの辞書経由で出す方針。
 
-from typing import Dict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Mapping
 
+DEFAULT_LANG = "ja"
 LANGS = {"ja", "en", "zh-Hant", "zh-Hans"}
 
 # 把舊寫法或簡寫統一到四語代碼
@@ -15,15 +18,16 @@ NORMALIZE = {
     "zh-Hant": "zh-Hant", "zh-Hans": "zh-Hans",
 }
 
+@lru_cache(maxsize=256)
 def normalize_lang(code: str | None) -> str:
+    # Cookie/クエリの値は種類が少ないのでメモ化（上限付きで任意文字列にも耐える）
     c = (code or "").strip()
     c = NORMALIZE.get(c, c)
-    return c if c in LANGS else "ja"
+    return c if c in LANGS else DEFAULT_LANG
 
 def get_lang(request) -> str:
     # Cookie の lang を参照、なければ ja。正規化して返す
-    raw = request.cookies.get("lang", "ja")
-    return normalize_lang(raw)
+    return normalize_lang(request.cookies.get("lang", DEFAULT_LANG))
 
 STRINGS: Dict[str, Dict[str, str]] = {
     # アプリ名・ナビ
@@ -37,6 +41,8 @@ STRINGS: Dict[str, Dict[str, str]] = {
     "home": {"ja":"ホーム","en":"Home","zh-Hant":"主頁","zh-Hans":"主页"},
     "trip_list": {"ja":"旅行一覧","en":"Trips","zh-Hant":"旅行列表","zh-Hans":"旅行列表"},
     "new": {"ja":"新規作成","en":"New","zh-Hant":"新增","zh-Hans":"新增"},
+    "search": {"ja":"検索","en":"Search","zh-Hant":"搜尋","zh-Hans":"搜索"},
+    "search_ph": {"ja":"旅行・項目を検索","en":"Search trips and items","zh-Hant":"搜尋旅行與項目","zh-Hans":"搜索旅行与项目"},
     "edit": {"ja":"編集","en":"Edit","zh-Hant":"編輯","zh-Hans":"编辑"},
     "delete": {"ja":"削除","en":"Delete","zh-Hant":"刪除","zh-Hans":"删除"},
     "items": {"ja":"旅程項目","en":"Itinerary Items","zh-Hant":"行程項目","zh-Hans":"行程项目"},
@@ -77,6 +83,8 @@ STRINGS: Dict[str, Dict[str, str]] = {
     # 空表示・削除確認
     "no_trips":{"ja":"まだ旅行がありません。右上の「新規作成」から追加してください。","en":"No trips yet. Click “New” to add one.","zh-Hant":"尚未有旅行，請點右上「新增」。","zh-Hans":"尚未有旅行，请点右上“新增”。"},
     "no_items":{"ja":"まだ項目がありません。","en":"No items yet.","zh-Hant":"尚未有項目。","zh-Hans":"尚未有项目。"},
+    "show_all":{"ja":"すべて表示","en":"Show all","zh-Hant":"全部顯示","zh-Hans":"全部显示"},
+    "no_results":{"ja":"見つかりませんでした。","en":"No matches.","zh-Hant":"找不到符合的結果。","zh-Hans":"找不到符合的结果。"},
     "delete_trip":{"ja":"旅行を削除","en":"Delete Trip","zh-Hant":"刪除旅行","zh-Hans":"删除旅行"},
     "delete_trip_confirm":{"ja":"この旅行とすべての項目を削除しますか？","en":"Delete this trip and all items?","zh-Hant":"要刪除整個旅行與所有項目嗎？","zh-Hans":"要删除整个旅行与所有项目吗？"},
     "delete_item_confirm":{"ja":"この項目を削除しますか？","en":"Delete this item?","zh-Hant":"要刪除這個項目嗎？","zh-Hans":"要删除这个项目吗？"},
@@ -106,15 +114,6 @@ STRINGS: Dict[str, Dict[str, str]] = {
     "err_id_format":{"ja":"Login ID は英数字 5～20 文字で入力してください。","en":"Login ID must be alphanumeric (5–20 chars).","zh-Hant":"Login ID 需為英數 5–20 字元。","zh-Hans":"Login ID 须为英数 5–20 字符。"},
     "err_pw_format":{"ja":"パスワードは 8～20 文字で入力してください。","en":"Password must be 8–20 chars.","zh-Hant":"密碼需為 8–20 字元。","zh-Hans":"密码须为 8–20 字符。"},
 }
-def get_lang(request) -> str:
-    # Cookie の lang を参照、無ければ ja
-    code = request.cookies.get("lang", "ja")
-    return code if code in LANGS else "ja"
-
-def get_L(lang: str):
-    # 未翻訳は ja をフォールバック
-    return {k: (v.get(lang) or v.get("ja") or k) for k, v in STRINGS.items()}
-
 # パスワード可視化トグルの文言
 STRINGS.update({
     "show_pw": {"ja":"パスワードを表示","en":"Show password","zh-Hant":"顯示密碼","zh-Hans":"显示密码"},
@@ -173,3 +172,14 @@ STRINGS.update({
         "zh-Hans":"请输入 Email 的 6 位验证码完成注册。",
     },
 })
+
+# ====== 言語別カタログ（import 時に一度だけ構築） ======
+# 未翻訳は ja をフォールバック。読み取り専用の Mapping をそのまま返すので、
+# リクエストごとの dict 生成は発生しない。
+def _build_catalog(lang: str) -> Mapping[str, str]:
+    return MappingProxyType({k: (v.get(lang) or v.get(DEFAULT_LANG) or k) for k, v in STRINGS.items()})
+
+CATALOGS: Dict[str, Mapping[str, str]] = {lang: _build_catalog(lang) for lang in LANGS}
+
+def get_L(lang: str) -> Mapping[str, str]:
+    return CATALOGS[normalize_lang(lang)]
@@ -5,50 +5,121 @@ from dotenv import load_dotenv
 load_dotenv()  # 讓 .env 生效（一定放最前面）
 
 import os, secrets
-from fastapi import FastAPI, BackgroundTasks
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from starlette.middleware.sessions import SessionMiddleware
 
-from .db import engine, Base
-from .routers import auth, trips, lang
-# 🚫 注意：不要在這裡 import .mail（避免啟動時就初始化郵件）
+from . import assets, metrics, templating
+from .assets import StaticAssets
+from .compression import CompressionMiddleware
+from .db import engine, Base, dispose_async_engines
+from .migrations import run_migrations
+from .routers import api, auth, trips, lang, search, transfer
+from .sessions import ServerSessionMiddleware, build_store
+from .services import backup, mailer, pages, passwords, revisions
+# mailer は import しても SMTP に接続しない（最初の送信時に接続し、以後使い回す）
 
 app = FastAPI(
     title="旅行管理",
     description="多言語対応のシンプルな旅行管理アプリ",
 )
 
-# Jinja2 模板
-templates = Jinja2Templates(directory="app/templates")
+# Jinja2 模板（バイトコードキャッシュ付き、起動時に全件読み込み。設定は app/templating.py）
+templates = templating.build_templates()
 app.state.templates = templates
 
 # 靜態檔案（目錄存在才掛載，避免啟動時崩）
+# 指紋付きの名前（manifest は起動時に 1 回だけ読む）は .br/.gz を選んで immutable で返す
+asset_manifest = assets.init() if os.path.isdir("app/static") else {}
 if os.path.isdir("app/static"):
-    app.mount("/static", StaticFiles(directory="app/static"), name="static")
+    app.mount("/static", StaticAssets(directory="app/static", manifest=asset_manifest), name="static")
+templates.env.globals["asset_url"] = assets.asset_url
+# 旅行カードの説明の長さ（一覧のクエリが substr で切る長さと同じ値を _trip_cards.html でも使う）
+templates.env.globals["card_desc_len"] = pages.CARD_DESC_LEN
 
-# Session 中介層
+# デプロイの識別子（テンプレート・アセット・辞書のハッシュ）。ETag と描画キャッシュのキーに混ぜる
+revisions.set_build(templating.build_token(asset_manifest))
+
+# Session 中介層（預設存在伺服器端，Cookie 只放不透明 ID；SESSION_BACKEND=cookie 則沿用簽章 Cookie）
 SESSION_SECRET = os.getenv("SESSION_SECRET", "dev-please-change-me-32chars")
-app.add_middleware(
-    SessionMiddleware,
-    secret_key=SESSION_SECRET,
-    same_site="lax",
-    session_cookie="session",
-)
+session_store = build_store()
+if session_store is not None:
+    app.add_middleware(
+        ServerSessionMiddleware,
+        store=session_store,
+        same_site="lax",
+        session_cookie="session",
+    )
+else:
+    app.add_middleware(
+        SessionMiddleware,
+        secret_key=SESSION_SECRET,
+        same_site="lax",
+        session_cookie="session",
+    )
+
+# 回應壓縮（gzip / brotli，串流逐塊壓縮）。最後に追加＝最も外側。設定は app/compression.py
+app.add_middleware(CompressionMiddleware)
 
 # 路由
 app.include_router(auth.router)
 app.include_router(trips.router)
 app.include_router(lang.router)
+app.include_router(search.router)
+app.include_router(transfer.router)
+app.include_router(api.router)
 
 # 啟動時建立資料表（開發用；正式請用 migration）
 @app.on_event("startup")
 def on_start():
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    passwords.start()
+    templating.warm(templates.env)
+
+@app.on_event("startup")
+async def on_start_mail():
+    await mailer.start()
+
+@app.on_event("startup")
+async def on_start_backup():
+    # BACKUP_INTERVAL_MIN > 0 のときだけ定期スナップショット（services/backup.py）
+    await backup.start()
 
-# 測試寄信端點（把 import 放函式內，避免啟動即爆）
+@app.on_event("shutdown")
+def on_stop():
+    passwords.shutdown()
+
+@app.on_event("shutdown")
+async def on_stop_mail():
+    # キューに残っているメールを送り切ってから止める
+    await mailer.stop()
+
+@app.on_event("shutdown")
+async def on_stop_backup():
+    await backup.stop()
+
+@app.on_event("shutdown")
+async def on_stop_db():
+    await dispose_async_engines()
+
+# 測試寄信端點（只放進佇列，立即回應）
 @app.get("/__mailtest")
-async def mailtest(background_tasks: BackgroundTasks, to: str = "test@example.com"):
-    from .mail import send_verification_email  # ← 延後匯入
-    background_tasks.add_task(send_verification_email, to, "123456")
+async def mailtest(to: str = "test@example.com"):
+    from .mail import send_verification_email
+    await send_verification_email(to, "123456")
     return {"ok": True}
+
+# 簡易メトリクス（パスワード照合時間のヒストグラム等）。?format=prometheus でテキスト形式
+# 既定では公開しない：METRICS_TOKEN を設定したときだけ、Authorization: Bearer <METRICS_TOKEN> 付きの要求に答える
+# （それ以外は 404。Prometheus は scrape_config の authorization / bearer_token で渡す）
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@app.get("/__metrics")
+def metrics_endpoint(request: Request, format: str = "json"):
+    given = request.headers.get("authorization", "")
+    if not METRICS_TOKEN or not secrets.compare_digest(given.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(404)
+    if format == "prometheus":
+        return PlainTextResponse(metrics.prometheus())
+    return metrics.snapshot()
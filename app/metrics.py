@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# app/metrics.py
+# プロセス内の簡易メトリクス（カウンタ／ヒストグラム）。
+# /__metrics で JSON、/__metrics?format=prometheus でテキスト形式を返す。
+
+import threading
+from bisect import bisect_left
+from typing import Dict, Sequence
+
+# 秒単位の既定バケット（5ms〜5s）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_lock = threading.Lock()
+
+
+class Counter:
+    def __init__(self, name: str, help: str = ""):
+        self.name, self.help = name, help
+        self.value = 0
+
+    def inc(self, n: int = 1) -> None:
+        with _lock:
+            self.value += n
+
+    def snapshot(self) -> dict:
+        return {"type": "counter", "value": self.value}
+
+    def prometheus(self) -> list[str]:
+        return [f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        with _lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # バケット境界での近似値（上側の境界を返す）
+        target, acc = q * self.count, 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            acc += n
+            if self.count and acc >= target:
+                return bound
+        return 0.0
+
+    def snapshot(self) -> dict:
+        cumulative, acc = {}, 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            acc += n
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = acc
+        return {
+            "type": "histogram", "count": self.count, "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5), "p99": self.quantile(0.99), "buckets": cumulative,
+        }
+
+    def prometheus(self) -> list[str]:
+        lines = [f"# TYPE {self.name} histogram"]
+        for le, acc in self.snapshot()["buckets"].items():
+            lines.append(f'{self.name}_bucket{{le="{le}"}} {acc}')
+        lines += [f"{self.name}_sum {self.sum}", f"{self.name}_count {self.count}"]
+        return lines
+
+
+REGISTRY: Dict[str, object] = {}
+
+
+def counter(name: str, help: str = "") -> Counter:
+    # 同名は同じインスタンスを返す
+    return REGISTRY.setdefault(name, Counter(name, help))
+
+
+def histogram(name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.setdefault(name, Histogram(name, help, buckets))
+
+
+def snapshot() -> dict:
+    return {name: m.snapshot() for name, m in sorted(REGISTRY.items())}
+
+
+def prometheus() -> str:
+    lines: list[str] = []
+    for _, m in sorted(REGISTRY.items()):
+        if m.help:
+            lines.append(f"# HELP {m.name} {m.help}")
+        lines += m.prometheus()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# app/migrations.py
+# 簡易マイグレーション。create_all では変えられない既存データ／既存テーブルの変更を
+# schema_migrations テーブルに記録しながら、未適用のものだけ順番に 1 回ずつ実行する。
+#   python -m app.migrations   （起動時 main.on_start からも呼ばれる）
+
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, inspect, select
+from sqlalchemy.engine import Connection, Engine
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("id", String(100), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS: list[tuple[str, Callable[[Connection], None]]] = []
+
+
+def migration(mid: str):
+    # 登録順＝実行順。ID は一度出したら変えない
+    def deco(fn: Callable[[Connection], None]):
+        MIGRATIONS.append((mid, fn))
+        return fn
+    return deco
+
+
+@migration("0001_sparse_sort_keys")
+def _sparse_sort_keys(conn: Connection) -> None:
+    # 既存の 0,1,2… の並び順を SORT_GAP 間隔へ（順序は維持）
+    from .services.ordering import respace_all
+    respace_all(conn)
+
+
+@migration("0002_composite_sort_indexes")
+def _composite_sort_indexes(conn: Connection) -> None:
+    # (user_id, sort_order, id) / (trip_id, sort_order, id) を追加し、
+    # 先頭列が重複する旧単一列索引は削除（外部キー用の索引は複合索引が兼ねる）
+    from .models import Trip, Item
+    insp = inspect(conn)
+    for model, old, col in ((Trip, "ix_trips_user_id", "user_id"), (Item, "ix_items_trip_id", "trip_id")):
+        for idx in model.__table__.indexes:
+            idx.create(conn, checkfirst=True)
+        if old in {i["name"] for i in insp.get_indexes(model.__tablename__)}:
+            Index(old, model.__table__.c[col]).drop(conn)
+
+
+@migration("0003_revision_columns")
+def _revision_columns(conn: Connection) -> None:
+    # ETag 用の版列（trips.revision / users.trips_revision）を既存テーブルに追加
+    from .models import Trip, User
+    insp = inspect(conn)
+    for model, col in ((Trip, "revision"), (User, "trips_revision")):
+        if col not in {c["name"] for c in insp.get_columns(model.__tablename__)}:
+            conn.exec_driver_sql(f"ALTER TABLE {model.__tablename__} ADD COLUMN {col} BIGINT NOT NULL DEFAULT 0")
+
+
+@migration("0004_changes_floor")
+def _changes_floor(conn: Connection) -> None:
+    # 変更ログの圧縮位置（users.changes_floor）。changes テーブル自体は create_all で作られる
+    from .models import User
+    if "changes_floor" not in {c["name"] for c in inspect(conn).get_columns(User.__tablename__)}:
+        conn.exec_driver_sql(f"ALTER TABLE {User.__tablename__} ADD COLUMN changes_floor INTEGER NOT NULL DEFAULT 0")
+
+
+@migration("0005_search_index")
+def _search_index(conn: Connection) -> None:
+    # 全文検索の索引（FTS5 trigram）とトリガーを作り、既存の行を入れる。使えない環境では何もしない（LIKE で検索）
+    from .services import search
+    if search.supported(conn):
+        search.rebuild(conn)
+
+
+def run_migrations(engine: Engine) -> list[str]:
+    # 適用した ID のリストを返す
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        done = set(conn.execute(select(schema_migrations.c.id)).scalars())
+    applied = []
+    for mid, fn in MIGRATIONS:
+        if mid in done:
+            continue
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(schema_migrations.insert().values(id=mid, applied_at=datetime.now(timezone.utc)))
+        applied.append(mid)
+    return applied
+
+
+if __name__ == "__main__":
+    from .db import engine, Base
+    from . import models  # noqa: F401  テーブル定義を登録
+    Base.metadata.create_all(bind=engine)
+    for mid in run_migrations(engine):
+        print(f"applied {mid}")
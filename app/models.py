@@ -2,16 +2,26 @@
 # app/models.py
 # 純 SQLAlchemy 模型。行程/項目有 sort_order 供拖曳排序用。
 
+import time
 from datetime import datetime, date
 from typing import Optional, List
 
 from sqlalchemy import (
-    String, Integer, Date, DateTime, Boolean, ForeignKey, Text, func
+    String, Integer, BigInteger, Date, DateTime, Boolean, ForeignKey, Text, Index, func
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .db import Base
 
+# sort_order は間隔をあけた整数キー（1024, 2048, …）。
+# 1 件の移動は前後キーの中間値を書くだけで済み、間隔が尽きたら親単位で振り直す
+SORT_GAP = 1024
+
+
+def revision_stamp() -> int:
+    # 版（ETag 用）の初期値：マイクロ秒の時刻。削除後に同じ id が再利用されても前の版と重ならない
+    return time.time_ns() // 1000
+
 
 class User(Base):
     __tablename__ = "users"
@@ -36,6 +46,12 @@ class User(Base):
     email_code_hash: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
     email_code_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
+    # 一覧ページの版（自分の trip の追加・削除・編集・並べ替えで進む）
+    trips_revision: Mapped[int] = mapped_column(BigInteger, nullable=False, default=revision_stamp, server_default="0")
+
+    # 変更ログ（changes）をここまで圧縮済み。これより古いカーソルの同期は全件からやり直し
+    changes_floor: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
     # 建立時間
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
 
@@ -48,9 +64,13 @@ class User(Base):
 
 class Trip(Base):
     __tablename__ = "trips"
+    __table_args__ = (
+        # 一覧（user_id で絞って sort_order, id 順）を索引順に読むための複合索引
+        Index("ix_trips_user_sort", "user_id", "sort_order", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
 
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -59,22 +79,29 @@ class Trip(Base):
     start_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
     end_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
 
-    # 拖曳排序用
+    # 拖曳排序用（SORT_GAP 間隔の疎なキー）
     sort_order: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
+    # 詳細ページの版（trip 自身と配下の item の変更で進む）
+    revision: Mapped[int] = mapped_column(BigInteger, nullable=False, default=revision_stamp, server_default="0")
+
     user: Mapped["User"] = relationship(back_populates="trips")
     items: Mapped[List["Item"]] = relationship(
         back_populates="trip",
         cascade="all, delete-orphan",
-        order_by="Item.sort_order"
+        order_by="(Item.sort_order, Item.id)"
     )
 
 
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = (
+        # 項目一覧（trip_id で絞って sort_order, id 順）用の複合索引
+        Index("ix_items_trip_sort", "trip_id", "sort_order", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    trip_id: Mapped[int] = mapped_column(ForeignKey("trips.id", ondelete="CASCADE"), nullable=False, index=True)
+    trip_id: Mapped[int] = mapped_column(ForeignKey("trips.id", ondelete="CASCADE"), nullable=False)
 
     title: Mapped[str] = mapped_column(String(200), nullable=False)
 
@@ -86,7 +113,25 @@ class Item(Base):
 
     note: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
-    # 拖曳排序用
+    # 拖曳排序用（SORT_GAP 間隔の疎なキー）
     sort_order: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
-    trip: Mapped["Trip"] = relationship(back_populates="items")
\ No newline at end of file
+    trip: Mapped["Trip"] = relationship(back_populates="items")
+
+
+class Change(Base):
+    # 同期（/api/v1/sync）用の変更ログ。id がそのままカーソル（単調増加、削除後も再利用しない）
+    # 行の中身は持たず「どれが変わったか」だけ：kind = trip / item / trip_order / item_order
+    #   trip・item は entity_id の行、trip_order は一覧の並び（entity_id = user_id）、item_order は trip 内の並び（entity_id = trip_id）
+    __tablename__ = "changes"
+    __table_args__ = (
+        Index("ix_changes_user_id", "user_id", "id"),
+        Index("ix_changes_entity", "user_id", "kind", "entity_id"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# routers/api.py
+# JSON API（/api/v1）。画面と同じセッション Cookie で認証し、未ログインは 401。
+# - 読み取り：AsyncSession + pages のクエリ（キーセットのページング、カーソルは画面の *.json と同じ形式）
+# - 更新：単発の操作も POST /api/v1/batch と同じ services.mutations を通す（1 リクエスト＝1 トランザクション）
+# - 差分同期：GET /api/v1/sync?since=<cursor>（services.changelog）
+# 版（revisions）は mutations が commit 前に進め、page_cache の bump はここで commit 後に行う。
+# 項目のタイトルに触れる操作があれば、入力補完の索引（services.suggest）は捨てて次回作り直す。
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..db import async_read_session, get_async_read_session, run_write
+from ..schemas import (
+    BatchIn, BatchOut, CreateItem, CreateTrip, DeleteItem, DeleteTrip, ItemIn, ItemOut, ItemPage,
+    ItemPatch, SyncOut, TripIn, TripOut, TripPage, TripPatch, UpdateItem, UpdateTrip,
+)
+from ..services import changelog, mutations, page_cache, pages, suggest
+from .auth import Principal, require_api_user
+
+router = APIRouter(prefix="/api/v1", tags=["api"])
+
+# 入力補完の索引を捨てる操作
+_TITLE_OPS = {"create_item", "update_item", "delete_item", "delete_trip"}
+
+
+def _cursor(raw: str | None):
+    try:
+        return pages.decode_cursor(raw)
+    except ValueError:
+        raise HTTPException(400, "invalid cursor")
+
+
+def _forget_titles(user_id: int, ops) -> None:
+    if any(op.op in _TITLE_OPS for op in ops):
+        suggest.forget(user_id)
+
+
+def _apply(session: Session, user_id: int, ops):
+    # 書き込みスレッドで実行：全部成功なら commit、どれか失敗なら rollback して OpError を返す
+    try:
+        results, scopes = mutations.apply(session, user_id, ops)
+    except mutations.OpError as e:
+        session.rollback()
+        return e, []
+    session.commit()
+    return results, scopes
+
+
+async def _run(user_id: int, ops) -> list[dict]:
+    # 単発の操作用：失敗は HTTPException に
+    results, scopes = await run_write(_apply, user_id, ops)
+    if isinstance(results, mutations.OpError):
+        raise HTTPException(results.status, results.detail)
+    await page_cache.bump(*scopes)
+    _forget_titles(user_id, ops)
+    return results
+
+
+async def _trip_out(user_id: int, trip_id: int) -> TripOut:
+    async with async_read_session() as session:
+        row = await session.run_sync(pages.trip_row, user_id, trip_id)
+    if row is None:
+        raise HTTPException(404)
+    return TripOut.model_validate(row)
+
+
+async def _item_out(user_id: int, trip_id: int, item_id: int) -> ItemOut:
+    async with async_read_session() as session:
+        row = await session.run_sync(pages.item_row, user_id, trip_id, item_id)
+    if row is None:
+        raise HTTPException(404)
+    return ItemOut.model_validate(row)
+
+
+# ---------- 旅行 ----------
+@router.get("/trips", response_model=TripPage)
+async def list_trips(
+    after: str | None = Query(None),
+    limit: int = Query(pages.TRIPS_PAGE, ge=1, le=pages.MAX_PAGE),
+    session: AsyncSession = Depends(get_async_read_session),
+    user: Principal = Depends(require_api_user),
+):
+    rows, next_cursor = await session.run_sync(pages.trip_rows, user.id, _cursor(after), limit)
+    return TripPage(trips=[TripOut.model_validate(r) for r in rows], next=next_cursor)
+
+
+@router.post("/trips", response_model=TripOut, status_code=201)
+async def create_trip(body: TripIn, user: Principal = Depends(require_api_user)):
+    [result] = await _run(user.id, [CreateTrip(op="create_trip", **body.model_dump())])
+    return await _trip_out(user.id, result["id"])
+
+
+@router.get("/trips/{trip_id}", response_model=TripOut)
+async def get_trip(trip_id: int, user: Principal = Depends(require_api_user)):
+    return await _trip_out(user.id, trip_id)
+
+
+@router.patch("/trips/{trip_id}", response_model=TripOut)
+async def update_trip(trip_id: int, body: TripPatch, user: Principal = Depends(require_api_user)):
+    op = UpdateTrip(op="update_trip", id=trip_id, **body.model_dump(exclude_unset=True))
+    await _run(user.id, [op])
+    return await _trip_out(user.id, trip_id)
+
+
+@router.delete("/trips/{trip_id}", status_code=204)
+async def delete_trip(trip_id: int, user: Principal = Depends(require_api_user)):
+    await _run(user.id, [DeleteTrip(op="delete_trip", id=trip_id)])
+    return Response(status_code=204)
+
+
+# ---------- 項目 ----------
+@router.get("/trips/{trip_id}/items", response_model=ItemPage)
+async def list_items(
+    trip_id: int,
+    after: str | None = Query(None),
+    limit: int = Query(pages.ITEMS_PAGE, ge=1, le=pages.MAX_PAGE),
+    session: AsyncSession = Depends(get_async_read_session),
+    user: Principal = Depends(require_api_user),
+):
+    # 他人の trip は（画面の items.json と違い）404
+    if await session.run_sync(pages.trip_row, user.id, trip_id) is None:
+        raise HTTPException(404)
+    items, next_cursor = await session.run_sync(pages.item_rows, user.id, trip_id, _cursor(after), limit)
+    return ItemPage(items=[ItemOut.model_validate(it) for it in items], next=next_cursor)
+
+
+@router.post("/trips/{trip_id}/items", response_model=ItemOut, status_code=201)
+async def create_item(trip_id: int, body: ItemIn, user: Principal = Depends(require_api_user)):
+    [result] = await _run(user.id, [CreateItem(op="create_item", trip_id=trip_id, **body.model_dump())])
+    return await _item_out(user.id, trip_id, result["id"])
+
+
+@router.patch("/trips/{trip_id}/items/{item_id}", response_model=ItemOut)
+async def update_item(trip_id: int, item_id: int, body: ItemPatch, user: Principal = Depends(require_api_user)):
+    op = UpdateItem(op="update_item", trip_id=trip_id, id=item_id, **body.model_dump(exclude_unset=True))
+    await _run(user.id, [op])
+    return await _item_out(user.id, trip_id, item_id)
+
+
+@router.delete("/trips/{trip_id}/items/{item_id}", status_code=204)
+async def delete_item(trip_id: int, item_id: int, user: Principal = Depends(require_api_user)):
+    await _run(user.id, [DeleteItem(op="delete_item", trip_id=trip_id, id=item_id)])
+    return Response(status_code=204)
+
+
+# ---------- バッチ ----------
+@router.post("/batch", response_model=BatchOut)
+async def batch(body: BatchIn, user: Principal = Depends(require_api_user)):
+    # 全操作を 1 トランザクションで。どれか失敗したら何も反映せず、失敗した操作の index とステータスを返す
+    results, scopes = await run_write(_apply, user.id, body.ops)
+    if isinstance(results, mutations.OpError):
+        out = BatchOut(ok=False, error={"index": results.index, "status": results.status, "detail": results.detail})
+        return JSONResponse(out.model_dump(), status_code=results.status)
+    await page_cache.bump(*scopes)
+    _forget_titles(user.id, body.ops)
+    return BatchOut(ok=True, results=results)
+
+
+# ---------- 差分同期 ----------
+@router.get("/sync", response_model=SyncOut)
+async def sync(
+    since: int = Query(0, ge=0),
+    limit: int = Query(changelog.SYNC_LIMIT, ge=1, le=changelog.MAX_SYNC_LIMIT),
+    session: AsyncSession = Depends(get_async_read_session),
+    user: Principal = Depends(require_api_user),
+):
+    # since=0（初回）や圧縮済みのカーソルには全件（reset）を返す
+    return await session.run_sync(changelog.changes_since, user.id, since, limit)
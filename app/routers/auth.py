@@ -8,13 +8,16 @@ from typing import Optional
 
 from fastapi import APIRouter, Request, Form, Depends, HTTPException
 from fastapi.responses import RedirectResponse, HTMLResponse
-from passlib.hash import bcrypt
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..db import get_session
-from ..models import User, Trip, Item
+from ..compression import no_compression
+from ..db import get_async_read_session, run_write
+from ..models import User, Trip, Item, SORT_GAP
 from ..i18n import get_L, get_lang
+from ..services import passwords
+from ..sessions import regenerate_id
 # ▼ 起動時 500 を避けるため、mail モジュールはここでは import しない
 # from ..mail import send_verification_email
 
@@ -34,7 +37,7 @@ async def _send_code(email: str, code: str):
         log.info(msg)
         return
     try:
-        # 運用時のみ、必要なときに遅延 import
+        # 運用時のみ、必要なときに遅延 import（送信キューに積むだけで SMTP は待たない）
         from ..mail import send_verification_email
         await send_verification_email(email, code)
     except Exception as e:
@@ -56,31 +59,53 @@ def _hash_code(code: str) -> str:
     # コードはDB/セッションに平文で置かず、SHA256 のハッシュで保存（セキュリティ向上）
     return hashlib.sha256(code.encode("utf-8")).hexdigest()
 
+class Principal:
+    # ログイン中ユーザーの最小情報。ログイン時にセッションへ入れておき、画面ごとの users 参照を省く
+    __slots__ = ("id", "login_id")
+
+    def __init__(self, id: int, login_id: str):
+        self.id, self.login_id = id, login_id
+
+def _login_session(request: Request, uid: int, login_id: str):
+    # ID を振り直してからプリンシパルを保存
+    regenerate_id(request)
+    request.session["user_id"] = uid
+    request.session["login_id"] = login_id
+
 def current_user(request: Request, session: Session) -> Optional[User]:
     uid = request.session.get("user_id")
     if not uid:
         return None
     return session.get(User, uid)
 
-def require_user(request: Request, session: Session = Depends(get_session)) -> User:
-    u = current_user(request, session)
-    if not u:
+def require_user(request: Request) -> Principal:
+    uid = request.session.get("user_id")
+    login_id = request.session.get("login_id")
+    if not uid or not login_id:
         # 303 で /login に飛ばす合図（フロント側で拾ってリダイレクトしてもOK）
         raise HTTPException(status_code=303, detail="redirect:/login")
-    return u
+    return Principal(uid, login_id)
+
+def require_api_user(request: Request) -> Principal:
+    # JSON API 用：未ログインはリダイレクトではなく 401
+    uid = request.session.get("user_id")
+    login_id = request.session.get("login_id")
+    if not uid or not login_id:
+        raise HTTPException(status_code=401, detail="not authenticated")
+    return Principal(uid, login_id)
 
 def seed_template_for_user(session: Session, user: User):
     # 登録直後に「道後温泉小旅行」を自分のデータとして複製
-    t = Trip(user_id=user.id, title="道後温泉小旅行（サンプル）", description="松山・道後温泉の1泊2日プラン", sort_order=0)
+    t = Trip(user_id=user.id, title="道後温泉小旅行（サンプル）", description="松山・道後温泉の1泊2日プラン", sort_order=SORT_GAP)
     session.add(t)
     session.flush()  # t.id を得る
     items = [
-        Item(trip_id=t.id, title="松山城", time=" 10:00", note="ロープウェイ＋松山城観光", sort_order=0),
-        Item(trip_id=t.id, title="ロープウェイ街", time=" 12:00", note="ランチ（昼食）", sort_order=1),
-        Item(trip_id=t.id, title="道後温泉 本館", time=" 14:00", note="日本最古といわれる共同浴場で、 歴史情緒あふれる温泉を楽しめます", sort_order=2),
-        Item(trip_id=t.id, title="道後商店街（道後ハイカラ通り）", time=" 16:00", note="温泉街を散策し、お土産やご当地グルメを楽しめます", sort_order=3),
-        Item(trip_id=t.id, title="宿泊先の旅館でチェックイン", time=" 17:00", note="旅館で晩ご飯", sort_order=4),
-        Item(trip_id=t.id, title="夜散歩", time="19:00", note="ライトアップされた道後温泉本館を眺めながら街歩き", sort_order=5),
+        Item(trip_id=t.id, title="松山城", time=" 10:00", note="ロープウェイ＋松山城観光", sort_order=1*SORT_GAP),
+        Item(trip_id=t.id, title="ロープウェイ街", time=" 12:00", note="ランチ（昼食）", sort_order=2*SORT_GAP),
+        Item(trip_id=t.id, title="道後温泉 本館", time=" 14:00", note="日本最古といわれる共同浴場で、 歴史情緒あふれる温泉を楽しめます", sort_order=3*SORT_GAP),
+        Item(trip_id=t.id, title="道後商店街（道後ハイカラ通り）", time=" 16:00", note="温泉街を散策し、お土産やご当地グルメを楽しめます", sort_order=4*SORT_GAP),
+        Item(trip_id=t.id, title="宿泊先の旅館でチェックイン", time=" 17:00", note="旅館で晩ご飯", sort_order=5*SORT_GAP),
+        Item(trip_id=t.id, title="夜散歩", time="19:00", note="ライトアップされた道後温泉本館を眺めながら街歩き", sort_order=6*SORT_GAP),
         
     ]
     session.add_all(items)
@@ -94,23 +119,39 @@ def login_page(request: Request):
         "login.html", {"request": request, "L": L, "msg": msg}
     )
 
+def _busy() -> HTTPException:
+    # パスワード用ワーカーの待ち行列が満杯：少し待って再試行してもらう
+    return HTTPException(status_code=503, detail="busy", headers={"Retry-After": "1"})
+
 # ---------- アクション：ログイン ----------
 @router.post("/login")
-def login_action(
+async def login_action(
     request: Request,
     login_id: str = Form(...),
     password: str = Form(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_read_session),
 ):
     L = get_L(get_lang(request))
     norm = (login_id or "").lower().strip()
-    user = session.execute(select(User).where(User.login_id_norm == norm)).scalar_one_or_none()
-    if not user or not bcrypt.verify(password, user.password_hash):
+    user = (await session.execute(select(User).where(User.login_id_norm == norm))).scalar_one_or_none()
+    await session.close()  # 照合を待つ間は読み取り接続も返しておく
+    try:
+        # bcrypt 照合は専用ワーカーで（共有スレッドプールを塞がない）
+        ok, new_hash = (await passwords.verify_and_update(password, user.password_hash)) if user else (False, None)
+    except passwords.PasswordBusy:
+        raise _busy()
+    if not ok:
         err = L.get("err_login_bad", "ID またはパスワードが正しくありません")
         return RedirectResponse(url=f"/login?msg={err}", status_code=303)
 
-    request.session["user_id"] = user.id
-    request.session["login_id"] = user.login_id
+    if new_hash:
+        # 保存済みハッシュのコスト／方式が古い：平文が手元にある今のうちに差し替える
+        def _rehash(s: Session):
+            s.execute(update(User).where(User.id == user.id).values(password_hash=new_hash))
+            s.commit()
+        await run_write(_rehash)
+
+    _login_session(request, user.id, user.login_id)
     return RedirectResponse(url="/", status_code=303)
 
 # ---------- 画面：新規登録（テンプレ依存） ----------
@@ -180,7 +221,7 @@ async def register_send_code(
 
 # ---------- アクション：本登録（コード検証込み） ----------
 @router.post("/register")
-def register_action(
+async def register_action(
     request: Request,
     login_id: str = Form(...),
     password: str = Form(...),
@@ -188,8 +229,9 @@ def register_action(
     email: str = Form(...),
     email_confirm: str = Form(...),
     code: str = Form(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_read_session),
 ):
+    # 重複チェックは読み取り側、作成だけ書き込みスレッドで
     from sqlalchemy.exc import IntegrityError
 
     L = get_L(get_lang(request))
@@ -237,43 +279,59 @@ def register_action(
 
     # 既存の重複チェック
     norm = login_id.lower()
-    exists = session.execute(select(User).where(User.login_id_norm == norm)).scalar_one_or_none()
+    exists = (await session.execute(select(User.id).where(User.login_id_norm == norm))).first()
     if exists:
         msg = L.get("err_id_used", "このログインIDは既に使用されています")
         return RedirectResponse(url=f"/register?msg={msg}", status_code=303)
 
     # Email 重複チェック（DB に UNIQUE がある場合の 500 を防ぐ）
-    exists_email = session.execute(select(User).where(User.email == email)).scalar_one_or_none()
+    exists_email = (await session.execute(select(User.id).where(User.email == email))).first()
     if exists_email:
         msg = L.get("err_email_used", "このメールは既に使用されています")
         return request.app.state.templates.TemplateResponse(
            "register.html", {"request": request, "L": L, "msg": msg}
     )    
 
+    # bcrypt ハッシュ化は専用ワーカーで（待つ間は読み取り接続を返しておく）
+    await session.close()
+    try:
+        password_hash = await passwords.hash_password(password)
+    except passwords.PasswordBusy:
+        raise _busy()
+
     # ユーザー作成（メールは検証済みとして保存）
     # ※ users テーブルに email_verified / email_code_hash / email_code_expires_at が無い場合は、以下3行を削除してください
     user = User(
         login_id=login_id,
         login_id_norm=norm,
-        password_hash=bcrypt.hash(password),
+        password_hash=password_hash,
         email=email,
         # email_verified=True,
         # email_code_hash=None,
         # email_code_expires_at=None,
     )
-    session.add(user); session.flush()
 
-    # 初期テンプレを複製
-    seed_template_for_user(session, user)
+    def _create(s: Session) -> Optional[int]:
+        # 書き込みスレッドの中
+        s.add(user); s.flush()
+        uid = user.id
 
-    # commit で UNIQUE 衝突などが起きても 500 にしない
-    try:
-        session.commit()
-    except IntegrityError:
-            session.rollback()
-            msg = L.get("err_email_used", "このメールは既に使用されています")
-            return request.app.state.templates.TemplateResponse(
-                "register.html", {"request": request, "L": L, "msg": msg}
+        # 初期テンプレを複製
+        seed_template_for_user(s, user)
+
+        # commit で UNIQUE 衝突などが起きても 500 にしない
+        try:
+            s.commit()
+        except IntegrityError:
+            s.rollback()
+            return None
+        return uid
+
+    uid = await run_write(_create)
+    if uid is None:
+        msg = L.get("err_email_used", "このメールは既に使用されています")
+        return request.app.state.templates.TemplateResponse(
+            "register.html", {"request": request, "L": L, "msg": msg}
         )
 
     # セッションのコード情報を掃除
@@ -281,8 +339,7 @@ def register_action(
         request.session.pop(k, None)
 
     # そのままログイン状態にする
-    request.session["user_id"] = user.id
-    request.session["login_id"] = user.login_id
+    _login_session(request, uid, login_id)
     return RedirectResponse(url="/", status_code=303)
 
 # ---------- アクション：ログアウト ----------
@@ -292,7 +349,7 @@ def logout_action(request: Request):
     return RedirectResponse(url="/login", status_code=303)
 
 # ---------- 非同期：JSON版 認証コード送信 ----------
-@router.post("/register/send-code.json")
+@router.post("/register/send-code.json", dependencies=[Depends(no_compression)])
 async def register_send_code_json(request: Request):
     L = get_L(get_lang(request))
     data = await request.form()
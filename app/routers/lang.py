@@ -5,19 +5,9 @@
 from fastapi import APIRouter, Request, Response, Query
 from fastapi.responses import RedirectResponse
 
-router = APIRouter()
-
-ALLOWED = {"ja", "en", "zh-Hant", "zh-Hans"}
-NORMALIZE = {
-    "zh": "zh-Hant", "zh_TW": "zh-Hant", "zh-TW": "zh-Hant", "tw": "zh-Hant",
-    "zh_CN": "zh-Hans", "zh-CN": "zh-Hans", "cn": "zh-Hans",
-    "zh-Hant": "zh-Hant", "zh-Hans": "zh-Hans",
-}
+from ..i18n import normalize_lang
 
-def _normalize(code: str | None) -> str:
-    c = (code or "").strip()
-    c = NORMALIZE.get(c, c)
-    return c if c in ALLOWED else "ja"
+router = APIRouter()
 
 @router.get("/lang")
 def set_lang(
@@ -27,7 +17,7 @@ def set_lang(
     set:  str | None = Query(None),   # 新參數名（前端用這個也OK）
     next: str | None = Query(None),   # 返回頁
 ):
-    lang = _normalize(code or set)
+    lang = normalize_lang(code or set)
     # 只允許站內路徑，避免 open redirect
     back = next if (next and next.startswith("/")) else (request.headers.get("referer") or "/")
     resp = RedirectResponse(url=back, status_code=303)
@@ -0,0 +1,44 @@
+﻿# -*- coding: utf-8 -*-
+# routers/search.py
+# 旅行・項目の全文検索（ログイン必須、自分の行だけ）。
+# /search は画面、/search.json は同じ結果の JSON（title / snippet は <mark> 付きのエスケープ済み HTML）。
+# 索引の更新はトリガーで行われるので、更新系の route 側ですることはない（services.search）。
+
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db import get_async_read_session
+from ..i18n import get_L, get_lang
+from ..services import search as search_service
+from .auth import Principal, require_user
+
+router = APIRouter()
+
+MAX_QUERY = 200
+
+@router.get("/search")
+async def search_page(
+    request: Request,
+    q: str = Query("", max_length=MAX_QUERY),
+    session: AsyncSession = Depends(get_async_read_session),
+    user: Principal = Depends(require_user),
+):
+    L = get_L(get_lang(request))
+    hits = await session.run_sync(search_service.search, user.id, q)
+    resp = request.app.state.templates.TemplateResponse(
+        "search.html", {"request": request, "L": L, "q": q, "hits": hits}
+    )
+    resp.headers["Cache-Control"] = "private, no-store"
+    return resp
+
+@router.get("/search.json")
+async def search_json(
+    q: str = Query("", max_length=MAX_QUERY),
+    limit: int = Query(search_service.SEARCH_LIMIT, ge=1, le=search_service.MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0),
+    session: AsyncSession = Depends(get_async_read_session),
+    user: Principal = Depends(require_user),
+):
+    # offset でページ送り（次があるかは返した件数 == limit で判断）
+    hits = await session.run_sync(search_service.search, user.id, q, limit, offset)
+    return {"q": q, "results": [h.as_dict() for h in hits]}
@@ -0,0 +1,99 @@
+﻿# -*- coding: utf-8 -*-
+# routers/transfer.py
+# 自分の旅行・項目のエクスポート／インポート（ログイン必須）。services.transfer の薄い入口。
+# - GET /export/trips.csv・/export/items.csv・/export.ndjson：読み取り用セッションを応答の最後まで開いたまま
+#   yield_per で読みながら流す（Starlette がスレッドプールで 1 チャンクずつ進める）
+# - POST /import：multipart の trips / items（CSV）か ndjson。
+#   Content-Length が IMPORT_MAX_BYTES を超えれば読む前に 413（ないものは 411）。
+#   読み込みと検証はスレッドプールで先に全部済ませ（行数が IMPORT_MAX_ROWS を超えれば 413、不正な行は 422
+#   でファイル名と行番号）、書き込みスレッドには検証済みの行をチャンクごとに渡す（1 チャンク 1 トランザクション。
+#   間に他の書き込みが入れる）。途中で失敗したら書いた分を消す。一覧の版は最後のチャンクの後に進める
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+
+from ..db import ReadSessionLocal, run_write
+from ..services import page_cache, suggest, transfer
+from ..services.page_cache import user_scope
+from .auth import Principal, require_user
+
+router = APIRouter()
+
+MEDIA = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+def _download(chunks, filename: str, fmt: str) -> StreamingResponse:
+    def body():
+        with ReadSessionLocal() as session:
+            yield from chunks(session)
+    return StreamingResponse(body(), media_type=MEDIA[fmt], headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "private, no-store",
+    })
+
+@router.get("/export/{kind}.csv")
+async def export_csv(kind: str, user: Principal = Depends(require_user)):
+    if kind not in ("trips", "items"):
+        raise HTTPException(404)
+    return _download(lambda s: transfer.export_csv(s, kind, user.id), transfer.backup_name(kind), "csv")
+
+@router.get("/export.ndjson")
+async def export_ndjson(user: Principal = Depends(require_user)):
+    return _download(lambda s: transfer.export_ndjson(s, user.id), transfer.backup_name("travel", "ndjson"), "ndjson")
+
+def _error(status: int, error: dict) -> JSONResponse:
+    return JSONResponse({"ok": False, "error": error}, status_code=status)
+
+def _committed(fn):
+    def run(session: Session, *args):
+        result = fn(session, *args)
+        session.commit()
+        return result
+    return run
+
+@router.post("/import")
+async def import_data(request: Request, user: Principal = Depends(require_user)):
+    # File(...) の引数にすると大きさを見る前に本文を全部受け取ってしまうので、フォームは自分で読む
+    length = request.headers.get("content-length")
+    if length is None or not length.isdigit():
+        return _error(411, {"detail": "Content-Length is required"})
+    if int(length) > transfer.IMPORT_MAX_BYTES:
+        return _error(413, {"detail": f"upload is larger than {transfer.IMPORT_MAX_BYTES} bytes"})
+    form = await request.form()
+    uploads = {k: v for k in ("trips", "items", "ndjson") if isinstance(v := form.get(k), UploadFile)}
+    if not uploads:
+        return _error(422, {"detail": "no file"})
+
+    # CSV は trips → items の順に読む（ファイル名ではなくフィールド名で種類を決める）
+    def records():
+        if "ndjson" in uploads:
+            yield from transfer.read_ndjson(uploads["ndjson"].file, uploads["ndjson"].filename or "ndjson")
+        for kind in ("trip", "item"):
+            if (upload := uploads.get(kind + "s")) is not None:
+                yield from transfer.read_csv(upload.file, kind, upload.filename or kind + "s")
+
+    try:
+        chunks = await run_in_threadpool(lambda: list(transfer.prepare(records(), transfer.IMPORT_MAX_ROWS)))
+    except transfer.ImportTooLarge as e:
+        return _error(413, e.as_dict())
+    except transfer.ImportFailed as e:
+        return _error(422, e.as_dict())
+    finally:
+        await form.close()
+
+    counts = {"trips": 0, "items": 0}
+    trip_ids: dict[int, int] = {}
+    try:
+        for chunk in chunks:
+            counts[chunk[0] + "s"] += await run_write(_committed(transfer.write_chunk), user.id, chunk, trip_ids)
+        await run_write(_committed(transfer.finish_user), user.id, counts)
+    except Exception:
+        if trip_ids:
+            await run_write(_committed(transfer.discard_trips), user.id, list(trip_ids.values()))
+            await page_cache.bump(user_scope(user.id))
+        raise
+    await page_cache.bump(user_scope(user.id))
+    suggest.forget(user.id)
+    return {"ok": True, **counts}
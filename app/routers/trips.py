@@ -1,126 +1,334 @@
 ﻿# -*- coding: utf-8 -*-
 # routers/trips.py
 # 旅行一覧・詳細・項目操作・並べ替え API（ログイン必須）
+# 読み取りは AsyncSession（pages の同期 API は run_sync でイベントループを塞がずに呼ぶ）。
+# 更新は run_write で書き込みスレッドへ（1 トランザクション＝1 関数）。
+# 一覧・詳細は描画済みページをキャッシュし、ETag で条件付き GET（304）に答える。
+# ?all=1（全件表示）はキャッシュせず、行を yield_per で取りながらテンプレートをストリーミングで流す。
+# 更新は commit 前に revisions.touch_*（ETag の版）と changelog（同期用の変更ログ）、
+# commit 後に page_cache.bump を必ず呼ぶこと。項目のタイトルが変わったら suggest（入力補完の索引）にも伝える。
 
 from datetime import date
 from typing import List
-from fastapi import APIRouter, Request, Depends, HTTPException, Form
-from fastapi.responses import RedirectResponse, JSONResponse
-from sqlalchemy import select
+from fastapi import APIRouter, Request, Depends, HTTPException, Form, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..db import get_session
-from ..models import Trip, Item, User
+from ..compression import no_compression
+from ..db import ReadSessionLocal, async_read_session, get_async_read_session, run_write
+from ..models import Trip, Item
 from ..i18n import get_L, get_lang
-from .auth import require_user
+from ..services import changelog, ordering, page_cache, pages, revisions, suggest
+from ..services.page_cache import trip_scope, user_scope
+from ..templating import TEMPLATE_STREAMING, stream_response
+from .auth import Principal, require_user
 
 router = APIRouter()
 
+def _cursor(raw: str | None):
+    # ページングのカーソル "sort_order.id"（不正なら 400）
+    try:
+        return pages.decode_cursor(raw)
+    except ValueError:
+        raise HTTPException(400, "invalid cursor")
+
+def _committed(fn, touch):
+    # ordering の関数を書き込みスレッド用に：結果が None（対象外）なら rollback、それ以外は commit
+    # 1 行以上書いたときは touch(session) で版を進めてから commit
+    def run(session: Session, *args):
+        result = fn(session, *args)
+        if result is None:
+            session.rollback()
+        else:
+            if result:
+                touch(session)
+            session.commit()
+        return result
+    return run
+
+def _tagged(resp: Response, etag: str | None) -> Response:
+    # ブラウザには毎回再検証させる（If-None-Match が付いて 304 で済む）
+    if etag:
+        resp.headers["ETag"] = etag
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+def _not_modified(etag: str) -> Response:
+    return _tagged(Response(status_code=304), etag)
+
+def _touch_user(user_id: int):
+    # 一覧の並べ替え：版と「一覧の並びが変わった」記録
+    def touch(session: Session):
+        revisions.touch_user(session, user_id)
+        changelog.trip_order(session, user_id)
+    return touch
+
+def _touch_trip(user_id: int, trip_id: int):
+    # 項目の並べ替え
+    def touch(session: Session):
+        revisions.touch_trip(session, trip_id)
+        changelog.item_order(session, user_id, trip_id)
+    return touch
+
+async def _render_full(request: Request, name: str, ctx: dict, session: Session) -> Response:
+    # 全件表示。ストリーミング時は同期セッションを応答の最後まで開いておき、流し終えたら閉じる
+    # （generate() と yield_per の取り出しは Starlette がスレッドプールで 1 チャンクずつ進める）
+    ctx = {"request": request, **ctx}
+    if TEMPLATE_STREAMING:
+        return stream_response(request.app.state.templates, name, ctx, close=session.close)
+    def _render():
+        with session:
+            return request.app.state.templates.get_template(name).render(ctx)
+    return HTMLResponse(await run_in_threadpool(_render))
+
+async def _full_list(request: Request, user_id: int, lang: str) -> Response:
+    # 流し始めるまで（版の読み込み・テンプレートの準備）に失敗したらここで閉じる（以後は _render_full が閉じる）
+    session = ReadSessionLocal()
+    try:
+        rev = await run_in_threadpool(revisions.list_revision, session, user_id)
+        ctx = {"L": get_L(lang), "trips": pages.iter_trip_cards(session, user_id), "next_cursor": None}
+        resp = await _render_full(request, "trips_list.html", ctx, session)
+    except BaseException:
+        session.close()
+        raise
+    return _tagged(resp, revisions.list_etag(user_id, rev, lang, full=True))
+
+async def _full_detail(request: Request, user_id: int, trip_id: int, lang: str) -> Response:
+    session = ReadSessionLocal()
+    try:
+        trip = await run_in_threadpool(pages.trip_header, session, user_id, trip_id)
+        if trip is None:
+            raise HTTPException(404)
+        ctx = {"L": get_L(lang), "trip": trip, "items": pages.iter_item_rows(session, user_id, trip_id),
+               "next_cursor": None}
+        resp = await _render_full(request, "trip_detail.html", ctx, session)
+    except BaseException:
+        session.close()
+        raise
+    return _tagged(resp, revisions.trip_etag(trip_id, trip.revision, lang, full=True))
+
+def _int(v) -> int | None:
+    # JSON の id を int へ（null・不正値は None）
+    try:
+        return int(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
 @router.get("/")
-def root_redirect(request: Request, session: Session = Depends(get_session)):
+async def root_redirect(request: Request):
     # 未ログインなら /login へ、ログイン済なら /trips へ
     if not request.session.get("user_id"):
         return RedirectResponse(url="/login", status_code=303)
     return RedirectResponse(url="/trips", status_code=303)
 
 @router.get("/trips")
-def trips_list(request: Request, session: Session = Depends(get_session), user: User = Depends(require_user)):
+async def trips_list(request: Request, full: bool = Query(False, alias="all"),
+                     user: Principal = Depends(require_user)):
+    lang = get_lang(request)
+    inm = request.headers.get("if-none-match")
+    if inm:
+        # 条件付き GET：版を 1 行読むだけで 304
+        async with async_read_session() as session:
+            rev = await session.run_sync(revisions.list_revision, user.id)
+        etag = revisions.list_etag(user.id, rev, lang, full)
+        if revisions.matches(inm, etag):
+            return _not_modified(etag)
+    if full:
+        return await _full_list(request, user.id, lang)
+    # 描画済みページが当たれば DB もテンプレートも使わない
+    key = await page_cache.page_key(user.id, lang)
+    hit = await page_cache.get(key)
+    if hit is not None:
+        return _tagged(HTMLResponse(hit[0]), hit[1])
+    L = get_L(lang)
+    async with async_read_session() as session:
+        rev, trips, next_cursor = await session.run_sync(pages.trip_list, user.id)  # 版 + 必要な列だけ（説明は先頭のみ）
+    etag = revisions.list_etag(user.id, rev, lang)
+    resp = request.app.state.templates.TemplateResponse(
+        "trips_list.html", {"request": request, "L": L, "trips": trips, "next_cursor": next_cursor}
+    )
+    await page_cache.put(key, resp.body, etag)
+    return _tagged(resp, etag)
+
+@router.get("/trips.json")
+async def trips_page_json(
+    request: Request,
+    after: str | None = Query(None),
+    limit: int = Query(pages.TRIPS_PAGE, ge=1, le=pages.MAX_PAGE),
+    session: AsyncSession = Depends(get_async_read_session),
+    user: Principal = Depends(require_user),
+):
+    # 一覧の続きページ（キーセット）。html はそのまま #trips に追加できる断片
     L = get_L(get_lang(request))
-    trips = session.execute(select(Trip).where(Trip.user_id == user.id).order_by(Trip.sort_order, Trip.id)).scalars().all()
-    return request.app.state.templates.TemplateResponse("trips_list.html", {"request": request, "L": L, "trips": trips})
+    trips, next_cursor = await session.run_sync(pages.trip_cards, user.id, _cursor(after), limit)
+    html = request.app.state.templates.get_template("_trip_cards.html").render(L=L, trips=trips)
+    return JSONResponse(jsonable_encoder({"trips": [t._asdict() for t in trips], "html": html, "next": next_cursor}))
 
 @router.get("/trips/new")
-def new_trip_page(request: Request, user: User = Depends(require_user)):
+async def new_trip_page(request: Request, user: Principal = Depends(require_user)):
     L = get_L(get_lang(request))
     return request.app.state.templates.TemplateResponse("trip_new.html", {"request": request, "L": L})
 
 @router.post("/trips")
-def create_trip(
+async def create_trip(
     request: Request,
     title: str = Form(...),
     start_date: str | None = Form(None),
     end_date: str | None = Form(None),
     description: str | None = Form(None),
-    session: Session = Depends(get_session),
-    user: User = Depends(require_user),
+    user: Principal = Depends(require_user),
 ):
-    # 並び順は末尾へ
-    max_order = session.execute(select(Trip.sort_order).where(Trip.user_id == user.id).order_by(Trip.sort_order.desc())).scalars().first()
-    order = (max_order or 0) + 1
+    # 並び順は末尾へ（INSERT 内のサブクエリで決定、事前 SELECT なし）
     trip = Trip(
         user_id=user.id,
         title=title.strip(),
         start_date=(date.fromisoformat(start_date) if start_date else None),
         end_date=(date.fromisoformat(end_date) if end_date else None),
         description=(description or None),
-        sort_order=order,
+        sort_order=ordering.trip_append_key(user.id),
     )
-    session.add(trip)
-    session.commit()
-    return RedirectResponse(url=f"/trips/{trip.id}", status_code=303)
+
+    def _create(session: Session) -> int:
+        session.add(trip)
+        session.flush()
+        revisions.touch_user(session, user.id)
+        changelog.trip(session, user.id, trip.id)
+        session.commit()
+        return trip.id
+
+    trip_id = await run_write(_create)
+    await page_cache.bump(user_scope(user.id))
+    return RedirectResponse(url=f"/trips/{trip_id}", status_code=303)
 
 @router.get("/trips/{trip_id}")
-def trip_detail(request: Request, trip_id: int, session: Session = Depends(get_session), user: User = Depends(require_user)):
-    L = get_L(get_lang(request))
-    trip = session.get(Trip, trip_id)
-    if not trip or trip.user_id != user.id:
+async def trip_detail(request: Request, trip_id: int, full: bool = Query(False, alias="all"),
+                      user: Principal = Depends(require_user)):
+    lang = get_lang(request)
+    inm = request.headers.get("if-none-match")
+    if inm:
+        async with async_read_session() as session:
+            rev = await session.run_sync(revisions.trip_revision, user.id, trip_id)
+        if rev is None:
+            raise HTTPException(404)
+        etag = revisions.trip_etag(trip_id, rev, lang, full)
+        if revisions.matches(inm, etag):
+            return _not_modified(etag)
+    if full:
+        return await _full_detail(request, user.id, trip_id, lang)
+    key = await page_cache.page_key(user.id, lang, trip_id)
+    hit = await page_cache.get(key)
+    if hit is not None:
+        return _tagged(HTMLResponse(hit[0]), hit[1])
+    L = get_L(lang)
+    async with async_read_session() as session:
+        found = await session.run_sync(pages.trip_detail, user.id, trip_id)  # trip ⟕ items（先頭ページ）を 1 クエリで
+    if not found:
         raise HTTPException(404)
-    items = trip.items  # order_by を model で指定済
-    return request.app.state.templates.TemplateResponse("trip_detail.html", {"request": request, "L": L, "trip": trip, "items": items})
+    trip, items, next_cursor = found
+    etag = revisions.trip_etag(trip_id, trip.revision, lang)
+    resp = request.app.state.templates.TemplateResponse(
+        "trip_detail.html", {"request": request, "L": L, "trip": trip, "items": items, "next_cursor": next_cursor}
+    )
+    await page_cache.put(key, resp.body, etag)
+    return _tagged(resp, etag)
+
+@router.get("/trips/{trip_id}/items.json")
+async def items_page_json(
+    request: Request,
+    trip_id: int,
+    after: str | None = Query(None),
+    limit: int = Query(pages.ITEMS_PAGE, ge=1, le=pages.MAX_PAGE),
+    session: AsyncSession = Depends(get_async_read_session),
+    user: Principal = Depends(require_user),
+):
+    # 項目の続きページ（キーセット）。html はそのまま #items に追加できる断片
+    L = get_L(get_lang(request))
+    items, next_cursor = await session.run_sync(pages.item_rows, user.id, trip_id, _cursor(after), limit)
+    html = request.app.state.templates.get_template("_item_rows.html").render(L=L, trip={"id": trip_id}, items=items)
+    return JSONResponse(jsonable_encoder({"items": [it.as_dict() for it in items], "html": html, "next": next_cursor}))
+
+@router.get("/items/suggest.json")
+async def suggest_titles(
+    q: str = Query("", max_length=200),
+    limit: int = Query(suggest.SUGGEST_LIMIT, ge=1, le=suggest.MAX_SUGGEST_LIMIT),
+    user: Principal = Depends(require_user),
+):
+    # 項目タイトルの入力補完（これまでに使ったタイトルから。2 回目以降は DB に触れない）
+    return JSONResponse({"q": q, "titles": await suggest.suggest(user.id, q, limit)})
 
 @router.post("/trips/{trip_id}/delete")
-def delete_trip(request: Request, trip_id: int, session: Session = Depends(get_session), user: User = Depends(require_user)):
-    trip = session.get(Trip, trip_id)
-    if not trip or trip.user_id != user.id:
-        raise HTTPException(404)
-    session.delete(trip)
-    session.commit()
+async def delete_trip(request: Request, trip_id: int, user: Principal = Depends(require_user)):
+    def _delete(session: Session):
+        trip = session.get(Trip, trip_id)
+        if not trip or trip.user_id != user.id:
+            raise HTTPException(404)
+        session.delete(trip)
+        revisions.touch_user(session, user.id)
+        changelog.trip(session, user.id, trip_id)
+        session.commit()
+
+    await run_write(_delete)
+    await page_cache.bump(user_scope(user.id), trip_scope(trip_id))
+    suggest.forget(user.id)  # 消えた項目のタイトルは読んでいないので、索引ごと作り直す
     return RedirectResponse(url="/trips", status_code=303)
 
-@router.post("/trips/reorder")
-async def reorder_trips(request: Request, session: Session = Depends(get_session), user: User = Depends(require_user)):
+@router.post("/trips/reorder", dependencies=[Depends(no_compression)])
+async def reorder_trips(request: Request, user: Principal = Depends(require_user)):
     data = await request.json()
     ids: list[int] = data.get("ids") or []
-    # 自分の trip のみ対象
-    my_ids = set([t.id for t in session.execute(select(Trip.id).where(Trip.user_id == user.id)).scalars().all()])
-    order = 0
-    for tid in ids:
-        if tid in my_ids:
-            t = session.get(Trip, tid)
-            t.sort_order = order
-            order += 1
-    session.commit()
-    return JSONResponse({"ok": True})
+    # 自分の trip のみ対象（UPDATE 1 本、変わった行だけ）
+    changed = await run_write(_committed(ordering.reorder_trips, _touch_user(user.id)), user.id, ids)
+    await page_cache.bump(user_scope(user.id))
+    return JSONResponse({"ok": True, "changed": changed})
+
+@router.post("/trips/move", dependencies=[Depends(no_compression)])
+async def move_trip(request: Request, user: Principal = Depends(require_user)):
+    # 1 件移動：{"id": X, "prev": A, "next": B}（A/B は移動後の前後、端なら null）
+    data = await request.json()
+    written = await run_write(_committed(ordering.move_trip, _touch_user(user.id)), user.id, _int(data.get("id")), _int(data.get("prev")), _int(data.get("next")))
+    if written is None:
+        return JSONResponse({"ok": False}, status_code=409)
+    await page_cache.bump(user_scope(user.id))
+    return JSONResponse({"ok": True, "changed": written})
 
 @router.post("/trips/{trip_id}/items")
-def create_item(
+async def create_item(
     request: Request,
     trip_id: int,
     title: str = Form(...),
     date_str: str | None = Form(None),
     time: str | None = Form(None),
     note: str | None = Form(None),
-    session: Session = Depends(get_session),
-    user: User = Depends(require_user),
+    user: Principal = Depends(require_user),
 ):
-    trip = session.get(Trip, trip_id)
-    if not trip or trip.user_id != user.id:
-        raise HTTPException(404)
-    max_order = session.execute(select(Item.sort_order).where(Item.trip_id == trip_id).order_by(Item.sort_order.desc())).scalars().first()
-    order = (max_order or 0) + 1
     it = Item(
         trip_id=trip_id,
         title=title.strip(),
         date=(date.fromisoformat(date_str) if date_str else None),
         time=(time or None),
         note=(note or None),
-        sort_order=order,
+        sort_order=ordering.item_append_key(trip_id),
     )
-    session.add(it)
-    session.commit()
+
+    def _create(session: Session):
+        trip = session.get(Trip, trip_id)
+        if not trip or trip.user_id != user.id:
+            raise HTTPException(404)
+        session.add(it)
+        session.flush()
+        revisions.touch_trip(session, trip_id)
+        changelog.item(session, user.id, it.id)
+        session.commit()
+
+    await run_write(_create)
+    await page_cache.bump(trip_scope(trip_id))
+    suggest.added(user.id, title.strip())
     return RedirectResponse(url=f"/trips/{trip_id}", status_code=303)
 
 @router.post("/trips/{trip_id}/items/{item_id}/edit")
-def edit_item(
+async def edit_item(
     request: Request,
     trip_id: int,
     item_id: int,
@@ -128,79 +336,98 @@ def edit_item(
     date_str: str | None = Form(None),
     time: str | None = Form(None),
     note: str | None = Form(None),
-    session: Session = Depends(get_session),
-    user: User = Depends(require_user),
+    user: Principal = Depends(require_user),
 ):
-    trip = session.get(Trip, trip_id)
-    if not trip or trip.user_id != user.id:
-        raise HTTPException(404)
-    it = session.get(Item, item_id)
-    if not it or it.trip_id != trip_id:
-        raise HTTPException(404)
-    it.title = title.strip()
-    it.date = (date.fromisoformat(date_str) if date_str else None)
-    it.time = (time or None)
-    it.note = (note or None)
-    session.add(it)
-    session.commit()
+    def _edit(session: Session):
+        trip = session.get(Trip, trip_id)
+        if not trip or trip.user_id != user.id:
+            raise HTTPException(404)
+        it = session.get(Item, item_id)
+        if not it or it.trip_id != trip_id:
+            raise HTTPException(404)
+        old_title = it.title  # commit 後は読めないので先に
+        it.title = title.strip()
+        it.date = (date.fromisoformat(date_str) if date_str else None)
+        it.time = (time or None)
+        it.note = (note or None)
+        revisions.touch_trip(session, trip_id)
+        changelog.item(session, user.id, item_id)
+        session.commit()
+        return old_title
+
+    old_title = await run_write(_edit)
+    await page_cache.bump(trip_scope(trip_id))
+    if old_title != title.strip():
+        suggest.removed(user.id, old_title)
+        suggest.added(user.id, title.strip())
     return RedirectResponse(url=f"/trips/{trip_id}", status_code=303)
 
 @router.post("/trips/{trip_id}/items/{item_id}/delete")
-def delete_item(request: Request, trip_id: int, item_id: int, session: Session = Depends(get_session), user: User = Depends(require_user)):
-    trip = session.get(Trip, trip_id)
-    if not trip or trip.user_id != user.id:
-        raise HTTPException(404)
-    it = session.get(Item, item_id)
-    if it and it.trip_id == trip_id:
-        session.delete(it)
-        session.commit()
+async def delete_item(request: Request, trip_id: int, item_id: int, user: Principal = Depends(require_user)):
+    def _delete(session: Session):
+        trip = session.get(Trip, trip_id)
+        if not trip or trip.user_id != user.id:
+            raise HTTPException(404)
+        it = session.get(Item, item_id)
+        if it and it.trip_id == trip_id:
+            removed_title = it.title
+            session.delete(it)
+            revisions.touch_trip(session, trip_id)
+            changelog.item(session, user.id, item_id)
+            session.commit()
+            return removed_title
+
+    removed_title = await run_write(_delete)
+    await page_cache.bump(trip_scope(trip_id))
+    if removed_title is not None:
+        suggest.removed(user.id, removed_title)
     return RedirectResponse(url=f"/trips/{trip_id}", status_code=303)
 
-@router.post("/trips/{trip_id}/items/reorder")
-async def reorder_items(request: Request, trip_id: int, session: Session = Depends(get_session), user: User = Depends(require_user)):
+@router.post("/trips/{trip_id}/items/reorder", dependencies=[Depends(no_compression)])
+async def reorder_items(request: Request, trip_id: int, user: Principal = Depends(require_user)):
     data = await request.json()
     ids: list[int] = data.get("ids") or []
-    # 自分の trip に属する item のみ対象
-    my_ids = set([i.id for i in session.execute(
-        select(Item.id).join(Trip, Item.trip_id == Trip.id).where(Trip.user_id == user.id, Item.trip_id == trip_id)
-    ).scalars().all()])
-    order = 0
-    for iid in ids:
-        if iid in my_ids:
-            it = session.get(Item, iid)
-            it.sort_order = order
-            order += 1
-    session.commit()
-    return JSONResponse({"ok": True})
-
-# -*- coding: utf-8 -*-
-# 日本語コメント: 旅行ヘッダ（タイトル／開始日／終了日／説明）を更新するエンドポイント
-from fastapi.responses import RedirectResponse
-from sqlmodel import Session
+    # 自分の trip に属する item のみ対象（UPDATE 1 本、変わった行だけ）
+    changed = await run_write(_committed(ordering.reorder_items, _touch_trip(user.id, trip_id)), user.id, trip_id, ids)
+    await page_cache.bump(trip_scope(trip_id))
+    return JSONResponse({"ok": True, "changed": changed})
+
+@router.post("/trips/{trip_id}/items/move", dependencies=[Depends(no_compression)])
+async def move_item(request: Request, trip_id: int, user: Principal = Depends(require_user)):
+    # 1 件移動：{"id": X, "prev": A, "next": B}（同じ trip 内）
+    data = await request.json()
+    written = await run_write(_committed(ordering.move_item, _touch_trip(user.id, trip_id)), user.id, trip_id, _int(data.get("id")), _int(data.get("prev")), _int(data.get("next")))
+    if written is None:
+        return JSONResponse({"ok": False}, status_code=409)
+    await page_cache.bump(trip_scope(trip_id))
+    return JSONResponse({"ok": True, "changed": written})
 
+# 旅行ヘッダ（タイトル／開始日／終了日／説明）を更新する
 @router.post("/trips/{trip_id}/edit")
-def edit_trip_action(
+async def edit_trip_action(
     trip_id: int,
     title: str = Form(...),
     start_date: str | None = Form(None),
     end_date: str | None = Form(None),
     description: str | None = Form(None),
-    session: Session = Depends(get_session),
+    user: Principal = Depends(require_user),
 ):
-    # 日本語コメント: 対象の旅行を取得
-    from app.models import Trip  # ループインポート回避のため関数内で import
-    trip = session.get(Trip, trip_id)
-    if not trip:
-        raise HTTPException(404, "Trip not found")
-
-    # 日本語コメント: 値を反映（空文字は None に正規化）
-    trip.title = title
-    trip.start_date = (start_date or None)
-    trip.end_date = (end_date or None)
-    trip.description = (description or None)
-
-    session.add(trip)
-    session.commit()
-
-    # 日本語コメント: 編集後は元の詳細に戻る
+    def _edit(session: Session):
+        trip = session.get(Trip, trip_id)
+        if not trip or trip.user_id != user.id:
+            raise HTTPException(404, "Trip not found")
+        # 値を反映（空文字は None に正規化）
+        trip.title = title
+        trip.start_date = (date.fromisoformat(start_date) if start_date else None)
+        trip.end_date = (date.fromisoformat(end_date) if end_date else None)
+        trip.description = (description or None)
+        revisions.touch_trip(session, trip_id)
+        revisions.touch_user(session, user.id)
+        changelog.trip(session, user.id, trip_id)
+        session.commit()
+
+    await run_write(_edit)
+    await page_cache.bump(user_scope(user.id), trip_scope(trip_id))
+
+    # 編集後は元の詳細に戻る
     return RedirectResponse(url=f"/trips/{trip_id}", status_code=303)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# app/schemas.py
+# JSON API（/api/v1）の入出力モデル。
+# - *In / *Patch：作成・部分更新の入力（Patch は送られてきた項目だけ反映：model_fields_set）
+# - *Out：レスポンス。pages の行オブジェクトから from_attributes でそのまま作る
+# - バッチの操作は "op" で判別する。作成系に ref を付けると、同じバッチ内の後続の操作から
+#   id の代わりにその文字列で参照できる（例：旅行を作ってすぐ項目を追加）
+# - SyncOut：差分同期（services.changelog）の応答
+
+import datetime as dt
+from typing import Annotated, Literal, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints
+
+# 1 回のバッチで受け付ける操作数
+MAX_BATCH = 500
+
+Title = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=200)]
+Ref = Annotated[str, StringConstraints(min_length=1, max_length=64)]
+# 既存の id か、同じバッチ内の ref
+Target = Union[int, Ref]
+
+
+# ---------- 旅行 ----------
+class TripIn(BaseModel):
+    title: Title
+    start_date: Optional[dt.date] = None
+    end_date: Optional[dt.date] = None
+    description: Optional[str] = None
+
+
+class TripPatch(BaseModel):
+    title: Optional[Title] = None
+    start_date: Optional[dt.date] = None
+    end_date: Optional[dt.date] = None
+    description: Optional[str] = None
+
+
+class TripOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    start_date: Optional[dt.date]
+    end_date: Optional[dt.date]
+    description: Optional[str]
+    sort_order: int
+    revision: int
+
+
+class TripPage(BaseModel):
+    trips: list[TripOut]
+    next: Optional[str] = None
+
+
+# ---------- 項目 ----------
+class ItemIn(BaseModel):
+    title: Title
+    date: Optional[dt.date] = None
+    time: Optional[Annotated[str, StringConstraints(max_length=20)]] = None
+    note: Optional[str] = None
+
+
+class ItemPatch(BaseModel):
+    title: Optional[Title] = None
+    date: Optional[dt.date] = None
+    time: Optional[Annotated[str, StringConstraints(max_length=20)]] = None
+    note: Optional[str] = None
+
+
+class ItemOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    date: Optional[dt.date]
+    time: Optional[str]
+    note: Optional[str]
+    sort_order: int
+
+
+class ItemPage(BaseModel):
+    items: list[ItemOut]
+    next: Optional[str] = None
+
+
+# ---------- バッチ ----------
+class CreateTrip(TripIn):
+    op: Literal["create_trip"]
+    ref: Optional[Ref] = None
+
+
+class UpdateTrip(TripPatch):
+    op: Literal["update_trip"]
+    id: Target
+
+
+class DeleteTrip(BaseModel):
+    op: Literal["delete_trip"]
+    id: Target
+
+
+class ReorderTrips(BaseModel):
+    op: Literal["reorder_trips"]
+    ids: list[Target]
+
+
+class MoveTrip(BaseModel):
+    # prev / next は移動後の前後（端なら null）
+    op: Literal["move_trip"]
+    id: Target
+    prev: Optional[Target] = None
+    next: Optional[Target] = None
+
+
+class CreateItem(ItemIn):
+    op: Literal["create_item"]
+    trip_id: Target
+    ref: Optional[Ref] = None
+
+
+class UpdateItem(ItemPatch):
+    op: Literal["update_item"]
+    trip_id: Target
+    id: Target
+
+
+class DeleteItem(BaseModel):
+    op: Literal["delete_item"]
+    trip_id: Target
+    id: Target
+
+
+class ReorderItems(BaseModel):
+    op: Literal["reorder_items"]
+    trip_id: Target
+    ids: list[Target]
+
+
+class MoveItem(BaseModel):
+    op: Literal["move_item"]
+    trip_id: Target
+    id: Target
+    prev: Optional[Target] = None
+    next: Optional[Target] = None
+
+
+Operation = Annotated[
+    Union[CreateTrip, UpdateTrip, DeleteTrip, ReorderTrips, MoveTrip,
+          CreateItem, UpdateItem, DeleteItem, ReorderItems, MoveItem],
+    Field(discriminator="op"),
+]
+
+
+class BatchIn(BaseModel):
+    ops: list[Operation] = Field(min_length=1, max_length=MAX_BATCH)
+
+
+class OpResult(BaseModel):
+    index: int
+    op: str
+    id: Optional[int] = None  # 作成・更新・削除した行の id
+    ref: Optional[str] = None
+    changed: int = 0  # 書いた行数
+
+
+class BatchError(BaseModel):
+    index: int
+    status: int
+    detail: str
+
+
+class BatchOut(BaseModel):
+    # ok=false のときは何も反映されていない（全体を rollback）
+    ok: bool
+    results: list[OpResult] = []
+    error: Optional[BatchError] = None
+
+
+# ---------- 差分同期 ----------
+class SyncTrip(BaseModel):
+    # TripOut から版（画面の ETag 用）を除いたもの
+    id: int
+    title: str
+    start_date: Optional[dt.date]
+    end_date: Optional[dt.date]
+    description: Optional[str]
+    sort_order: int
+
+
+class SyncItem(ItemOut):
+    trip_id: int
+
+
+class SyncOut(BaseModel):
+    # 端末側の適用順：reset なら手元を全部捨てる → trips / items を上書き → deleted_* を消す
+    # （trip の削除はその項目も消す）→ trip_order / item_order の sort_order を反映。
+    # 次回は cursor を since に渡す。more が true ならすぐ続きを取る
+    cursor: int
+    more: bool = False
+    reset: bool = False
+    trips: list[SyncTrip] = []
+    items: list[SyncItem] = []
+    deleted_trips: list[int] = []
+    deleted_items: list[int] = []
+    trip_order: Optional[list[tuple[int, int]]] = None  # 一覧の並び：[[trip_id, sort_order], …]
+    item_order: dict[int, list[tuple[int, int]]] = {}   # trip_id → [[item_id, sort_order], …]
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+# app/services/backup.py
+# SQLite のオンラインバックアップ（スナップショット）と復元。
+# - sqlite3 のバックアップ API で BACKUP_PAGES ページずつ写し、ステップの間は BACKUP_SLEEP_MS 休む
+#   （ロックを持つのは 1 ステップの間だけ。WAL なので書き込みはバックアップを待たない）
+# - 写している途中に他の接続が書き込むと、SQLite は次のステップでコピーを最初からやり直す。
+#   BACKUP_MAX_RESTARTS 回やり直したら残りを 1 ステップで写し切る
+#   （WAL では読み取りのスナップショットを持つだけなので、その間も書き込みは進む。チェックポイントだけ後回しになる）
+# - 写したものは integrity_check と foreign_key_check を通してから journal_mode=DELETE（1 ファイルで完結）にし、
+#   gzip で圧縮して BACKUP_DIR に置く。一時ファイルに書いてから rename するので、途中で落ちても半端なファイルは残らない
+# - 保持：このモジュールが付けた名前（<DB 名>_YYYYmmddHHMMSS.db[.gz]）を新しい順に BACKUP_KEEP 個残す
+# - 定期実行：BACKUP_INTERVAL_MIN > 0 なら startup で始めるタスクが間隔ごとに取る（スレッドプールで実行）。
+#   uvicorn --workers 2 以上では各ワーカーが取ってしまうので、cron などから CLI の snapshot を呼ぶ
+# - 復元：スナップショットを検査してから、バックアップ API で DB に書き戻す（ファイルのコピーと違い -wal と食い違わない）。
+#   サーバーを止めてから使う。書き戻す前の DB も <DB 名>_YYYYmmddHHMMSS.pre-restore.db.gz として残す
+#   python -m app.services.backup snapshot | list | check FILE | restore FILE
+#   BACKUP_DIR          = 置き場所（既定 backups）
+#   BACKUP_KEEP         = 残す数（既定 14）
+#   BACKUP_INTERVAL_MIN = 定期実行の間隔（分、既定 0 = しない）
+#   BACKUP_COMPRESS     = gzip（既定）| none
+#   BACKUP_PAGES        = 1 ステップで写すページ数（既定 256 = ページ 4 KiB で 1 MiB）
+#   BACKUP_SLEEP_MS     = ステップの間の休み（既定 5）
+#   BACKUP_MAX_RESTARTS = 1 ステップで写し切るまでのやり直しの回数（既定 3）
+
+import argparse, asyncio, gzip, logging, os, re, shutil, sqlite3, sys, time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.engine import make_url
+
+from .. import metrics
+
+log = logging.getLogger("uvicorn.error")
+
+SNAPSHOTS = metrics.counter("backup_snapshot_total", "database snapshots written and verified")
+FAILURES = metrics.counter("backup_failed_total", "database snapshots that failed or did not pass the integrity check")
+RESTARTS = metrics.counter("backup_restart_total", "online backup copies restarted by a concurrent write")
+SNAPSHOT_SECONDS = metrics.histogram("backup_seconds", "time to copy, check and compress one snapshot",
+                                     buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900))
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "14"))
+BACKUP_INTERVAL_MIN = float(os.getenv("BACKUP_INTERVAL_MIN", "0"))
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "gzip") == "gzip"
+BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", "256"))
+BACKUP_SLEEP_MS = float(os.getenv("BACKUP_SLEEP_MS", "5"))
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "3"))
+
+
+class BackupFailed(RuntimeError):
+    pass
+
+
+@dataclass
+class Snapshot:
+    path: Path
+    pages: int
+    size: int          # 置いたファイルのバイト数（圧縮後）
+    seconds: float
+    restarts: int
+
+
+def database_path(url: Optional[str] = None) -> Optional[Path]:
+    # DATABASE_URL が SQLite のファイルならそのパス（MySQL・:memory: は None）
+    if url is None:
+        from ..db import DATABASE_URL as url
+    u = make_url(url)
+    if u.get_backend_name() != "sqlite" or not u.database or u.database == ":memory:" or "mode=memory" in url:
+        return None
+    return Path(u.database).resolve()
+
+
+# ---------- 名前と保持 ----------
+def _pattern(stem: str) -> re.Pattern:
+    return re.compile(rf"^{re.escape(stem)}_(\d{{14}})(?:-(\d+))?\.db(?:\.gz)?$")
+
+
+def snapshot_name(stem: str, out_dir: Path, compress: bool, label: str = "") -> Path:
+    # 同じ秒に 2 つ目を取ったら -1, -2 … を付ける
+    stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    suffix = (f".{label}" if label else "") + ".db" + (".gz" if compress else "")
+    path, n = out_dir / f"{stem}_{stamp}{suffix}", 0
+    while path.exists():
+        n += 1
+        path = out_dir / f"{stem}_{stamp}-{n}{suffix}"
+    return path
+
+
+def snapshots(out_dir: Path, stem: str) -> list[Path]:
+    # 新しい順（pre-restore などラベル付きのものは含めない）
+    pattern = _pattern(stem)
+    found = []
+    for p in out_dir.glob(f"{stem}_*"):
+        m = pattern.match(p.name)
+        if m:
+            found.append(((m.group(1), int(m.group(2) or 0)), p))
+    return [p for _, p in sorted(found, reverse=True)]
+
+
+def prune(out_dir: Path, stem: str, keep: int) -> list[Path]:
+    removed = snapshots(out_dir, stem)[max(keep, 1):]
+    for p in removed:
+        p.unlink(missing_ok=True)
+    return removed
+
+
+# ---------- コピーと検査 ----------
+class _Restart(Exception):
+    pass
+
+
+def copy(src: sqlite3.Connection, dst: sqlite3.Connection, pages: int = BACKUP_PAGES,
+         sleep_ms: float = BACKUP_SLEEP_MS, max_restarts: int = BACKUP_MAX_RESTARTS) -> tuple[int, int]:
+    # (総ページ数, やり直した回数)。やり直しは残りページ数が前のステップより増えたことで分かる
+    state = {"remaining": None, "total": 0, "restarts": 0}
+
+    def progress(_status, remaining, total):
+        last = state["remaining"]
+        state["remaining"], state["total"] = remaining, total
+        if last is not None and remaining > last:
+            state["restarts"] += 1
+            RESTARTS.inc()
+            if state["restarts"] >= max_restarts:
+                raise _Restart
+        if remaining and sleep_ms:
+            time.sleep(sleep_ms / 1000)
+
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+    except _Restart:
+        src.backup(dst)  # 残りを 1 ステップで（先頭から写し直す）
+        state["total"] = dst.execute("PRAGMA page_count").fetchone()[0]
+    return state["total"], state["restarts"]
+
+
+def problems(conn: sqlite3.Connection, quick: bool = False) -> list[str]:
+    # 空なら問題なし
+    rows = [r[0] for r in conn.execute("PRAGMA quick_check" if quick else "PRAGMA integrity_check")]
+    found = [] if rows == ["ok"] else rows
+    found += [f"foreign key: {table} rowid {rowid} -> {parent}"
+              for table, rowid, parent, _ in conn.execute("PRAGMA foreign_key_check")]
+    return found
+
+
+def _open_ro(path: Path) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+
+def _gzip(raw: Path, dest: Path) -> None:
+    with open(raw, "rb") as f, gzip.open(dest, "wb", compresslevel=6) as out:
+        shutil.copyfileobj(f, out, 1024 * 1024)
+
+
+def take(db_path: Optional[Path] = None, out_dir: Optional[Path] = None, compress: bool = BACKUP_COMPRESS,
+         keep: Optional[int] = BACKUP_KEEP, label: str = "", **copy_args) -> Snapshot:
+    # スナップショットを 1 つ取って検査し、保持数を超えた古いものを消す（keep=None なら消さない）
+    t0 = time.perf_counter()
+    db_path = db_path or database_path()
+    if db_path is None:
+        raise BackupFailed("SQLite のファイル DB のみ対応しています")
+    out_dir = Path(out_dir or BACKUP_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    final = snapshot_name(db_path.stem, out_dir, compress, label)
+    raw = out_dir / f".{final.name}.tmp"
+    packed = out_dir / f".{final.name}.gz.tmp"
+    try:
+        src, dst = _open_ro(db_path), sqlite3.connect(raw)
+        try:
+            pages, restarts = copy(src, dst, **copy_args)
+            dst.execute("PRAGMA journal_mode=DELETE")
+            found = problems(dst)
+        finally:
+            src.close()
+            dst.close()
+        if found:
+            raise BackupFailed(f"integrity check failed: {'; '.join(found[:5])}")
+        os.chmod(raw, 0o600)  # パスワードのハッシュを含む
+        if compress:
+            _gzip(raw, packed)
+            os.chmod(packed, 0o600)
+            os.replace(packed, final)
+        else:
+            os.replace(raw, final)
+    except Exception:
+        FAILURES.inc()
+        raise
+    finally:
+        raw.unlink(missing_ok=True)
+        packed.unlink(missing_ok=True)
+    if keep is not None and not label:
+        prune(out_dir, db_path.stem, keep)
+    seconds = time.perf_counter() - t0
+    SNAPSHOTS.inc()
+    SNAPSHOT_SECONDS.observe(seconds)
+    return Snapshot(final, pages, final.stat().st_size, seconds, restarts)
+
+
+def unpacked(path: Path, work_dir: Path) -> Path:
+    # .gz なら work_dir に展開した一時ファイル（呼び出し側で消す）、そうでなければそのまま
+    if path.suffix != ".gz":
+        return path
+    raw = work_dir / f".{path.stem}.restore.tmp"
+    with gzip.open(path, "rb") as f, open(raw, "wb") as out:
+        shutil.copyfileobj(f, out, 1024 * 1024)
+    return raw
+
+
+def check(path: Path, quick: bool = False) -> list[str]:
+    path = Path(path)
+    raw = unpacked(path, path.parent)
+    try:
+        conn = _open_ro(raw)
+        try:
+            return problems(conn, quick)
+        except sqlite3.DatabaseError as e:
+            return [str(e)]
+        finally:
+            conn.close()
+    finally:
+        if raw != path:
+            raw.unlink(missing_ok=True)
+
+
+# ---------- 復元 ----------
+def _change_seq(conn: sqlite3.Connection) -> int:
+    # 同期カーソル（changes.id）の採番の現在値。テーブルが無ければ 0
+    try:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def _resync(db_path: Path, floor_after: int) -> None:
+    # 戻した DB の changes の採番を戻す前の値より先へ進め、全ユーザーの floor をその先へ。
+    # 端末が持っている（戻す前の DB で発行された）カーソルは floor より小さくなり、次回の同期で全件を取り直す
+    from sqlalchemy import create_engine, inspect, select, text
+    from sqlalchemy.orm import Session
+
+    from ..models import User
+    from . import changelog
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        if not inspect(engine).has_table("changes"):
+            return
+        with Session(engine) as session:
+            session.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'changes' AND seq < :seq"),
+                            {"seq": floor_after})
+            if not session.execute(text("SELECT 1 FROM sqlite_sequence WHERE name = 'changes'")).first():
+                session.execute(text("INSERT INTO sqlite_sequence(name, seq) VALUES ('changes', :seq)"),
+                                {"seq": floor_after})
+            for user_id in session.execute(select(User.id)).scalars().all():
+                changelog.reset(session, user_id)
+            session.commit()
+    finally:
+        engine.dispose()
+
+
+def restore(snapshot: Path, db_path: Optional[Path] = None, out_dir: Optional[Path] = None) -> Optional[Path]:
+    # スナップショットを検査して db_path へ書き戻す。戻す前の DB があればそのスナップショットのパスを返す
+    snapshot = Path(snapshot)
+    db_path = db_path or database_path()
+    if db_path is None:
+        raise BackupFailed("SQLite のファイル DB のみ対応しています")
+    raw = unpacked(snapshot, db_path.parent)
+    try:
+        src = _open_ro(raw)
+        try:
+            try:
+                found = problems(src)
+            except sqlite3.DatabaseError as e:
+                found = [str(e)]
+            if found:
+                raise BackupFailed(f"{snapshot.name}: integrity check failed: {'; '.join(found[:5])}")
+            before, seq = None, 0
+            if db_path.exists():
+                before = take(db_path, out_dir, label="pre-restore", keep=None).path
+                conn = sqlite3.connect(db_path)
+                try:
+                    seq = _change_seq(conn)
+                finally:
+                    conn.close()
+            dst = sqlite3.connect(db_path)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+    finally:
+        if raw != snapshot:
+            raw.unlink(missing_ok=True)
+    _resync(db_path, seq)
+    return before
+
+
+def clear_page_cache() -> None:
+    # 描画キャッシュ（disk）は DB の外にあるので、戻した DB と食い違うページを捨てる
+    path = Path(os.getenv("PAGE_CACHE_DB", "page_cache.db"))
+    if not path.exists():
+        return
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("DELETE FROM pages")
+    except sqlite3.OperationalError:
+        pass
+    finally:
+        conn.close()
+
+
+# ---------- 定期実行 ----------
+_task: Optional[asyncio.Task] = None
+
+
+async def _loop(interval: float) -> None:
+    from starlette.concurrency import run_in_threadpool
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            snap = await run_in_threadpool(take)
+            log.info(f"[BACKUP] {snap.path.name} {snap.size / 2**20:.1f} MiB in {snap.seconds:.1f}s"
+                     f" (restarts {snap.restarts})")
+        except Exception as e:
+            log.error(f"[BACKUP ERROR] {e}")
+
+
+async def start() -> None:
+    global _task
+    if _task is not None or BACKUP_INTERVAL_MIN <= 0 or database_path() is None:
+        return
+    _task = asyncio.create_task(_loop(BACKUP_INTERVAL_MIN * 60))
+
+
+async def stop() -> None:
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    await asyncio.gather(_task, return_exceptions=True)
+    _task = None
+
+
+# ---------- CLI ----------
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="SQLite のスナップショット（オンラインバックアップ）と復元")
+    ap.add_argument("--dir", default=BACKUP_DIR, help=f"置き場所（既定 {BACKUP_DIR}）")
+    sub = ap.add_subparsers(dest="command", required=True)
+    snap = sub.add_parser("snapshot")
+    snap.add_argument("--keep", type=int, default=BACKUP_KEEP)
+    snap.add_argument("--no-compress", action="store_true")
+    sub.add_parser("list")
+    ck = sub.add_parser("check")
+    ck.add_argument("file")
+    ck.add_argument("--quick", action="store_true", help="quick_check（索引と表の突き合わせを省く）")
+    rs = sub.add_parser("restore", help="サーバーを止めてから実行")
+    rs.add_argument("file")
+    args = ap.parse_args(argv)
+
+    db_path = database_path()
+    if db_path is None and args.command in ("snapshot", "list", "restore"):
+        print("SQLite のファイル DB のみ対応しています")
+        return 1
+    out_dir = Path(args.dir)
+    if args.command in ("check", "restore") and not Path(args.file).is_file():
+        print(f"no such file: {args.file}")
+        return 1
+    try:
+        if args.command == "snapshot":
+            s = take(db_path, out_dir, compress=not args.no_compress, keep=args.keep)
+            print(f"wrote {s.path} ({s.pages} pages, {s.size / 2**20:.1f} MiB, {s.seconds:.1f} s, restarts {s.restarts})")
+        elif args.command == "list":
+            for p in snapshots(out_dir, db_path.stem):
+                print(f"{p}  {p.stat().st_size / 2**20:.1f} MiB")
+        elif args.command == "check":
+            found = check(Path(args.file), args.quick)
+            print("ok" if not found else "\n".join(found))
+            return 1 if found else 0
+        else:
+            before = restore(Path(args.file), db_path, out_dir)
+            clear_page_cache()
+            if before:
+                print(f"saved the previous database as {before}")
+            print(f"restored {db_path} from {args.file}")
+            print("端末は次回の同期で全件を取り直します。サーバーを起動してください")
+    except (BackupFailed, OSError) as e:  # OSError：gzip でないファイルなど
+        print(f"failed: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# app/services/changelog.py
+# オフライン端末向けの差分同期。
+# - 記録：更新系は commit 前に同じトランザクションで trip / item / trip_order / item_order を呼ぶ
+#   （revisions.touch_* と同じ場所。並べ替えは 1 件ずつではなく「この並びが変わった」を 1 行）
+#   登録時のサンプル複製は記録しない（端末の最初の同期は必ず全件なので）
+#   取り込みのような大量の追加は 1 行ずつ記録せず reset() で floor を進める（端末は次回全件を取り直す）
+# - 読み取り：changes_since() が since より後に変わった行の「今の中身」を返す（同じ行の変更は 1 つにまとまる）
+#   今は無い行は削除（tombstone）。trip の削除はその項目の削除も兼ねる
+# - 圧縮：compact() が同じ行の古い記録を消し、保持期間を過ぎた記録を消して users.changes_floor を進める。
+#   floor より古いカーソルで来た端末には全件（reset）を返す
+#   python -m app.services.changelog [--days 30]
+#   CHANGELOG_RETENTION_DAYS = 保持日数（既定 30）
+# カーソルは changes.id。SQLite は書き込みが 1 本なので id の順に commit される（MySQL で書き込みスレッドを
+# 増やす場合は、id の採番と commit の順がずれうる点に注意）。
+
+import argparse, os
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from ..models import Change, Item, Trip, User
+
+TRIP, ITEM, TRIP_ORDER, ITEM_ORDER = "trip", "item", "trip_order", "item_order"
+
+CHANGELOG_RETENTION_DAYS = int(os.getenv("CHANGELOG_RETENTION_DAYS", "30"))
+
+# 1 回の同期で読む記録の数
+SYNC_LIMIT = 1000
+MAX_SYNC_LIMIT = 5000
+
+# 返す列（schemas.SyncTrip / SyncItem と同じ）
+_TRIP_COLS = (Trip.id, Trip.title, Trip.start_date, Trip.end_date, Trip.description, Trip.sort_order)
+_ITEM_COLS = (Item.id, Item.trip_id, Item.title, Item.date, Item.time, Item.note, Item.sort_order)
+
+
+# ---------- 記録 ----------
+def record(session: Session, user_id: int, entries: Iterable[tuple[str, int]]) -> None:
+    # (kind, entity_id) を 1 文で追加（同じものは 1 行に）
+    rows = [{"user_id": user_id, "kind": kind, "entity_id": eid} for kind, eid in dict.fromkeys(entries)]
+    if rows:
+        session.execute(insert(Change), rows)
+
+
+def trip(session: Session, user_id: int, trip_id: int) -> None:
+    record(session, user_id, [(TRIP, trip_id)])
+
+
+def item(session: Session, user_id: int, item_id: int) -> None:
+    record(session, user_id, [(ITEM, item_id)])
+
+
+def trip_order(session: Session, user_id: int) -> None:
+    record(session, user_id, [(TRIP_ORDER, user_id)])
+
+
+def item_order(session: Session, user_id: int, trip_id: int) -> None:
+    record(session, user_id, [(ITEM_ORDER, trip_id)])
+
+
+def reset(session: Session, user_id: int) -> None:
+    # 記録を 1 行足してその id まで floor を進める：それより前のカーソルの端末は次回 reset（全件）になる
+    cursor = session.execute(
+        insert(Change).values(user_id=user_id, kind=TRIP_ORDER, entity_id=user_id)
+    ).inserted_primary_key[0]
+    session.execute(update(User).where(User.id == user_id).values(changes_floor=cursor))
+
+
+# ---------- 読み取り ----------
+def _owned_trips(user_id: int):
+    return select(Trip.id).where(Trip.user_id == user_id)
+
+
+def _latest(session: Session) -> int:
+    return session.execute(select(func.max(Change.id))).scalar() or 0
+
+
+def _dicts(rows) -> list[dict]:
+    return [dict(r._mapping) for r in rows]
+
+
+def snapshot(session: Session, user_id: int, floor: int = 0) -> dict:
+    # 全件。カーソルは読んだ時点の最新の記録
+    cursor = max(_latest(session), floor)
+    trips = session.execute(
+        select(*_TRIP_COLS).where(Trip.user_id == user_id).order_by(Trip.sort_order, Trip.id)
+    ).all()
+    items = session.execute(
+        select(*_ITEM_COLS)
+        .where(Item.trip_id.in_(_owned_trips(user_id)))
+        .order_by(Item.trip_id, Item.sort_order, Item.id)
+    ).all()
+    return {
+        "cursor": cursor, "more": False, "reset": True,
+        "trips": _dicts(trips), "items": _dicts(items),
+        "deleted_trips": [], "deleted_items": [], "trip_order": None, "item_order": {},
+    }
+
+
+def changes_since(session: Session, user_id: int, since: int, limit: int = SYNC_LIMIT) -> dict:
+    # 1 つの読み取りトランザクションで呼ぶこと（記録と行の中身が同じ時点になる）
+    floor = session.execute(select(User.changes_floor).where(User.id == user_id)).scalar() or 0
+    if since <= 0 or since < floor:
+        return snapshot(session, user_id, floor)
+
+    log = session.execute(
+        select(Change.id, Change.kind, Change.entity_id)
+        .where(Change.user_id == user_id, Change.id > since)
+        .order_by(Change.id)
+        .limit(limit + 1)
+    ).all()
+    more = len(log) > limit
+    log = log[:limit]
+    wanted: dict[str, set[int]] = {TRIP: set(), ITEM: set(), TRIP_ORDER: set(), ITEM_ORDER: set()}
+    for _, kind, eid in log:
+        wanted[kind].add(eid)
+
+    trips = session.execute(
+        select(*_TRIP_COLS).where(Trip.id.in_(wanted[TRIP]), Trip.user_id == user_id)
+    ).all() if wanted[TRIP] else []
+    items = session.execute(
+        select(*_ITEM_COLS).where(Item.id.in_(wanted[ITEM]), Item.trip_id.in_(_owned_trips(user_id)))
+    ).all() if wanted[ITEM] else []
+
+    trip_order = None
+    if wanted[TRIP_ORDER]:
+        trip_order = [list(r) for r in session.execute(
+            select(Trip.id, Trip.sort_order).where(Trip.user_id == user_id).order_by(Trip.sort_order, Trip.id)
+        )]
+    item_order: dict[int, list] = {}
+    if wanted[ITEM_ORDER]:
+        for trip_id, item_id, key in session.execute(
+            select(Item.trip_id, Item.id, Item.sort_order)
+            .where(Item.trip_id.in_(wanted[ITEM_ORDER]), Item.trip_id.in_(_owned_trips(user_id)))
+            .order_by(Item.trip_id, Item.sort_order, Item.id)
+        ):
+            item_order.setdefault(trip_id, []).append([item_id, key])
+
+    return {
+        "cursor": log[-1].id if log else since, "more": more, "reset": False,
+        "trips": _dicts(trips), "items": _dicts(items),
+        "deleted_trips": sorted(wanted[TRIP] - {r.id for r in trips}),
+        "deleted_items": sorted(wanted[ITEM] - {r.id for r in items}),
+        "trip_order": trip_order, "item_order": item_order,
+    }
+
+
+# ---------- 圧縮 ----------
+def compact(conn: Connection, retention_days: int = CHANGELOG_RETENTION_DAYS) -> tuple[int, int]:
+    # (同じ行の古い記録として消した数, 期限切れで消した数)。commit は呼び出し側
+    # MySQL は DELETE 先と同じ表を直接読むサブクエリを拒む（エラー 1093）ので、派生表に入れて実体化させる
+    latest = (
+        select(func.max(Change.id).label("id"))
+        .group_by(Change.user_id, Change.kind, Change.entity_id)
+        .subquery("latest")
+    )
+    merged = conn.execute(delete(Change).where(Change.id.not_in(select(latest.c.id)))).rowcount
+
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=retention_days)
+    expired = (
+        select(func.max(Change.id))
+        .where(Change.user_id == User.id, Change.created_at < cutoff)
+        .scalar_subquery()
+    )
+    conn.execute(
+        update(User)
+        .where(expired > User.changes_floor)
+        .values(changes_floor=expired)
+    )
+    floor = select(User.changes_floor).where(User.id == Change.user_id).scalar_subquery()
+    dropped = conn.execute(delete(Change).where(Change.id <= floor)).rowcount
+    return merged, dropped
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="同期用の変更ログを圧縮する")
+    ap.add_argument("--days", type=int, default=CHANGELOG_RETENTION_DAYS, help="これより古い記録を消す（日）")
+    args = ap.parse_args(argv)
+    from ..db import engine
+    with engine.begin() as conn:
+        merged, dropped = compact(conn, args.days)
+    print(f"merged {merged}, expired {dropped}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,24 +1,265 @@
 # シンプルなSMTPメール送信ユーティリティ
-import os, smtplib
+# プロセス内の非同期キューに積み、少数の常時接続（認証済み）SMTP コネクションで順に送る。
+# エンドポイントは enqueue して即座に返る（SMTP の応答を待たない）。
+#   MAIL_POOL_SIZE    = 同時接続数（既定 2）
+#   MAIL_BATCH        = 1 回に取り出して同じ接続で送る最大件数（既定 20）
+#   MAIL_MAX_ATTEMPTS = 再送を含めた最大試行回数（既定 5、指数バックオフ）
+#   MAIL_DEAD_LETTER  = 諦めたメールを追記する JSONL ファイル
+# SMTP_HOST が未設定ならキューを起動しない（起動時にエラーを 1 回記録し、enqueue は RuntimeError）。
+# smtplib.SMTP(None) は localhost:25 へつなぎにいくので、設定漏れに気づけない
+import asyncio, json, logging, os, smtplib, time
+from datetime import datetime, timezone
 from email.message import EmailMessage
+from typing import Optional
 from dotenv import load_dotenv
 
+from .. import metrics
+
 load_dotenv()
 SMTP_HOST = os.getenv("SMTP_HOST")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
-MAIL_FROM = os.getenv("MAIL_FROM")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+MAIL_FROM = os.getenv("MAIL_FROM") or os.getenv("SMTP_FROM") or "noreply@travelmanager.com"
+
+log = logging.getLogger("uvicorn.error")
+
+SENT = metrics.counter("mail_sent_total", "messages accepted by the SMTP server")
+RETRIED = metrics.counter("mail_retry_total", "send attempts scheduled for retry")
+DEAD = metrics.counter("mail_dead_letter_total", "messages written to the dead-letter file")
+SEND_SECONDS = metrics.histogram("mail_send_seconds", "time per SMTP send_message on a pooled connection")
 
-def send_mail(to: str, subject: str, body: str):
-    # テキストメールを送信
+
+def build_message(to: str, subject: str, body: str, sender: str = MAIL_FROM) -> EmailMessage:
+    # テキストメールを組み立て
     msg = EmailMessage()
-    msg["From"] = MAIL_FROM
+    msg["From"] = sender
     msg["To"] = to
     msg["Subject"] = subject
     msg.set_content(body)
+    return msg
+
+
+# サーバが応答した拒否（接続自体は生きている）
+_REFUSED = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def _permanent(err: Exception) -> bool:
+    # 5xx は再送しても通らないので即デッドレター（4xx・接続エラーは再送）
+    if isinstance(err, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in err.recipients.values())
+    return isinstance(err, smtplib.SMTPResponseException) and 500 <= err.smtp_code < 600
+
+
+class _Conn:
+    # 1 本の SMTP 接続（ワーカーごとに保持して使い回す）
+    def __init__(self, queue: "MailQueue"):
+        self.q = queue
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+
+    def _open(self) -> smtplib.SMTP:
+        s = smtplib.SMTP(self.q.host, self.q.port, timeout=self.q.timeout)
+        if self.q.starttls:
+            s.starttls()
+        if self.q.user:
+            s.login(self.q.user, self.q.password)
+        return s
+
+    def ensure(self) -> smtplib.SMTP:
+        # しばらく使っていない接続はサーバ側で切られていることがあるので NOOP で確認
+        if self.smtp is not None and time.monotonic() - self.last_used > self.q.idle_check:
+            try:
+                self.smtp.noop()
+            except smtplib.SMTPException:
+                self.close()
+            except OSError:
+                self.close()
+        if self.smtp is None:
+            self.smtp = self._open()
+        return self.smtp
+
+    def send(self, msg: EmailMessage) -> None:
+        self.ensure().send_message(msg)
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+            self.smtp = None
+
+
+class MailQueue:
+    def __init__(self, host: Optional[str] = SMTP_HOST, port: int = SMTP_PORT, user: Optional[str] = SMTP_USER,
+                 password: Optional[str] = SMTP_PASS, starttls: bool = SMTP_STARTTLS, sender: str = MAIL_FROM,
+                 pool_size: int = int(os.getenv("MAIL_POOL_SIZE", "2")),
+                 batch: int = int(os.getenv("MAIL_BATCH", "20")),
+                 max_attempts: int = int(os.getenv("MAIL_MAX_ATTEMPTS", "5")),
+                 backoff: float = float(os.getenv("MAIL_BACKOFF", "1.0")),
+                 maxsize: int = int(os.getenv("MAIL_QUEUE_MAX", "10000")),
+                 dead_letter: str = os.getenv("MAIL_DEAD_LETTER", "mail_dead_letter.jsonl"),
+                 timeout: float = 30.0, idle_check: float = 30.0):
+        self.host, self.port, self.user, self.password = host, port, user, password
+        self.starttls, self.sender = starttls, sender
+        self.pool_size, self.batch = pool_size, batch
+        self.max_attempts, self.backoff = max_attempts, backoff
+        self.maxsize, self.dead_letter = maxsize, dead_letter
+        self.timeout, self.idle_check = timeout, idle_check
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._pending: set[asyncio.Task] = set()   # バックオフ待ちの再送
+        self._writes: set[asyncio.Future] = set()  # デッドレターの書き込み（スレッドで実行中）
+        self._unconfigured_logged = False
+
+    # ---------- 起動・停止 ----------
+    async def start(self) -> None:
+        if self._workers:
+            return
+        if not self.host:
+            if not self._unconfigured_logged:
+                log.error("[MAIL ERROR] SMTP_HOST が設定されていないため、メール送信キューを起動しません")
+                self._unconfigured_logged = True
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        self._workers = [asyncio.create_task(self._worker(n)) for n in range(self.pool_size)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        # 積まれている分は timeout まで送り切ってから止める
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("[MAIL] 停止時に未送信のメールが残っています")
+        for t in [*self._workers, *self._pending]:
+            t.cancel()
+        await asyncio.gather(*self._workers, *self._pending, *self._writes, return_exceptions=True)
+        self._workers, self._pending = [], set()
+
+    async def join(self) -> None:
+        # 再送待ち・デッドレターの書き込みも含めて空になるまで待つ
+        while True:
+            await self._queue.join()
+            if not self._pending and not self._writes:
+                return
+            await asyncio.gather(*self._pending, *self._writes, return_exceptions=True)
+
+    # ---------- 投入 ----------
+    def enqueue(self, to: str, subject: str, body: str) -> None:
+        # イベントループ上から呼ぶ。満杯ならデッドレターに回す
+        if self._queue is None:
+            raise RuntimeError("mail queue is not started" if self.host else "SMTP_HOST is not set")
+        job = {"msg": build_message(to, subject, body, self.sender), "attempts": 0}
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._dead(job, "queue full")
+
+    # ---------- 送信ワーカー ----------
+    async def _worker(self, n: int) -> None:
+        conn = _Conn(self)
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                while len(batch) < self.batch and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                # まとめて 1 本の接続で送る（ブロッキング I/O はスレッドへ）
+                for job in batch:
+                    job["attempts"] += 1
+                try:
+                    results = await asyncio.to_thread(self._send_batch, conn, batch)
+                except Exception as e:
+                    # 想定外の失敗でもワーカーは止めない。接続を捨て、バッチ全体を再送／デッドレターへ
+                    log.exception(f"[MAIL ERROR] worker {n}: batch of {len(batch)} failed")
+                    await asyncio.to_thread(conn.close)
+                    results = [e] * len(batch)
+                # 取り出した分は必ず task_done（しないと join / stop が timeout まで待つ）
+                for job, err in zip(batch, results):
+                    try:
+                        if err is not None:
+                            self._failed(job, err)
+                    except Exception:
+                        log.exception(f"[MAIL ERROR] worker {n}: could not retry or dead-letter {job['msg']['To']}")
+                    finally:
+                        self._queue.task_done()
+        finally:
+            await asyncio.to_thread(conn.close)
+
+    def _send_batch(self, conn: _Conn, batch: list[dict]) -> list[Optional[Exception]]:
+        results: list[Optional[Exception]] = []
+        for job in batch:
+            t0 = time.perf_counter()
+            try:
+                conn.send(job["msg"])
+            except Exception as e:
+                # 宛先・本文の拒否なら接続はそのまま使える。それ以外（想定外の例外も）は次のメールで再接続
+                if not isinstance(e, _REFUSED):
+                    conn.close()
+                results.append(e)
+                continue
+            SEND_SECONDS.observe(time.perf_counter() - t0)
+            SENT.inc()
+            results.append(None)
+        return results
+
+    def _failed(self, job: dict, err: Exception) -> None:
+        if _permanent(err) or job["attempts"] >= self.max_attempts:
+            self._dead(job, repr(err))
+            return
+        delay = self.backoff * (2 ** (job["attempts"] - 1))
+        RETRIED.inc()
+        log.warning(f"[MAIL] retry in {delay:.1f}s ({job['attempts']}/{self.max_attempts}): {err!r}")
+        task = asyncio.create_task(self._retry_later(job, delay))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _retry_later(self, job: dict, delay: float) -> None:
+        await asyncio.sleep(delay)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._dead(job, "queue full")
+
+    def _dead(self, job: dict, reason: str) -> None:
+        DEAD.inc()
+        msg = job["msg"]
+        rec = {
+            "at": datetime.now(timezone.utc).isoformat(), "to": msg["To"], "subject": msg["Subject"],
+            "body": msg.get_content(), "attempts": job["attempts"], "error": reason,
+        }
+        log.error(f"[MAIL ERROR] dead-letter {msg['To']}: {reason}")
+        # ファイルへの追記はスレッドで（イベントループを止めない）。join / stop は書き終わりを待つ
+        write = asyncio.get_running_loop().run_in_executor(
+            None, self._append_dead, json.dumps(rec, ensure_ascii=False) + "\n")
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+
+    def _append_dead(self, line: str) -> None:
+        # MAIL_DEAD_LETTER に書けなくても送信は続ける（ログにだけ残す）
+        try:
+            with open(self.dead_letter, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            log.error(f"[MAIL ERROR] cannot write dead-letter file {self.dead_letter}: {e!r}: {line.strip()}")
+
+
+# アプリ全体で共有するキュー（main の startup / shutdown で起動・停止）
+queue = MailQueue()
+
+
+async def start() -> None:
+    await queue.start()
+
+
+async def stop() -> None:
+    await queue.stop()
+
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as s:
-        s.starttls()
-        s.login(SMTP_USER, SMTP_PASS)
-        s.send_message(msg)
\ No newline at end of file
+async def send_mail(to: str, subject: str, body: str) -> None:
+    # テキストメールを送信キューへ（未起動なら起動してから積む）
+    await queue.start()
+    queue.enqueue(to, subject, body)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# app/services/mutations.py
+# JSON API の更新操作（schemas の Operation）を 1 つのセッションで順に適用する。
+# - 1 バッチ＝1 トランザクション。途中で失敗したら OpError（呼び出し側で rollback、何も残らない）
+# - 版（revisions）と同期用の変更ログ（changelog）は最後にまとめて書き、page_cache で bump すべきスコープを返す
+#   （bump は commit 後に呼び出し側で）
+# - 作成系の ref は、同じバッチ内の後続の操作で id の代わりに使える
+# commit はしない（run_write に渡す関数の側で行う）。
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from ..models import Item, Trip
+from . import changelog, ordering, revisions
+from .page_cache import trip_scope, user_scope
+
+
+class OpError(Exception):
+    # index 番目の操作が失敗した。status は HTTP のステータスに対応
+    def __init__(self, index: int, status: int, detail: str):
+        super().__init__(detail)
+        self.index, self.status, self.detail = index, status, detail
+
+
+class _Fail(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status, self.detail = status, detail
+
+
+class Batch:
+    def __init__(self, session: Session, user_id: int):
+        self.session = session
+        self.user_id = user_id
+        self.refs: dict[str, int] = {}
+        self.owned: set[int] = set()  # 所有確認済みの trip
+        self.list_changed = False     # 一覧（users.trips_revision）に影響したか
+        self.trips: set[int] = set()  # 詳細（trips.revision）に影響した trip
+        self.changes: list[tuple[str, int]] = []  # changelog に書く (kind, entity_id)
+
+    # ---------- 参照の解決 ----------
+    def _id(self, target) -> int:
+        if isinstance(target, int):
+            return target
+        if target not in self.refs:
+            raise _Fail(422, f"unknown ref: {target}")
+        return self.refs[target]
+
+    def _opt(self, target):
+        return None if target is None else self._id(target)
+
+    def _trip(self, target) -> int:
+        # 自分の trip の id（違えば 404）
+        trip_id = self._id(target)
+        if trip_id not in self.owned:
+            found = self.session.execute(
+                select(Trip.id).where(Trip.id == trip_id, Trip.user_id == self.user_id)
+            ).scalar()
+            if found is None:
+                raise _Fail(404, f"trip {trip_id} not found")
+            self.owned.add(trip_id)
+        return trip_id
+
+    def _item(self, trip_id: int, target) -> Item:
+        it = self.session.get(Item, self._id(target))
+        if it is None or it.trip_id != trip_id:
+            raise _Fail(404, "item not found")
+        return it
+
+    @staticmethod
+    def _patch(obj, op, fields) -> None:
+        # 送られてきた項目だけ反映（空文字は None に正規化。タイトルは必須なので null は無視）
+        for name in fields:
+            if name not in op.model_fields_set:
+                continue
+            value = getattr(op, name)
+            if name == "title":
+                if value is not None:
+                    obj.title = value
+            else:
+                setattr(obj, name, value if value != "" else None)
+
+    # ---------- 操作 ----------
+    def create_trip(self, op):
+        trip = Trip(
+            user_id=self.user_id, title=op.title, start_date=op.start_date, end_date=op.end_date,
+            description=(op.description or None), sort_order=ordering.trip_append_key(self.user_id),
+        )
+        self.session.add(trip)
+        self.session.flush()
+        self.owned.add(trip.id)
+        self.list_changed = True
+        self.changes.append((changelog.TRIP, trip.id))
+        return trip.id, 1
+
+    def update_trip(self, op):
+        trip = self.session.get(Trip, self._trip(op.id))
+        self._patch(trip, op, ("title", "start_date", "end_date", "description"))
+        self.list_changed = True
+        self.trips.add(trip.id)
+        self.changes.append((changelog.TRIP, trip.id))
+        return trip.id, 1
+
+    def delete_trip(self, op):
+        trip = self.session.get(Trip, self._trip(op.id))
+        self.session.delete(trip)
+        self.session.flush()
+        self.owned.discard(trip.id)
+        self.list_changed = True
+        self.trips.add(trip.id)
+        self.changes.append((changelog.TRIP, trip.id))
+        return trip.id, 1
+
+    def reorder_trips(self, op):
+        changed = ordering.reorder_trips(self.session, self.user_id, [self._id(t) for t in op.ids])
+        if changed:
+            self.list_changed = True
+            self.changes.append((changelog.TRIP_ORDER, self.user_id))
+        return None, changed
+
+    def move_trip(self, op):
+        written = ordering.move_trip(self.session, self.user_id, self._id(op.id), self._opt(op.prev), self._opt(op.next))
+        if written is None:
+            raise _Fail(409, "stale neighbours")
+        if written:
+            self.list_changed = True
+            self.changes.append((changelog.TRIP_ORDER, self.user_id))
+        return self._id(op.id), written
+
+    def create_item(self, op):
+        trip_id = self._trip(op.trip_id)
+        it = Item(
+            trip_id=trip_id, title=op.title, date=op.date, time=(op.time or None), note=(op.note or None),
+            sort_order=ordering.item_append_key(trip_id),
+        )
+        self.session.add(it)
+        self.session.flush()
+        self.trips.add(trip_id)
+        self.changes.append((changelog.ITEM, it.id))
+        return it.id, 1
+
+    def update_item(self, op):
+        trip_id = self._trip(op.trip_id)
+        it = self._item(trip_id, op.id)
+        self._patch(it, op, ("title", "date", "time", "note"))
+        self.trips.add(trip_id)
+        self.changes.append((changelog.ITEM, it.id))
+        return it.id, 1
+
+    def delete_item(self, op):
+        trip_id = self._trip(op.trip_id)
+        item_id = self._id(op.id)
+        deleted = self.session.execute(
+            delete(Item).where(Item.id == item_id, Item.trip_id == trip_id)
+        ).rowcount  # identity map からも外す（同じバッチ内の後続の操作が古い行を見ないように）
+        if not deleted:
+            raise _Fail(404, "item not found")
+        self.trips.add(trip_id)
+        self.changes.append((changelog.ITEM, item_id))
+        return item_id, 1
+
+    def reorder_items(self, op):
+        trip_id = self._trip(op.trip_id)
+        changed = ordering.reorder_items(self.session, self.user_id, trip_id, [self._id(i) for i in op.ids])
+        if changed:
+            self.trips.add(trip_id)
+            self.changes.append((changelog.ITEM_ORDER, trip_id))
+        return None, changed
+
+    def move_item(self, op):
+        trip_id = self._trip(op.trip_id)
+        item_id = self._id(op.id)
+        written = ordering.move_item(self.session, self.user_id, trip_id, item_id, self._opt(op.prev), self._opt(op.next))
+        if written is None:
+            raise _Fail(409, "stale neighbours")
+        if written:
+            self.trips.add(trip_id)
+            self.changes.append((changelog.ITEM_ORDER, trip_id))
+        return item_id, written
+
+    # ---------- 実行 ----------
+    def apply(self, ops) -> list[dict]:
+        results = []
+        for index, op in enumerate(ops):
+            ref = getattr(op, "ref", None)
+            if ref is not None and ref in self.refs:
+                raise OpError(index, 422, f"duplicate ref: {ref}")
+            try:
+                row_id, changed = getattr(self, op.op)(op)
+            except _Fail as e:
+                raise OpError(index, e.status, e.detail) from None
+            if ref is not None:
+                self.refs[ref] = row_id
+            results.append({"index": index, "op": op.op, "id": row_id, "ref": ref, "changed": changed})
+        self.session.flush()
+        # 版は commit 前に同じトランザクションで進める
+        if self.list_changed:
+            revisions.touch_user(self.session, self.user_id)
+        for trip_id in self.trips:
+            revisions.touch_trip(self.session, trip_id)
+        changelog.record(self.session, self.user_id, self.changes)
+        return results
+
+    def scopes(self) -> list[str]:
+        # commit 後に page_cache.bump へ渡すスコープ
+        return ([user_scope(self.user_id)] if self.list_changed else []) + [trip_scope(t) for t in sorted(self.trips)]
+
+
+def apply(session: Session, user_id: int, ops) -> tuple[list[dict], list[str]]:
+    # (操作ごとの結果, bump するスコープ)。失敗時は OpError（session は呼び出し側で rollback）
+    batch = Batch(session, user_id)
+    return batch.apply(ops), batch.scopes()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# app/services/ordering.py
+# 並べ替えの一括更新と疎なソートキー（models.SORT_GAP 間隔）の管理。
+# - 全件並べ替え：CASE 式の UPDATE 1 本。所有者チェックと「値が変わった行だけ」を同じ WHERE に入れる
+# - 1 件移動：前後キーの中間値を 1 行だけ書く。間隔が尽きたら親単位で振り直す（rebalance）
+#   片側の隣しか分からない場合（ページ境界）は DB 上の実際の隣を引いて使う
+# - 末尾追加：INSERT に max(sort_order) + SORT_GAP のサブクエリを埋め込む（事前 SELECT なし）。
+#   MySQL は INSERT 先と同じ表を直接読むサブクエリを拒む（エラー 1093）ので、max は派生表に入れて実体化させる
+
+from typing import Iterable
+
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from ..models import Trip, Item, SORT_GAP
+
+# 1 文あたりの id 数（CASE と IN でおよそ 3 倍のバインド変数を使う）
+# SQLite 3.32+ の変数上限 32766 / MySQL の 65535 に収まるよう分割する
+CHUNK = 2000
+
+# MySQL の INT に収める（先頭への移動を繰り返すと負方向に伸びるため）
+KEY_MIN, KEY_MAX = -(2**31) + SORT_GAP, 2**31 - 1 - SORT_GAP
+
+
+def _positions(ids: Iterable) -> dict[int, int]:
+    # 送られてきた順に SORT_GAP, 2*SORT_GAP, … を割り当て（重複・不正値は無視）
+    pos: dict[int, int] = {}
+    for raw in ids:
+        try:
+            i = int(raw)
+        except (TypeError, ValueError):
+            continue
+        if i not in pos:
+            pos[i] = (len(pos) + 1) * SORT_GAP
+    return pos
+
+
+def _chunks(pos: dict[int, int]):
+    items = list(pos.items())
+    for n in range(0, len(items), CHUNK):
+        yield dict(items[n:n + CHUNK])
+
+
+def _owned_trip(user_id: int, trip_id: int):
+    return select(Trip.id).where(Trip.id == trip_id, Trip.user_id == user_id)
+
+
+def reorder_trips(session: Session, user_id: int, ids: Iterable) -> int:
+    # 自分の trip のみ対象。変更行数を返す（commit は呼び出し側）
+    changed = 0
+    for part in _chunks(_positions(ids)):
+        new_order = case(part, value=Trip.id)
+        stmt = (
+            update(Trip)
+            .where(Trip.user_id == user_id, Trip.id.in_(part.keys()), Trip.sort_order != new_order)
+            .values(sort_order=new_order)
+            .execution_options(synchronize_session=False)
+        )
+        changed += session.execute(stmt).rowcount
+    return changed
+
+
+def reorder_items(session: Session, user_id: int, trip_id: int, ids: Iterable) -> int:
+    # 自分の trip に属する item のみ対象。変更行数を返す（commit は呼び出し側）
+    changed = 0
+    for part in _chunks(_positions(ids)):
+        new_order = case(part, value=Item.id)
+        stmt = (
+            update(Item)
+            .where(
+                Item.trip_id == trip_id,
+                Item.trip_id.in_(_owned_trip(user_id, trip_id)),
+                Item.id.in_(part.keys()),
+                Item.sort_order != new_order,
+            )
+            .values(sort_order=new_order)
+            .execution_options(synchronize_session=False)
+        )
+        changed += session.execute(stmt).rowcount
+    return changed
+
+
+# ---------- 末尾追加 ----------
+def append_key(model, parent_col, parent_id: int):
+    # ORM の属性にそのまま代入できる SQL 式（flush 時に INSERT 内で評価される）
+    # 集約の派生表は MySQL が外側へ併合（derived_merge）しないので、1093 にならない
+    last = select(func.max(model.sort_order).label("sort_order")).where(parent_col == parent_id).subquery("last")
+    return select(func.coalesce(last.c.sort_order, 0) + SORT_GAP).scalar_subquery()
+
+
+def trip_append_key(user_id: int):
+    return append_key(Trip, Trip.user_id, user_id)
+
+
+def item_append_key(trip_id: int):
+    return append_key(Item, Item.trip_id, trip_id)
+
+
+# ---------- 1 件移動 ----------
+def _between(lo: int | None, hi: int | None) -> int | None:
+    # lo < 新キー < hi となる値。取れなければ None（振り直しが必要）
+    if lo is None and hi is None:
+        return None
+    if lo is None:
+        key = hi - SORT_GAP
+    elif hi is None:
+        key = lo + SORT_GAP
+    elif hi - lo >= 2:
+        key = (lo + hi) // 2
+    else:
+        return None
+    return key if KEY_MIN <= key <= KEY_MAX else None
+
+
+def _move(session: Session, model, scope, moving_id: int, prev_id: int | None, next_id: int | None,
+          rebalance) -> int | None:
+    # scope: 親（と所有者）で絞り込む WHERE 条件のリスト
+    if moving_id in (prev_id, next_id):
+        return 0
+    if prev_id is None and next_id is None:
+        return 0
+    wanted = {moving_id} | {x for x in (prev_id, next_id) if x is not None}
+
+    def bounds():
+        # 片側しか送られてこない場合（ページ境界・末尾）は DB 上の実際の隣を使う
+        keys = dict(session.execute(select(model.id, model.sort_order).where(*scope, model.id.in_(wanted))).all())
+        if len(keys) != len(wanted):
+            return keys, None, None
+        lo, hi = keys.get(prev_id), keys.get(next_id)
+        others = (*scope, model.id != moving_id)
+        if next_id is None:
+            hi = session.execute(select(func.min(model.sort_order)).where(*others, model.sort_order > lo)).scalar()
+        elif prev_id is None:
+            lo = session.execute(select(func.max(model.sort_order)).where(*others, model.sort_order < hi)).scalar()
+        return keys, lo, hi
+
+    keys, lo, hi = bounds()
+    if len(keys) != len(wanted):
+        # 他人の行・削除済みの行を指している（古い画面など）
+        return None
+    key = _between(lo, hi)
+    written = 0
+    if key is None:
+        # 間隔が尽きた：親単位で SORT_GAP 間隔に振り直してから再計算
+        written += rebalance()
+        keys, lo, hi = bounds()
+        key = _between(lo, hi)
+        if key is None:
+            # 振り直しても間に入らない：prev が next より後ろ（古い画面からのドラッグなど）
+            return None
+    if keys[moving_id] == key:
+        return written
+    session.execute(
+        update(model)
+        .where(*scope, model.id == moving_id)
+        .values(sort_order=key)
+        .execution_options(synchronize_session=False)
+    )
+    return written + 1
+
+
+def move_trip(session: Session, user_id: int, trip_id: int, prev_id: int | None, next_id: int | None) -> int | None:
+    # trip を prev と next の間へ。書いた行数を返す（対象外なら None、commit は呼び出し側）
+    return _move(
+        session, Trip, [Trip.user_id == user_id], trip_id, prev_id, next_id,
+        rebalance=lambda: rebalance_trips(session, user_id),
+    )
+
+
+def move_item(session: Session, user_id: int, trip_id: int, item_id: int,
+              prev_id: int | None, next_id: int | None) -> int | None:
+    # item を同じ trip 内の prev と next の間へ。書いた行数を返す（対象外なら None）
+    return _move(
+        session, Item, [Item.trip_id == trip_id, Item.trip_id.in_(_owned_trip(user_id, trip_id))],
+        item_id, prev_id, next_id,
+        rebalance=lambda: rebalance_items(session, user_id, trip_id),
+    )
+
+
+# ---------- 振り直し ----------
+def rebalance_trips(session: Session, user_id: int) -> int:
+    ids = session.execute(
+        select(Trip.id).where(Trip.user_id == user_id).order_by(Trip.sort_order, Trip.id)
+    ).scalars().all()
+    return reorder_trips(session, user_id, ids)
+
+
+def rebalance_items(session: Session, user_id: int, trip_id: int) -> int:
+    ids = session.execute(
+        select(Item.id).where(Item.trip_id == trip_id).order_by(Item.sort_order, Item.id)
+    ).scalars().all()
+    return reorder_items(session, user_id, trip_id, ids)
+
+
+def respace_all(conn: Connection) -> int:
+    # 全ユーザー・全 trip のキーを SORT_GAP 間隔へ（マイグレーション／一括メンテ用）
+    changed = 0
+    for model, parent_col in ((Trip, Trip.user_id), (Item, Item.trip_id)):
+        rows = conn.execute(
+            select(model.id, parent_col, model.sort_order).order_by(parent_col, model.sort_order, model.id)
+        ).all()
+        params, parent, n = [], object(), 0
+        for rid, pid, cur in rows:
+            if pid != parent:
+                parent, n = pid, 0
+            n += 1
+            if cur != n * SORT_GAP:
+                params.append({"_id": rid, "_key": n * SORT_GAP})
+        if params:
+            table = model.__table__
+            conn.execute(
+                update(table).where(table.c.id == bindparam("_id")).values(sort_order=bindparam("_key")),
+                params,
+            )
+        changed += len(params)
+    return changed
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# app/services/page_cache.py
+# 描画済みページ（/trips・/trips/{id}）のキャッシュ。キーは (user_id, 対象, 言語, データ版)。
+# 版はユーザー単位（一覧）と旅程単位（詳細）のカウンタで、更新系ハンドラが commit 後に bump() する。
+# 版が変われば古いキーは二度と引かれない（LRU / TTL でそのうち消える）。
+# キーにはデプロイの識別子（revisions.build()）も入れる（disk は再起動をまたぐので、古いテンプレートの本文を返さない）。
+# 本文と一緒に描画時の ETag（revisions）も保存し、ヒット時もそのまま返す。
+#   PAGE_CACHE             = memory（既定）| disk | off
+#   PAGE_CACHE_TTL         = 有効期限（秒、既定 300）
+#   PAGE_CACHE_MAX_ENTRIES = memory の上限件数（既定 5000、超えたら古い順に破棄）
+#   PAGE_CACHE_DB          = disk のファイル（既定 page_cache.db）。版も共有するので uvicorn --workers 2 以上は disk
+
+import os, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .. import metrics
+from . import revisions
+
+HITS = metrics.counter("page_cache_hit_total", "rendered pages served from the page cache")
+MISSES = metrics.counter("page_cache_miss_total", "rendered pages that had to be queried and rendered")
+EVICTIONS = metrics.counter("page_cache_evict_total", "page cache entries dropped by the LRU bound")
+
+
+def user_scope(user_id: int) -> str:
+    return f"u{user_id}"
+
+
+def trip_scope(trip_id: int) -> str:
+    return f"t{trip_id}"
+
+
+class MemoryBackend:
+    # LRU + TTL。版カウンタはプロセス内の dict（イベントループ上からのみ触る）
+    blocking = False
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl, self.max_entries = ttl, max_entries
+        self._pages: "OrderedDict[str, tuple[float, bytes, Optional[str]]]" = OrderedDict()
+        self._versions: dict[str, int] = {}
+
+    def version(self, scope: str) -> int:
+        return self._versions.get(scope, 0)
+
+    def bump(self, scopes: tuple[str, ...]) -> None:
+        for s in scopes:
+            self._versions[s] = self._versions.get(s, 0) + 1
+
+    def get(self, key: str) -> Optional[tuple[bytes, Optional[str]]]:
+        hit = self._pages.get(key)
+        if hit is None:
+            return None
+        if hit[0] < time.time():
+            del self._pages[key]
+            return None
+        self._pages.move_to_end(key)
+        return hit[1], hit[2]
+
+    def set(self, key: str, body: bytes, etag: Optional[str]) -> None:
+        self._pages[key] = (time.time() + self.ttl, body, etag)
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.max_entries:
+            self._pages.popitem(last=False)
+            EVICTIONS.inc()
+
+
+class DiskBackend:
+    # SQLite ファイルに保存（複数ワーカーで共有）。件数上限は設けず、期限切れをときどき掃除
+    blocking = True
+
+    def __init__(self, path: str, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        if "etag" not in {r[1] for r in self._conn.execute("PRAGMA table_info(pages)")}:
+            self._conn.execute("DROP TABLE IF EXISTS pages")  # ETag 列のない旧形式（中身はキャッシュなので捨てる）
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, expires REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS versions (scope TEXT PRIMARY KEY, v INTEGER NOT NULL)")
+        self._writes = 0
+
+    def version(self, scope: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT v FROM versions WHERE scope = ?", (scope,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, scopes: tuple[str, ...]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO versions (scope, v) VALUES (?, 1) ON CONFLICT(scope) DO UPDATE SET v = v + 1",
+                [(s,) for s in scopes],
+            )
+
+    def get(self, key: str) -> Optional[tuple[bytes, Optional[str]]]:
+        with self._lock:
+            row = self._conn.execute("SELECT body, etag, expires FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None or row[2] < time.time():
+            return None
+        return row[0], row[1]
+
+    def set(self, key: str, body: bytes, etag: Optional[str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, body, etag, expires) VALUES (?, ?, ?, ?)",
+                (key, body, etag, now + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self._conn.execute("DELETE FROM pages WHERE expires < ?", (now,))
+
+
+def build_backend(kind: Optional[str] = None):
+    kind = kind or os.getenv("PAGE_CACHE", "memory")
+    ttl = int(os.getenv("PAGE_CACHE_TTL", "300"))
+    if kind == "memory":
+        return MemoryBackend(ttl, int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "5000")))
+    if kind == "disk":
+        return DiskBackend(os.getenv("PAGE_CACHE_DB", "page_cache.db"), ttl)
+    return None
+
+
+backend = build_backend()
+
+
+async def _call(fn, *args):
+    if backend.blocking:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+
+async def page_key(user_id: int, lang: str, trip_id: Optional[int] = None) -> Optional[str]:
+    # 現在の版を含んだキー（キャッシュ無効なら None）。版は描画の前に読むこと
+    if backend is None:
+        return None
+    if trip_id is None:
+        return f"list:{user_id}:{lang}:{await _call(backend.version, user_scope(user_id))}:{revisions.build()}"
+    return f"trip:{user_id}:{trip_id}:{lang}:{await _call(backend.version, trip_scope(trip_id))}:{revisions.build()}"
+
+
+async def get(key: Optional[str]) -> Optional[tuple[bytes, Optional[str]]]:
+    # (本文, ETag) か None
+    if key is None:
+        return None
+    hit = await _call(backend.get, key)
+    (HITS if hit is not None else MISSES).inc()
+    return hit
+
+
+async def put(key: Optional[str], body: bytes, etag: Optional[str] = None) -> None:
+    if key is not None:
+        await _call(backend.set, key, body, etag)
+
+
+async def bump(*scopes: str) -> None:
+    # 更新の commit 後に呼ぶ（user_scope / trip_scope）
+    if backend is not None and scopes:
+        await _call(backend.bump, scopes)
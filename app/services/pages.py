@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# app/services/pages.py
+# 画面表示用の読み取りクエリ。ORM オブジェクト（identity map）を作らず、
+# 必要な列だけを軽量な行オブジェクトで返す。
+# - trip_list：版 + カードの 2 クエリ（説明は先頭だけ）
+# - trip_detail：trip ⟕ items の 1 クエリ（所有者チェック込み）
+# 一覧はどちらも (sort_order, id) のキーセットでページ分割する（続きは *.json で取得）
+# 全件表示（?all=1）は iter_* で yield_per ごとに取りながら 1 行ずつ返す（ストリーミング描画用）
+# trip_rows / trip_row / item_row は JSON API 用（説明は全文、sort_order と版付き）
+
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..models import Trip, Item
+from . import revisions
+
+# 一覧カードに出す説明の最大文字数（+1 文字取って「…」判定に使う）
+CARD_DESC_LEN = 200
+
+# 1 ページの件数
+TRIPS_PAGE = 60
+ITEMS_PAGE = 100
+MAX_PAGE = 500
+
+# 全件表示で 1 回に取り出す件数（yield_per）
+STREAM_BATCH = 500
+
+
+def encode_cursor(sort_order: int, id: int) -> str:
+    return f"{sort_order}.{id}"
+
+
+def decode_cursor(raw: Optional[str]) -> Optional[tuple[int, int]]:
+    # 不正な値は ValueError
+    if not raw:
+        return None
+    key, _, rid = raw.partition(".")
+    return int(key), int(rid)
+
+
+def _page(rows: list, limit: int):
+    # limit + 1 件取って次ページの有無を判定し、(行, 次カーソル) を返す
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].sort_order, rows[-1].id)
+
+
+class TripView:
+    __slots__ = ("id", "title", "start_date", "end_date", "description", "revision")
+
+    def __init__(self, id: int, title: str, start_date: Optional[date], end_date: Optional[date],
+                 description: Optional[str], revision: int = 0):
+        self.id = id
+        self.title = title
+        self.start_date = start_date
+        self.end_date = end_date
+        self.description = description
+        self.revision = revision
+
+
+class ItemRow:
+    __slots__ = ("id", "title", "date", "time", "note", "sort_order")
+
+    def __init__(self, id: int, title: str, date: Optional[date], time: Optional[str],
+                 note: Optional[str], sort_order: int):
+        self.id = id
+        self.title = title
+        self.date = date
+        self.time = time
+        self.note = note
+        self.sort_order = sort_order
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+_CARD_COLS = (
+    Trip.id, Trip.title, Trip.start_date, Trip.end_date,
+    func.substr(Trip.description, 1, CARD_DESC_LEN + 1).label("description"),
+    Trip.sort_order,
+)
+
+
+def trip_cards(session: Session, user_id: int, after: Optional[tuple[int, int]] = None, limit: int = TRIPS_PAGE):
+    # 一覧カード用の行（Row は名前付きタプル相当：t.id / t.title … で参照できる）と次カーソル
+    stmt = (
+        select(*_CARD_COLS)
+        .where(Trip.user_id == user_id)
+        .order_by(Trip.sort_order, Trip.id)
+        .limit(limit + 1)
+    )
+    if after:
+        stmt = stmt.where(tuple_(Trip.sort_order, Trip.id) > tuple_(*after))
+    return _page(session.execute(stmt).all(), limit)
+
+
+def iter_trip_cards(session: Session, user_id: int, batch: int = STREAM_BATCH):
+    # 全件のカード行。テンプレートの for が進むのに合わせて batch 件ずつ取り出す
+    stmt = (
+        select(*_CARD_COLS)
+        .where(Trip.user_id == user_id)
+        .order_by(Trip.sort_order, Trip.id)
+        .execution_options(yield_per=batch)
+    )
+    yield from session.execute(stmt)
+
+
+def trip_list(session: Session, user_id: int):
+    # 一覧画面：(版, 先頭ページのカード, 次カーソル)。版を先に読む（ETag が内容より古くなるだけで、新しくはならない）
+    revision = revisions.list_revision(session, user_id)
+    trips, next_cursor = trip_cards(session, user_id)
+    return revision, trips, next_cursor
+
+
+_TRIP_COLS = (Trip.id, Trip.title, Trip.start_date, Trip.end_date, Trip.description, Trip.revision)
+_ITEM_COLS = (Item.id, Item.title, Item.date, Item.time, Item.note, Item.sort_order)
+
+
+def trip_detail(session: Session, user_id: int, trip_id: int, limit: int = ITEMS_PAGE):
+    # (TripView, 先頭ページの ItemRow, 次カーソル)。自分の trip でなければ None
+    stmt = (
+        select(*_TRIP_COLS, *_ITEM_COLS)
+        .outerjoin(Item, Item.trip_id == Trip.id)
+        .where(Trip.id == trip_id, Trip.user_id == user_id)
+        .order_by(Item.sort_order, Item.id)
+        .limit(limit + 1)
+    )
+    rows = session.execute(stmt).all()
+    if not rows:
+        return None
+    n = len(_TRIP_COLS)
+    trip = TripView(*rows[0][:n])
+    items, next_cursor = _page([ItemRow(*r[n:]) for r in rows if r[n] is not None], limit)
+    return trip, items, next_cursor
+
+
+def trip_header(session: Session, user_id: int, trip_id: int) -> Optional[TripView]:
+    # trip だけ（項目なし）。自分の trip でなければ None
+    row = session.execute(select(*_TRIP_COLS).where(Trip.id == trip_id, Trip.user_id == user_id)).first()
+    return TripView(*row) if row else None
+
+
+def _owned(user_id: int, trip_id: int):
+    return select(Trip.id).where(Trip.id == trip_id, Trip.user_id == user_id)
+
+
+def iter_item_rows(session: Session, user_id: int, trip_id: int, batch: int = STREAM_BATCH):
+    # 全件の ItemRow（iter_trip_cards と同じく batch 件ずつ）
+    stmt = (
+        select(*_ITEM_COLS)
+        .where(Item.trip_id == trip_id, Item.trip_id.in_(_owned(user_id, trip_id)))
+        .order_by(Item.sort_order, Item.id)
+        .execution_options(yield_per=batch)
+    )
+    for r in session.execute(stmt):
+        yield ItemRow(*r)
+
+
+def item_row(session: Session, user_id: int, trip_id: int, item_id: int) -> Optional[ItemRow]:
+    row = session.execute(
+        select(*_ITEM_COLS).where(Item.id == item_id, Item.trip_id == trip_id, Item.trip_id.in_(_owned(user_id, trip_id)))
+    ).first()
+    return ItemRow(*row) if row else None
+
+
+def item_rows(session: Session, user_id: int, trip_id: int, after: Optional[tuple[int, int]] = None,
+              limit: int = ITEMS_PAGE):
+    # 続きのページ：(ItemRow のリスト, 次カーソル)。他人の trip なら空
+    stmt = (
+        select(*_ITEM_COLS)
+        .where(Item.trip_id == trip_id, Item.trip_id.in_(_owned(user_id, trip_id)))
+        .order_by(Item.sort_order, Item.id)
+        .limit(limit + 1)
+    )
+    if after:
+        stmt = stmt.where(tuple_(Item.sort_order, Item.id) > tuple_(*after))
+    return _page([ItemRow(*r) for r in session.execute(stmt)], limit)
+
+
+_API_TRIP_COLS = (*_TRIP_COLS, Trip.sort_order)
+
+
+def trip_rows(session: Session, user_id: int, after: Optional[tuple[int, int]] = None, limit: int = TRIPS_PAGE):
+    # (行のリスト, 次カーソル)。行は TripView の列 + sort_order
+    stmt = (
+        select(*_API_TRIP_COLS)
+        .where(Trip.user_id == user_id)
+        .order_by(Trip.sort_order, Trip.id)
+        .limit(limit + 1)
+    )
+    if after:
+        stmt = stmt.where(tuple_(Trip.sort_order, Trip.id) > tuple_(*after))
+    return _page(session.execute(stmt).all(), limit)
+
+
+def trip_row(session: Session, user_id: int, trip_id: int):
+    return session.execute(select(*_API_TRIP_COLS).where(Trip.id == trip_id, Trip.user_id == user_id)).first()
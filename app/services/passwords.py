@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# app/services/passwords.py
+# パスワードのハッシュ化／照合を専用のワーカープールで実行する。
+# bcrypt は 1 回 ~250ms の CPU を使うため、Starlette の共有スレッドプールで回すと
+# ログインが集中したときに他の画面（同期エンドポイント）が待たされる。
+#   PASSWORD_EXECUTOR = process（既定）| thread | shared（旧来どおり共有スレッドプール）
+#   PASSWORD_WORKERS  = ワーカー数（既定 CPU 数）
+#   PASSWORD_QUEUE    = 同時に受け付ける件数の上限（既定 WORKERS×8）。超えたら PasswordBusy
+#
+# ハッシュ方式（ポリシー）は起動時に決める：
+#   PASSWORD_SCHEME    = bcrypt（既定）| argon2（argon2-cffi が必要。無ければ bcrypt）
+#   PASSWORD_TARGET_MS = 照合 1 回の目標時間（既定 250）。このホストで計測してコストを決める
+#   PASSWORD_ROUNDS    = bcrypt の rounds を固定したい場合（計測しない）
+# 保存済みハッシュのコストが現ポリシーより低い／方式が古い場合は、ログイン成功時に再ハッシュする。
+
+import asyncio, logging, math, multiprocessing, os, time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+from .. import metrics
+
+log = logging.getLogger("uvicorn.error")
+
+EXECUTOR_KIND = os.getenv("PASSWORD_EXECUTOR", "process")
+WORKERS = int(os.getenv("PASSWORD_WORKERS", "0")) or (os.cpu_count() or 1)
+QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE", "0")) or WORKERS * 8
+
+# bcrypt rounds の下限・上限（計測結果をこの範囲に丸める）
+MIN_ROUNDS, MAX_ROUNDS = 10, 16
+
+# 照合にかかった時間（ワーカー内の計算時間／待ち時間込み）
+VERIFY_SECONDS = metrics.histogram("password_verify_seconds", "password verify CPU time in the worker")
+VERIFY_TOTAL_SECONDS = metrics.histogram("password_verify_total_seconds", "password verify latency incl. queue wait")
+HASH_SECONDS = metrics.histogram("password_hash_seconds", "password hash CPU time in the worker")
+REHASHED = metrics.counter("password_rehash_total", "hashes upgraded to the current policy on login")
+BUSY = metrics.counter("password_busy_total", "requests shed because the password queue was full")
+
+
+class PasswordBusy(Exception):
+    # 待ち行列が満杯（呼び出し側で 503 にする）
+    pass
+
+
+# ---------- ポリシー ----------
+# CryptContext の設定値。configure() で確定し、プロセスワーカーにも同じものを渡す
+POLICY: dict = {"schemes": ["bcrypt"], "deprecated": "auto"}
+pwd_ctx = CryptContext(**POLICY)
+_configured = False
+
+
+def _time_hash(ctx: CryptContext, repeat: int = 3) -> float:
+    # 最良値（秒）
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        ctx.hash("calibration-password")
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def calibrate_bcrypt_rounds(target_ms: float) -> int:
+    # rounds を 1 上げるとコストは 2 倍。MIN_ROUNDS で 1 回測って目標に収まる最大値を求める
+    t = _time_hash(CryptContext(schemes=["bcrypt"], bcrypt__rounds=MIN_ROUNDS))
+    extra = math.floor(math.log2(max(target_ms / 1000 / t, 1)))
+    return max(MIN_ROUNDS, min(MAX_ROUNDS, MIN_ROUNDS + extra))
+
+
+def calibrate_argon2_time_cost(target_ms: float) -> int:
+    # time_cost にほぼ比例するので 2 で測って線形に伸ばす
+    t = _time_hash(CryptContext(schemes=["argon2"], argon2__time_cost=2))
+    return max(2, round(2 * target_ms / 1000 / t))
+
+
+def build_policy() -> dict:
+    # 環境変数と計測結果から CryptContext の設定を作る
+    scheme = os.getenv("PASSWORD_SCHEME", "bcrypt")
+    target_ms = float(os.getenv("PASSWORD_TARGET_MS", "250"))
+    if scheme == "argon2":
+        from passlib.hash import argon2
+        if argon2.has_backend():
+            cost = calibrate_argon2_time_cost(target_ms)
+            # bcrypt は照合のみ（deprecated="auto" で次回ログイン時に argon2 へ移行）
+            return {
+                "schemes": ["argon2", "bcrypt"], "deprecated": "auto",
+                "argon2__time_cost": cost, "argon2__min_time_cost": cost,
+            }
+        log.warning("[PASSWORD] argon2-cffi が無いため bcrypt を使用します")
+    rounds = int(os.getenv("PASSWORD_ROUNDS", "0")) or calibrate_bcrypt_rounds(target_ms)
+    # min_rounds 未満の既存ハッシュは needs_update → ログイン時に再ハッシュ
+    return {"schemes": ["bcrypt"], "deprecated": "auto", "bcrypt__rounds": rounds, "bcrypt__min_rounds": rounds}
+
+
+def configure(policy: dict) -> None:
+    # ワーカープロセスの initializer からも呼ばれる
+    global POLICY, pwd_ctx, _configured
+    POLICY = dict(policy)
+    pwd_ctx = CryptContext(**POLICY)
+    _configured = True
+
+
+def ensure_configured() -> None:
+    if not _configured:
+        configure(build_policy())
+        log.info(f"[PASSWORD] policy: {POLICY}")
+
+
+# ---------- 同期版（スクリプト・ワーカー内で使用） ----------
+def hash_password_sync(plain: str) -> str:
+    ensure_configured()
+    return pwd_ctx.hash(plain)
+
+
+def verify_password_sync(plain: str, hashed: str) -> bool:
+    return verify_and_update_sync(plain, hashed)[0]
+
+
+def verify_and_update_sync(plain: str, hashed: str) -> tuple[bool, Optional[str]]:
+    # (一致したか, 再ハッシュ後の値 or None)
+    try:
+        return pwd_ctx.verify_and_update(plain, hashed)
+    except (ValueError, TypeError):
+        # 壊れた／未知形式のハッシュは不一致扱い
+        return False, None
+
+
+def _timed(fn, *args):
+    # ワーカー内での計算時間も一緒に返す
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+# ---------- 非同期版（エンドポイントから await） ----------
+_executor: Optional[Executor] = None
+_inflight = 0
+
+
+def _get_executor() -> Optional[Executor]:
+    global _executor
+    ensure_configured()
+    if _executor is None and EXECUTOR_KIND != "shared":
+        if EXECUTOR_KIND == "thread":
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="pwhash")
+        else:
+            # fork だとイベントループやスレッドの状態を引き継ぐので spawn。
+            # ワーカー側で再計測しないよう、親で決めたポリシーを渡す
+            _executor = ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                initializer=configure, initargs=(POLICY,),
+            )
+    return _executor
+
+
+async def _run(fn, *args):
+    global _inflight
+    if _inflight >= QUEUE_LIMIT:
+        BUSY.inc()
+        raise PasswordBusy()
+    _inflight += 1
+    try:
+        ex = _get_executor()
+        if ex is None:
+            return await run_in_threadpool(_timed, fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(ex, _timed, fn, *args)
+    finally:
+        _inflight -= 1
+
+
+async def hash_password(plain: str) -> str:
+    result, spent = await _run(hash_password_sync, plain)
+    HASH_SECONDS.observe(spent)
+    return result
+
+
+async def verify_and_update(plain: str, hashed: str) -> tuple[bool, Optional[str]]:
+    # 一致してかつ保存済みハッシュが古いポリシーなら、新しいハッシュも返す
+    t0 = time.perf_counter()
+    (ok, new_hash), spent = await _run(verify_and_update_sync, plain, hashed)
+    VERIFY_SECONDS.observe(spent)
+    VERIFY_TOTAL_SECONDS.observe(time.perf_counter() - t0)
+    if ok and new_hash:
+        REHASHED.inc()
+    return ok, new_hash
+
+
+async def verify_password(plain: str, hashed: str) -> bool:
+    return (await verify_and_update(plain, hashed))[0]
+
+
+def start() -> None:
+    # 起動時にポリシー確定とワーカー起動を済ませる（最初のログインで待たせない）
+    ex = _get_executor()
+    if isinstance(ex, ProcessPoolExecutor):
+        for f in [ex.submit(os.getpid) for _ in range(WORKERS)]:
+            f.result()
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
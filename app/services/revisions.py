@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# app/services/revisions.py
+# 条件付き GET（ETag / If-None-Match）用の版。
+# - 一覧：users.trips_revision（trip の追加・削除・編集・並べ替え）
+# - 詳細：trips.revision（trip 自身と配下の item の変更）
+# 更新系は commit 前に touch_user / touch_trip を同じトランザクションで呼ぶこと。
+# 304 の判定は版を 1 行読むだけ（項目の読み込みもテンプレート描画もしない）。
+# ETag にはデプロイの識別子（templating.build_token、起動時に set_build）も入れる。
+# 版が同じでもテンプレートやアセットが変われば本文が違うので、古い HTML に 304 を返さない。
+
+from typing import Optional
+
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import Session
+
+from ..models import Trip, User, revision_stamp
+
+
+_build = ""
+
+
+def set_build(token: str) -> None:
+    global _build
+    _build = token
+
+
+def build() -> str:
+    return _build
+
+
+def _next(col):
+    # 版は単調増加：現在時刻（µs）か、それ以上なら +1
+    stamp = revision_stamp()
+    return case((col >= stamp, col + 1), else_=stamp)
+
+
+def touch_trip(session: Session, trip_id: int) -> None:
+    session.execute(
+        update(Trip).where(Trip.id == trip_id).values(revision=_next(Trip.revision))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def touch_user(session: Session, user_id: int) -> None:
+    session.execute(
+        update(User).where(User.id == user_id).values(trips_revision=_next(User.trips_revision))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def trip_revision(session: Session, user_id: int, trip_id: int) -> Optional[int]:
+    # 自分の trip でなければ None
+    return session.execute(
+        select(Trip.revision).where(Trip.id == trip_id, Trip.user_id == user_id)
+    ).scalar()
+
+
+def list_revision(session: Session, user_id: int) -> int:
+    return session.execute(select(User.trips_revision).where(User.id == user_id)).scalar() or 0
+
+
+def list_etag(user_id: int, revision: int, lang: str, full: bool = False) -> str:
+    # full：全件表示（?all=1）。本文が違うので別の ETag
+    return f'"u{user_id}.{revision}.{lang}{".all" if full else ""}{_suffix()}"'
+
+
+def trip_etag(trip_id: int, revision: int, lang: str, full: bool = False) -> str:
+    return f'"t{trip_id}.{revision}.{lang}{".all" if full else ""}{_suffix()}"'
+
+
+def _suffix() -> str:
+    return f".{_build}" if _build else ""
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match は弱い比較（W/ を外して比べる）。"*" は常に一致
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+# app/services/search.py
+# 旅行・項目の全文検索（SQLite FTS5、trigram トークナイザ）。
+# - 分かち書き不要：3 文字ずつの部分文字列で索引するので、日本語・中国語もそのまま部分一致で引ける
+# - 索引 search_index は trips / items のトリガーで同じトランザクション内に更新される
+#   （ORM・一括 UPDATE/DELETE・外部キーの CASCADE・取り込みなど、どの経路で書いても漏れない）
+#   rowid は items = id、trips = -id（更新・削除は rowid 1 件で済む）
+# - 所有者は owner 列に "<u{user_id}>" を入れて MATCH で絞る（他人の行は索引の段階で落ちる）
+# - 3 文字未満の語は MATCH できないので、所有者で絞った行に LIKE をかける
+#   （3 文字以上の語が 1 つも無いときは索引を使っても絞れないので、はじめから LIKE で引く）
+# - 並びは BM25（タイトルを重く）。SQLite の bm25() は語ごとに全ユーザー分の文書数を数えるので、
+#   一致が RANK_WINDOW 件以下なら一致した行だけで Python で計算し、それを超えるときだけ bm25() に任せる
+#   強調表示とスニペットも Python 側で付ける（短い語も同じように光らせるため）
+# SQLite 以外（MySQL など）や FTS5 が無い環境では、trips / items への LIKE にフォールバックする。
+#   python -m app.services.search rebuild   … 索引を作り直す（トリガーも入れ直す）
+#   python -m app.services.search check     … 索引と元テーブルの件数を比べる
+
+import argparse, math, re
+from dataclasses import dataclass
+from typing import Optional
+
+from markupsafe import Markup, escape
+from sqlalchemy import literal, or_, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from ..models import Item, Trip
+
+FTS_TABLE = "search_index"
+TRIGRAM = 3
+
+# 1 回に返す件数
+SEARCH_LIMIT = 30
+MAX_SEARCH_LIMIT = 100
+SNIPPET_CHARS = 80
+
+# これ以下の一致なら Python で順位付け（超えたら SQLite の bm25()）
+RANK_WINDOW = 5000
+
+# BM25 の列の重み（title, body）と係数。bm25() には (owner, title, body, trip_id) の順で渡す
+TITLE_WEIGHT, BODY_WEIGHT = 10.0, 1.0
+_WEIGHTS = f"0.0, {TITLE_WEIGHT}, {BODY_WEIGHT}, 0.0"
+_K1, _B = 1.2, 0.75
+
+_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        owner, title, body, trip_id UNINDEXED, tokenize = 'trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_trips_ai AFTER INSERT ON trips BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, owner, title, body, trip_id)
+        VALUES (-new.id, '<u' || new.user_id || '>', new.title, coalesce(new.description, ''), new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_trips_au AFTER UPDATE OF title, description, user_id ON trips BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = -old.id;
+        INSERT INTO {FTS_TABLE}(rowid, owner, title, body, trip_id)
+        VALUES (-new.id, '<u' || new.user_id || '>', new.title, coalesce(new.description, ''), new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_trips_ad AFTER DELETE ON trips BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = -old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_items_ai AFTER INSERT ON items BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, owner, title, body, trip_id)
+        SELECT new.id, '<u' || t.user_id || '>', new.title, coalesce(new.note, ''), new.trip_id
+        FROM trips t WHERE t.id = new.trip_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_items_au AFTER UPDATE OF title, note, trip_id ON items BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, owner, title, body, trip_id)
+        SELECT new.id, '<u' || t.user_id || '>', new.title, coalesce(new.note, ''), new.trip_id
+        FROM trips t WHERE t.id = new.trip_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_items_ad AFTER DELETE ON items BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+)
+_TRIGGERS = ("search_trips_ai", "search_trips_au", "search_trips_ad",
+             "search_items_ai", "search_items_au", "search_items_ad")
+
+
+# ---------- 索引の管理 ----------
+def supported(conn: Connection) -> bool:
+    # SQLite で FTS5 の trigram が使えるか（3.34+）
+    if conn.dialect.name != "sqlite":
+        return False
+    try:
+        conn.exec_driver_sql("CREATE VIRTUAL TABLE temp._fts_probe USING fts5(x, tokenize = 'trigram')")
+        conn.exec_driver_sql("DROP TABLE temp._fts_probe")
+    except Exception:
+        return False
+    return True
+
+
+def installed(conn: Connection) -> bool:
+    if conn.dialect.name != "sqlite":
+        return False
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first() is not None
+
+
+def install(conn: Connection) -> None:
+    for ddl in _DDL:
+        conn.exec_driver_sql(ddl)
+
+
+def rebuild(conn: Connection) -> int:
+    # 索引とトリガーを作り直して全件を入れ直す。入れた行数を返す（commit は呼び出し側）
+    for name in _TRIGGERS:
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    install(conn)
+    n = conn.exec_driver_sql(
+        f"""INSERT INTO {FTS_TABLE}(rowid, owner, title, body, trip_id)
+            SELECT -id, '<u' || user_id || '>', title, coalesce(description, ''), id FROM trips"""
+    ).rowcount
+    n += conn.exec_driver_sql(
+        f"""INSERT INTO {FTS_TABLE}(rowid, owner, title, body, trip_id)
+            SELECT i.id, '<u' || t.user_id || '>', i.title, coalesce(i.note, ''), i.trip_id
+            FROM items i JOIN trips t ON t.id = i.trip_id"""
+    ).rowcount
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return n
+
+
+def counts(conn: Connection) -> tuple[int, int]:
+    # (索引の行数, trips + items の行数)
+    indexed = conn.exec_driver_sql(f"SELECT count(*) FROM {FTS_TABLE}").scalar()
+    rows = conn.exec_driver_sql("SELECT (SELECT count(*) FROM trips) + (SELECT count(*) FROM items)").scalar()
+    return indexed, rows
+
+
+# ---------- 検索 ----------
+@dataclass
+class Hit:
+    kind: str  # "trip" / "item"
+    id: int
+    trip_id: int
+    trip_title: str
+    title: Markup    # 一致箇所を <mark> で囲んだ HTML（エスケープ済み）
+    snippet: Markup  # 本文（説明・メモ）の一致箇所の前後
+    score: float     # 大きいほど関連が高い（LIKE のフォールバックでは 0）
+
+    def as_dict(self) -> dict:
+        return {"kind": self.kind, "id": self.id, "trip_id": self.trip_id, "trip_title": self.trip_title,
+                "title": str(self.title), "snippet": str(self.snippet), "score": self.score}
+
+
+def terms(q: str) -> list[str]:
+    # 空白区切りの語（重複は除く、最大 8 語）
+    return list(dict.fromkeys(t for t in q.split() if t))[:8]
+
+
+def _phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like(term: str) -> str:
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _pattern(words: list[str]):
+    return re.compile("|".join(re.escape(w) for w in sorted(words, key=len, reverse=True)), re.IGNORECASE)
+
+
+def highlight(value: str, pattern) -> Markup:
+    out, pos = [], 0
+    for m in pattern.finditer(value):
+        out.append(escape(value[pos:m.start()]))
+        out.append(Markup("<mark>%s</mark>") % m.group())
+        pos = m.end()
+    out.append(escape(value[pos:]))
+    return Markup("").join(out)
+
+
+def snippet(value: str, pattern, width: int = SNIPPET_CHARS) -> Markup:
+    # 最初の一致の前後 width 文字程度（一致が無ければ先頭）
+    if not value:
+        return Markup("")
+    m = pattern.search(value)
+    start = max(0, (m.start() if m else 0) - width // 4)
+    end = min(len(value), start + width)
+    part = highlight(value[start:end], pattern)
+    return (Markup("…") if start else Markup("")) + part + (Markup("…") if end < len(value) else Markup(""))
+
+
+def _hits(rows, words: list[str]) -> list[Hit]:
+    pattern = _pattern(words)
+    return [
+        Hit("trip" if rid < 0 else "item", abs(rid), trip_id, trip_title,
+            highlight(title, pattern), snippet(body or "", pattern), round(float(score), 4))
+        for rid, trip_id, title, body, score, trip_title in rows
+    ]
+
+
+def _rank(rows, words: list[str]) -> list:
+    # 一致した行だけを文書集合とみなした BM25（大きいほど上）。行は (rowid, trip_id, title, body, score, trip_title)
+    if not rows:
+        return rows
+    lowered = [(r[2].lower(), (r[3] or "").lower()) for r in rows]
+    avg = [max(1.0, sum(len(d[c]) for d in lowered) / len(lowered)) for c in (0, 1)]
+    scored = [[0.0, row] for row in rows]
+    for w in (w.lower() for w in words):
+        tfs = [(doc[0].count(w), doc[1].count(w)) for doc in lowered]
+        n = sum(1 for tf in tfs if tf[0] or tf[1])
+        idf = math.log((len(rows) - n + 0.5) / (n + 0.5) + 1.0)
+        for entry, doc, tf in zip(scored, lowered, tfs):
+            for c, weight in ((0, TITLE_WEIGHT), (1, BODY_WEIGHT)):
+                if tf[c]:
+                    norm = _K1 * (1 - _B + _B * len(doc[c]) / avg[c])
+                    entry[0] += weight * idf * tf[c] * (_K1 + 1) / (tf[c] + norm)
+    scored.sort(key=lambda e: (-e[0], e[1][0]))
+    return [(*row[:4], score, row[5]) for score, row in scored]
+
+
+def _search_fts(session: Session, user_id: int, words: list[str], limit: int, offset: int):
+    long_terms = [w for w in words if len(w) >= TRIGRAM]
+    match = " AND ".join([f'owner : "<u{int(user_id)}>"'] + [f"{{title body}} : {_phrase(w)}" for w in long_terms])
+    params = {"match": match}
+    short = []
+    for i, w in enumerate(w for w in words if len(w) < TRIGRAM):
+        params[f"l{i}"] = _like(w)
+        short.append(f"(s.title LIKE :l{i} ESCAPE '\\' OR s.body LIKE :l{i} ESCAPE '\\')")
+    where = f"{FTS_TABLE} MATCH :match {''.join(' AND ' + c for c in short)}"
+    rows = session.execute(text(f"""
+        SELECT s.rowid, s.trip_id, s.title, s.body, 0.0, t.title
+        FROM {FTS_TABLE} s JOIN trips t ON t.id = s.trip_id
+        WHERE {where}
+        LIMIT {RANK_WINDOW + 1}
+    """), params).all()
+    if len(rows) <= RANK_WINDOW:
+        return _rank(rows, words)[offset:offset + limit]
+    return session.execute(text(f"""
+        SELECT s.rowid, s.trip_id, s.title, s.body, -bm25({FTS_TABLE}, {_WEIGHTS}) AS score, t.title
+        FROM {FTS_TABLE} s JOIN trips t ON t.id = s.trip_id
+        WHERE {where}
+        ORDER BY score DESC, s.rowid
+        LIMIT :limit OFFSET :offset
+    """), {**params, "limit": limit, "offset": offset}).all()
+
+
+def _search_like(session: Session, user_id: int, words: list[str], limit: int, offset: int):
+    # フォールバック：自分の行だけを LIKE で（関連度は付けず、旅行 → 項目の id 順）
+    def cond(title_col, body_col):
+        return [or_(title_col.like(_like(w), escape="\\"), body_col.like(_like(w), escape="\\")) for w in words]
+    trips = (
+        select((-Trip.id).label("rid"), Trip.id.label("trip_id"), Trip.title, Trip.description,
+               literal(0.0).label("score"), Trip.title.label("trip_title"))
+        .where(Trip.user_id == user_id, *cond(Trip.title, Trip.description))
+    )
+    items = (
+        select(Item.id, Item.trip_id, Item.title, Item.note, literal(0.0), Trip.title)
+        .join(Trip, Trip.id == Item.trip_id)
+        .where(Trip.user_id == user_id, *cond(Item.title, Item.note))
+    )
+    stmt = trips.union_all(items).order_by(text("1")).limit(limit).offset(offset)
+    return session.execute(stmt).all()
+
+
+def search(session: Session, user_id: int, q: str, limit: int = SEARCH_LIMIT, offset: int = 0,
+           use_fts: Optional[bool] = None) -> list[Hit]:
+    # 自分の旅行・項目から q の語をすべて含むものを関連度順に
+    words = terms(q)
+    if not words:
+        return []
+    if use_fts is None:
+        use_fts = installed(session.connection())
+    if not any(len(w) >= TRIGRAM for w in words):
+        use_fts = False
+    rows = (_search_fts if use_fts else _search_like)(session, user_id, words, limit, offset)
+    return _hits(rows, words)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="全文検索の索引（SQLite FTS5）")
+    ap.add_argument("command", choices=("rebuild", "check"))
+    args = ap.parse_args(argv)
+    from ..db import engine
+    with engine.begin() as conn:
+        if not supported(conn):
+            print("FTS5（trigram）が使えないため、検索は LIKE で動きます")
+            return 1
+        if args.command == "rebuild":
+            print(f"indexed {rebuild(conn)} rows")
+            return 0
+        if not installed(conn):
+            print("索引がありません: python -m app.services.search rebuild")
+            return 1
+        indexed, rows = counts(conn)
+        print(f"index {indexed} / rows {rows}: {'ok' if indexed == rows else 'MISMATCH (rebuild してください)'}")
+        return 0 if indexed == rows else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
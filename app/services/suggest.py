@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# app/services/suggest.py
+# 項目タイトルの入力補完（ユーザーごとのプロセス内索引）。
+# - 初めて補完を引いたときに、そのユーザーの Item.title を 1 回だけ読んで索引を作る
+# - 画面の項目の追加・編集・削除は commit 後に added / removed で差分だけ反映する
+#   （旅行の削除や API の更新のように、どのタイトルが消えたかが分からないときは forget で捨てて作り直す）
+# - 索引は正規化したタイトル（NFKC + casefold）の整列済みリスト（前方一致は bisect）と、
+#   3 文字ずつの部分文字列 → タイトルの集合（3 文字以上の入力での部分一致）
+# - 使われたタイトルの回数が多い順に返す
+# - ユーザー単位の LRU。推定バイト数の合計が SUGGEST_MAX_BYTES を超えたら古い順に捨てる
+# 状態はイベントループ上からのみ触る（page_cache の memory と同じ）。ワーカーごとに別の索引を持つので、
+# 他のワーカーで入った更新はそのワーカーの索引が LRU で捨てられるまで見えない（補完なので許容）。
+#   SUGGEST_MAX_BYTES = 索引の合計の上限（既定 32 MiB）
+
+import heapq, os, sys, unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .. import metrics
+from ..models import Item, Trip
+
+BUILDS = metrics.counter("suggest_build_total", "per-user autocomplete indexes built from the database")
+EVICTIONS = metrics.counter("suggest_evict_total", "per-user autocomplete indexes dropped by the memory bound")
+
+SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 20
+# 前方一致で見る候補の数（1 文字目だけの入力でも一定時間で返すため）
+PREFIX_SCAN = 500
+GRAM = 3
+
+# 推定サイズの係数（scripts/bench_suggest.py の tracemalloc の実測に合わせたもの）
+_ENTRY_BYTES = 240      # 1 タイトルあたりの dict / list / 整列リストの分
+_GRAM_BYTES = 32        # 部分文字列の集合への登録 1 件あたり
+_GRAM_SET_BYTES = 320   # 新しい部分文字列 1 つあたり（文字列と集合）
+
+
+def normalize(title: str) -> str:
+    return unicodedata.normalize("NFKC", title).strip().casefold()
+
+
+def _grams(key: str) -> set[str]:
+    return {key[i:i + GRAM] for i in range(len(key) - GRAM + 1)}
+
+
+class Titles:
+    # 1 ユーザー分の索引
+    def __init__(self):
+        self.entries: dict[str, list] = {}  # 正規化したタイトル → [表示用のタイトル, 回数]
+        self.keys: list[str] = []           # entries のキーを整列したもの
+        self.grams: dict[str, set[str]] = {}
+        self.nbytes = sys.getsizeof(self)
+
+    @staticmethod
+    def _size(key: str, shown: str) -> int:
+        return (sys.getsizeof(key) + (sys.getsizeof(shown) if shown != key else 0)
+                + _ENTRY_BYTES + _GRAM_BYTES * max(0, len(key) - GRAM + 1))
+
+    def add(self, title: str, n: int = 1) -> None:
+        key = normalize(title)
+        if not key:
+            return
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[1] += n
+            return
+        shown = title.strip()
+        self.entries[key] = [shown, n]
+        insort(self.keys, key)
+        for g in _grams(key):
+            keys = self.grams.get(g)
+            if keys is None:
+                keys = self.grams[g] = set()
+                self.nbytes += _GRAM_SET_BYTES
+            keys.add(key)
+        self.nbytes += self._size(key, shown)
+
+    def remove(self, title: str) -> None:
+        key = normalize(title)
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del self.entries[key]
+        del self.keys[bisect_left(self.keys, key)]
+        for g in _grams(key):
+            keys = self.grams.get(g)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.grams[g]
+                    self.nbytes -= _GRAM_SET_BYTES
+        self.nbytes -= self._size(key, entry[0])
+
+    def suggest(self, q: str, limit: int = SUGGEST_LIMIT) -> list[str]:
+        # 前方一致を優先し、足りなければ部分一致（どちらも回数の多い順）
+        key = normalize(q)
+        if not key:
+            return []
+        start = bisect_left(self.keys, key)
+        prefix = []
+        for k in self.keys[start:start + PREFIX_SCAN]:
+            if not k.startswith(key):
+                break
+            prefix.append(k)
+        found = self._ranked(prefix, limit)
+        if len(found) < limit and len(key) >= GRAM:
+            # 入力の部分文字列のうち、いちばん少ないタイトルにしか出てこないものから絞って本文で確かめる
+            fewest = min((self.grams.get(g, ()) for g in _grams(key)), key=len)
+            infix = [k for k in fewest if key in k and not k.startswith(key)]
+            found += self._ranked(infix, limit - len(found))
+        return [self.entries[k][0] for k in found]
+
+    def _ranked(self, keys: list[str], limit: int) -> list[str]:
+        return heapq.nsmallest(limit, keys, key=lambda k: (-self.entries[k][1], k))
+
+
+def load_titles(session: Session, user_id: int) -> list[tuple[str, int]]:
+    # (タイトル, そのタイトルの項目数)
+    return [tuple(r) for r in session.execute(
+        select(Item.title, func.count())
+        .join(Trip, Trip.id == Item.trip_id)
+        .where(Trip.user_id == user_id)
+        .group_by(Item.title)
+    )]
+
+
+def build(rows: Iterable[tuple[str, int]]) -> Titles:
+    titles = Titles()
+    for title, n in rows:
+        titles.add(title, n)
+    return titles
+
+
+class Suggester:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._users: "OrderedDict[int, Titles]" = OrderedDict()
+        # 索引を作っている途中のユーザー → その間に更新が来たか（来たら作った索引は古いので置かない）
+        self._building: dict[int, bool] = {}
+        self.nbytes = 0  # _users の Titles.nbytes の合計（入れる・変える・捨てるたびに差分で合わせる）
+
+    def get(self, user_id: int) -> Optional[Titles]:
+        titles = self._users.get(user_id)
+        if titles is not None:
+            self._users.move_to_end(user_id)
+        return titles
+
+    def begin(self, user_id: int) -> None:
+        self._building.setdefault(user_id, False)
+
+    def install(self, user_id: int, titles: Titles) -> Titles:
+        # begin 以降に更新が来ていなければ LRU に入れる（来ていたら今回だけ使う）
+        stale = self._building.pop(user_id, True)
+        BUILDS.inc()
+        if stale:
+            return titles
+        old = self._users.get(user_id)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self._users[user_id] = titles
+        self._users.move_to_end(user_id)
+        self.nbytes += titles.nbytes
+        self._evict(keep=user_id)
+        return titles
+
+    def _evict(self, keep: int) -> None:
+        # 古い順に捨てる。keep（いま使ったユーザー）は残し、その次に古いものから
+        while self.nbytes > self.max_bytes and len(self._users) > 1:
+            user_id = next(u for u in self._users if u != keep)
+            self.nbytes -= self._users.pop(user_id).nbytes
+            EVICTIONS.inc()
+
+    def _changed(self, user_id: int) -> Optional[Titles]:
+        if user_id in self._building:
+            self._building[user_id] = True
+        return self._users.get(user_id)
+
+    def added(self, user_id: int, title: str) -> None:
+        titles = self._changed(user_id)
+        if titles is not None:
+            before = titles.nbytes
+            titles.add(title)
+            self.nbytes += titles.nbytes - before
+            self._users.move_to_end(user_id)
+            self._evict(keep=user_id)
+
+    def removed(self, user_id: int, title: str) -> None:
+        titles = self._changed(user_id)
+        if titles is not None:
+            before = titles.nbytes
+            titles.remove(title)
+            self.nbytes += titles.nbytes - before
+
+    def forget(self, user_id: int) -> None:
+        self._changed(user_id)
+        titles = self._users.pop(user_id, None)
+        if titles is not None:
+            self.nbytes -= titles.nbytes
+
+
+index = Suggester(int(os.getenv("SUGGEST_MAX_BYTES", str(32 * 2**20))))
+
+
+async def suggest(user_id: int, q: str, limit: int = SUGGEST_LIMIT) -> list[str]:
+    # 索引が無ければ読み取り用の接続で 1 回だけ作る（以後は DB に触れない）
+    titles = index.get(user_id)
+    if titles is None:
+        from ..db import async_read_session
+        index.begin(user_id)
+        async with async_read_session() as session:
+            rows = await session.run_sync(load_titles, user_id)
+        titles = index.install(user_id, build(rows))
+    return titles.suggest(q, limit)
+
+
+# 更新系ハンドラが commit 後に呼ぶ
+def added(user_id: int, title: str) -> None:
+    index.added(user_id, title)
+
+
+def removed(user_id: int, title: str) -> None:
+    index.removed(user_id, title)
+
+
+def forget(user_id: int) -> None:
+    index.forget(user_id)
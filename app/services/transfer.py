@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+# app/services/transfer.py
+# 旅行・項目のエクスポート／インポート（CSV と NDJSON）。
+# - CSV は既存のバックアップ（trips_backup_YYYYMMDD.csv など）と同じ列・BOM 付き UTF-8・LF 改行
+#   NDJSON は 1 行 1 件で "type"（user / trip / item）付き。BOM は付けない（読むときはどちらも受け付ける）
+# - エクスポート：yield_per で EXPORT_BATCH 行ずつ読み、その分だけ書いて bytes で返す（ファイル全体を作らない）
+# - インポート（ユーザー単位）：prepare で検証（DB は触らない）して IMPORT_CHUNK 行ずつのチャンクにし、
+#   write_chunk で insert（executemany）。id は振り直し（trip は RETURNING で新しい id を受け取り、
+#   項目の trip_id を付け替える）、sort_order はそのまま。不正な行は ImportFailed（ファイル・行番号付き）、
+#   IMPORT_MAX_ROWS 行を超えたら ImportTooLarge。最後に finish_user（同期用の変更ログは reset）
+#   import_user は 3 つを 1 トランザクションで続けて呼ぶ（CLI 用。読みながら書くのでメモリはチャンク分）。
+#   画面からの取り込みは検証を書き込みスレッドの外で先に終え、チャンクごとに run_write に渡す（routers/transfer.py）
+#   呼び出し側は commit 後に page_cache.bump(user_scope) と suggest.forget を呼ぶこと
+# - 全体の復元（CLI のみ）：空の DB に users / trips / items を id ごとそのまま入れる。検索の索引は最後に作り直す
+#   python -m app.services.transfer export [--user LOGIN] [--format csv|ndjson] [--out DIR]
+#   python -m app.services.transfer import FILE... [--user LOGIN]   （--user なしは全体の復元）
+
+import argparse, csv, io, json, os, sys
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from ..models import Item, Trip, User
+from . import changelog, revisions
+from .ordering import KEY_MAX, KEY_MIN
+
+TRIP_FIELDS = ("id", "user_id", "title", "start_date", "end_date", "description", "sort_order")
+ITEM_FIELDS = ("id", "trip_id", "title", "date", "time", "note", "sort_order")
+USER_FIELDS = ("id", "login_id", "login_id_norm", "password_hash", "created_at")
+
+EXPORT_BATCH = 1000
+IMPORT_CHUNK = 5000
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(20 * 2**20)))  # 画面からの取り込み：アップロードの合計
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "200000"))            # 画面からの取り込み：trip + 項目の行数
+
+BOM = "\ufeff"
+
+
+class ImportFailed(ValueError):
+    def __init__(self, source: str, line: int, detail: str):
+        super().__init__(f"{source}:{line}: {detail}")
+        self.source, self.line, self.detail = source, line, detail
+
+    def as_dict(self) -> dict:
+        return {"file": self.source, "line": self.line, "detail": self.detail}
+
+
+class ImportTooLarge(ValueError):
+    # 上限（IMPORT_MAX_BYTES / IMPORT_MAX_ROWS）を超えた。画面からは 413
+    def as_dict(self) -> dict:
+        return {"detail": str(self)}
+
+
+def backup_name(kind: str, fmt: str = "csv", day: Optional[date] = None) -> str:
+    # trips_backup_20250913.csv / travel_backup_20250913.ndjson
+    stamp = (day or date.today()).strftime("%Y%m%d")
+    return f"{kind}_backup_{stamp}.{fmt}" if fmt == "csv" else f"travel_backup_{stamp}.{fmt}"
+
+
+# ---------- エクスポート ----------
+def _trip_rows(session: Session, user_id: Optional[int]):
+    stmt = select(*(getattr(Trip, f) for f in TRIP_FIELDS))
+    if user_id is None:
+        stmt = stmt.order_by(Trip.id)
+    else:
+        stmt = stmt.where(Trip.user_id == user_id).order_by(Trip.sort_order, Trip.id)
+    return session.execute(stmt.execution_options(yield_per=EXPORT_BATCH))
+
+
+def _item_rows(session: Session, user_id: Optional[int]):
+    stmt = select(*(getattr(Item, f) for f in ITEM_FIELDS))
+    if user_id is None:
+        stmt = stmt.order_by(Item.id)
+    else:
+        stmt = (stmt.where(Item.trip_id.in_(select(Trip.id).where(Trip.user_id == user_id)))
+                .order_by(Item.trip_id, Item.sort_order, Item.id))
+    return session.execute(stmt.execution_options(yield_per=EXPORT_BATCH))
+
+
+def _user_rows(session: Session):
+    stmt = select(*(getattr(User, f) for f in USER_FIELDS)).order_by(User.id)
+    return session.execute(stmt.execution_options(yield_per=EXPORT_BATCH))
+
+
+def _csv(header: tuple[str, ...], result) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    buf.write(BOM)
+    writer.writerow(header)
+    for rows in result.partitions():
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def export_csv(session: Session, kind: str, user_id: Optional[int] = None) -> Iterator[bytes]:
+    # kind: trips / items / users（users は全体のみ）。user_id なしは全ユーザー分を id 順に
+    if kind == "trips":
+        return _csv(TRIP_FIELDS, _trip_rows(session, user_id))
+    if kind == "items":
+        return _csv(ITEM_FIELDS, _item_rows(session, user_id))
+    if kind == "users" and user_id is None:
+        return _csv(USER_FIELDS, _user_rows(session))
+    raise ValueError(kind)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(type(value).__name__)
+
+
+def export_ndjson(session: Session, user_id: Optional[int] = None) -> Iterator[bytes]:
+    # 全体なら user → trip → item、ユーザー単位なら trip → item の順（取り込みは trip が先にある前提）
+    sources = [("trip", TRIP_FIELDS, _trip_rows), ("item", ITEM_FIELDS, _item_rows)]
+    if user_id is None:
+        sources.insert(0, ("user", USER_FIELDS, lambda s, _: _user_rows(s)))
+    for kind, fields, rows in sources:
+        for part in rows(session, user_id).partitions():
+            yield "".join(
+                json.dumps({"type": kind, **dict(zip(fields, r))}, ensure_ascii=False, default=_json_default) + "\n"
+                for r in part
+            ).encode("utf-8")
+
+
+# ---------- 読み込み ----------
+# レコードは (種類, ファイル名, 行番号, dict)。CSV は種類をファイル名から、NDJSON は "type" から決める
+
+def _text(f: IO[bytes]) -> io.TextIOWrapper:
+    # BOM の有無はどちらでもよい
+    return io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+
+
+def kind_of(filename: str) -> Optional[str]:
+    # trips_backup_20250913.csv → "trip"。NDJSON は None（行ごとに type を見る）
+    name = Path(filename).name.lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return None
+    for kind in ("user", "trip", "item"):
+        if name.startswith(kind):
+            return kind
+    raise ImportFailed(filename, 0, "file name must start with users / trips / items, or end with .ndjson")
+
+
+def read_csv(f: IO[bytes], kind: str, source: str) -> Iterator[tuple[str, str, int, dict]]:
+    reader = csv.DictReader(_text(f))
+    required = {"trip": TRIP_FIELDS, "item": ITEM_FIELDS, "user": USER_FIELDS}[kind]
+    missing = [c for c in required if c not in (reader.fieldnames or ()) and c != "user_id"]
+    if missing:
+        raise ImportFailed(source, 1, f"missing columns: {', '.join(missing)}")
+    for row in reader:
+        yield kind, source, reader.line_num, row
+
+
+def read_ndjson(f: IO[bytes], source: str) -> Iterator[tuple[str, str, int, dict]]:
+    for n, line in enumerate(_text(f), 1):
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            raise ImportFailed(source, n, f"invalid JSON: {e}") from None
+        if not isinstance(obj, dict) or obj.get("type") not in ("user", "trip", "item"):
+            raise ImportFailed(source, n, 'each line needs "type": "user" | "trip" | "item"')
+        yield obj["type"], source, n, obj
+
+
+def read_file(f: IO[bytes], filename: str) -> Iterator[tuple[str, str, int, dict]]:
+    kind = kind_of(filename)
+    return read_ndjson(f, filename) if kind is None else read_csv(f, kind, filename)
+
+
+# ---------- 検証 ----------
+def _blank(v) -> bool:
+    return v is None or (isinstance(v, str) and not v.strip())
+
+
+def _str(rec: dict, name: str, limit: Optional[int] = None, required: bool = False) -> Optional[str]:
+    v = rec.get(name)
+    if _blank(v):
+        if required:
+            raise ValueError(f"{name} is required")
+        return None
+    v = str(v).strip() if required else str(v)
+    if limit is not None and len(v) > limit:
+        raise ValueError(f"{name} is longer than {limit}")
+    return v
+
+
+def _int(rec: dict, name: str, lo: int = KEY_MIN, hi: int = KEY_MAX) -> int:
+    try:
+        v = int(rec.get(name))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer") from None
+    if not lo <= v <= hi:
+        raise ValueError(f"{name} is out of range")
+    return v
+
+
+def _date(rec: dict, name: str) -> Optional[date]:
+    v = rec.get(name)
+    if _blank(v):
+        return None
+    try:
+        return date.fromisoformat(str(v).strip())
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD") from None
+
+
+def _trip(rec: dict) -> dict:
+    return {"title": _str(rec, "title", 200, required=True), "start_date": _date(rec, "start_date"),
+            "end_date": _date(rec, "end_date"), "description": _str(rec, "description"),
+            "sort_order": _int(rec, "sort_order")}
+
+
+def _item(rec: dict) -> dict:
+    # time は長さを見ない（既存のデータには「11:00～23:00（L.O.22:00）」のような 20 文字を超える値がある）
+    return {"title": _str(rec, "title", 200, required=True), "date": _date(rec, "date"),
+            "time": _str(rec, "time"), "note": _str(rec, "note"), "sort_order": _int(rec, "sort_order")}
+
+
+def _user(rec: dict) -> dict:
+    created = rec.get("created_at")
+    try:
+        created = (datetime.fromisoformat(str(created).strip()) if not _blank(created)
+                   else datetime.now(timezone.utc).replace(tzinfo=None))
+    except ValueError:
+        raise ValueError("created_at must be an ISO date-time") from None
+    return {"login_id": _str(rec, "login_id", 50, required=True),
+            "login_id_norm": _str(rec, "login_id_norm", 50, required=True),
+            "password_hash": _str(rec, "password_hash", 255, required=True), "created_at": created}
+
+
+def _id(rec: dict, name: str = "id") -> int:
+    return _int(rec, name, 1, 2**63 - 1)
+
+
+def _checked(fn, rec: dict, source: str, line: int) -> dict:
+    try:
+        return fn(rec)
+    except ValueError as e:
+        raise ImportFailed(source, line, str(e)) from None
+
+
+# ---------- インポート ----------
+Chunk = tuple[str, list[tuple[int, dict]]]
+
+
+def prepare(records: Iterable[tuple[str, str, int, dict]], max_rows: Optional[int] = None) -> Iterator[Chunk]:
+    # 検証だけ（DB は触らない）。IMPORT_CHUNK 行ずつ ("trip", [(ファイル上の id, 行)]) か
+    # ("item", [(ファイル上の trip の id, 行)]) を返す。項目より前の trip は先に出す（新しい id が要る）
+    seen: set[int] = set()  # ファイル上の trip の id
+    trips: list[tuple[int, dict]] = []
+    items: list[tuple[int, dict]] = []
+    rows = 0
+    for kind, source, line, rec in records:
+        if kind == "user":
+            continue  # 全体のバックアップを流し込んでもユーザー行は無視
+        rows += 1
+        if max_rows is not None and rows > max_rows:
+            raise ImportTooLarge(f"more than {max_rows} rows")
+        if kind == "trip":
+            old_id = _checked(_id, rec, source, line)
+            if old_id in seen:
+                raise ImportFailed(source, line, f"duplicate trip id {old_id}")
+            seen.add(old_id)
+            trips.append((old_id, _checked(_trip, rec, source, line)))
+            if len(trips) >= IMPORT_CHUNK:
+                yield "trip", trips
+                trips = []
+            continue
+        row = _checked(_item, rec, source, line)
+        old_trip = _checked(lambda r: _id(r, "trip_id"), rec, source, line)
+        if old_trip not in seen:
+            raise ImportFailed(source, line, f"trip_id {old_trip} is not in the imported trips")
+        if trips:
+            yield "trip", trips
+            trips = []
+        items.append((old_trip, row))
+        if len(items) >= IMPORT_CHUNK:
+            yield "item", items
+            items = []
+    if trips:
+        yield "trip", trips
+    if items:
+        yield "item", items
+
+
+def write_chunk(session: Session, user_id: int, chunk: Chunk, trip_ids: dict[int, int]) -> int:
+    # prepare の 1 チャンクを insert して行数を返す。trip_ids（ファイル上の id → 新しい id）は trip で埋まり、
+    # 項目はそれで付け替える。チャンクをまたいで同じ dict を渡すこと（commit は呼び出し側）
+    kind, rows = chunk
+    if kind == "trip":
+        new_ids = session.execute(
+            insert(Trip).returning(Trip.id, sort_by_parameter_order=True),
+            [{"user_id": user_id, **row} for _, row in rows],
+        ).scalars().all()
+        trip_ids.update(zip((old for old, _ in rows), new_ids))
+    else:
+        session.execute(insert(Item), [{"trip_id": trip_ids[old], **row} for old, row in rows])
+    return len(rows)
+
+
+def finish_user(session: Session, user_id: int, counts: dict) -> None:
+    if counts["trips"]:
+        revisions.touch_user(session, user_id)
+    if counts["trips"] or counts["items"]:
+        changelog.reset(session, user_id)
+
+
+def discard_trips(session: Session, user_id: int, trip_ids: Iterable[int]) -> None:
+    # 途中まで書いたチャンクの取り消し（項目は外部キーの CASCADE で消える）。
+    # 途中の一覧が描画キャッシュや ETag に残らないようにリビジョンは進める（commit は呼び出し側）
+    ids = list(trip_ids)
+    for k in range(0, len(ids), IMPORT_CHUNK):
+        session.execute(delete(Trip).where(Trip.user_id == user_id, Trip.id.in_(ids[k:k + IMPORT_CHUNK])))
+    revisions.touch_user(session, user_id)
+
+
+def import_user(session: Session, user_id: int, records: Iterable[tuple[str, str, int, dict]],
+                max_rows: Optional[int] = None) -> dict:
+    # 自分のアカウントに追加する（1 トランザクション）。{"trips": n, "items": n} を返す（commit は呼び出し側）
+    counts = {"trips": 0, "items": 0}
+    trip_ids: dict[int, int] = {}
+    for chunk in prepare(records, max_rows):
+        counts[chunk[0] + "s"] += write_chunk(session, user_id, chunk, trip_ids)
+    finish_user(session, user_id, counts)
+    return counts
+
+
+def restore(session: Session, records: Iterable[tuple[str, str, int, dict]]) -> dict:
+    # 全体の復元：id をそのまま入れる（空の DB 用。commit は呼び出し側）
+    if session.execute(select(func.count()).select_from(User)).scalar():
+        raise ImportFailed("-", 0, "restore needs an empty database (use --user to import into an account)")
+    counts = {"users": 0, "trips": 0, "items": 0}
+    batches: dict[str, list[dict]] = {"user": [], "trip": [], "item": []}
+    models = {"user": User, "trip": Trip, "item": Item}
+    order = ["user", "trip", "item"]
+
+    def flush(kind: str) -> None:
+        if batches[kind]:
+            session.execute(insert(models[kind]), batches[kind])
+            counts[kind + "s"] += len(batches[kind])
+            batches[kind] = []
+
+    for kind, source, line, rec in records:
+        row = _checked({"user": _user, "trip": _trip, "item": _item}[kind], rec, source, line)
+        row["id"] = _checked(_id, rec, source, line)
+        parent_col = {"trip": "user_id", "item": "trip_id"}.get(kind)
+        if parent_col:
+            row[parent_col] = _checked(lambda r: _id(r, parent_col), rec, source, line)
+        # 親を先に入れる（外部キー）
+        for parent in order[:order.index(kind)]:
+            flush(parent)
+        batches[kind].append(row)
+        if len(batches[kind]) >= IMPORT_CHUNK:
+            flush(kind)
+    for kind in order:
+        flush(kind)
+    return counts
+
+
+# ---------- CLI ----------
+def _export(args) -> int:
+    from ..db import ReadSessionLocal
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    with ReadSessionLocal() as session:
+        user_id = None
+        if args.user:
+            user_id = session.execute(select(User.id).where(User.login_id_norm == args.user.lower())).scalar()
+            if user_id is None:
+                print(f"no such user: {args.user}")
+                return 1
+        if args.format == "ndjson":
+            targets = [(out / backup_name("travel", "ndjson"), lambda: export_ndjson(session, user_id))]
+        else:
+            kinds = ("trips", "items") if user_id else ("users", "trips", "items")
+            targets = [(out / backup_name(k), lambda k=k: export_csv(session, k, user_id)) for k in kinds]
+        for path, chunks in targets:
+            with open(path, "wb") as f:
+                for chunk in chunks():
+                    f.write(chunk)
+            print(f"wrote {path}")
+    return 0
+
+
+def _records(paths: list[str]) -> Iterator[tuple[str, str, int, dict]]:
+    # users → trips → items の順に（NDJSON はファイルの中の順）
+    rank = {"user": 0, "trip": 1, "item": 2, None: 3}
+    for path in sorted(paths, key=lambda p: rank[kind_of(p)]):
+        with open(path, "rb") as f:
+            yield from read_file(f, Path(path).name)
+
+
+def _import(args) -> int:
+    from ..db import SessionLocal, engine
+    from . import search
+    try:
+        with SessionLocal() as session:
+            if args.user:
+                user_id = session.execute(select(User.id).where(User.login_id_norm == args.user.lower())).scalar()
+                if user_id is None:
+                    print(f"no such user: {args.user}")
+                    return 1
+                counts = import_user(session, user_id, _records(args.files))
+            else:
+                counts = restore(session, _records(args.files))
+            session.commit()
+    except ImportFailed as e:
+        print(f"import failed (nothing was written): {e}")
+        return 1
+    if not args.user:
+        # 索引はトリガーでも入っているが、まとめて作り直して詰める
+        with engine.begin() as conn:
+            if search.installed(conn):
+                search.rebuild(conn)
+    print(", ".join(f"{k}: {v}" for k, v in counts.items()))
+    print("実行中のサーバーがあれば再起動してください（描画キャッシュ・入力補完は各プロセスのメモリにあります）")
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="旅行・項目のエクスポート／インポート")
+    sub = ap.add_subparsers(dest="command", required=True)
+    ex = sub.add_parser("export")
+    ex.add_argument("--user", help="このユーザーの分だけ（既定は全体：users / trips / items）")
+    ex.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    ex.add_argument("--out", default=".")
+    im = sub.add_parser("import")
+    im.add_argument("files", nargs="+", help="trips_*.csv / items_*.csv / users_*.csv / *.ndjson")
+    im.add_argument("--user", help="このユーザーに追加する（id は振り直し）。省略時は空の DB へ全体を復元")
+    args = ap.parse_args(argv)
+    return _export(args) if args.command == "export" else _import(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
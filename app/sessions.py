@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# app/sessions.py
+# サーバ側セッション。Cookie には推測不能な ID だけを置き、中身はストアに保存する。
+# （Starlette の SessionMiddleware はセッション全体を署名付き Cookie に入れるため、
+#   登録フローの項目が増えるほど毎リクエストの送信量と HMAC 検証が大きくなる）
+#   SESSION_BACKEND     = sqlite（既定）| memory | cookie（旧来の署名付き Cookie）
+#   SESSION_TTL         = 有効期限（秒、既定 14 日。アクセスのたびに延長）
+#   SESSION_DB          = sqlite バックエンドのファイル（既定 sessions.db）
+#   SESSION_MAX_ENTRIES = memory バックエンドの上限件数（既定 100000、超えたら古い順に破棄）
+# memory はプロセス内だけで有効（uvicorn --workers 2 以上や再起動を跨ぐなら sqlite）。
+
+import json, os, secrets, sqlite3, threading, time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection, Request
+
+DEFAULT_TTL = 14 * 24 * 3600
+
+
+class SessionStore(ABC):
+    # get / set / delete を実装する。blocking=True のストアはスレッドプールで呼ぶ
+    blocking = False
+
+    @abstractmethod
+    def get(self, sid: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def set(self, sid: str, data: dict) -> None: ...
+
+    @abstractmethod
+    def delete(self, sid: str) -> None: ...
+
+
+class MemoryStore(SessionStore):
+    # LRU + TTL。イベントループ上からのみ触るのでロックは持たない
+    def __init__(self, ttl: int = DEFAULT_TTL, max_entries: int = 100_000):
+        self.ttl, self.max_entries = ttl, max_entries
+        self._data: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+
+    def get(self, sid: str) -> Optional[dict]:
+        hit = self._data.get(sid)
+        if hit is None:
+            return None
+        expires, data = hit
+        if expires < time.time():
+            del self._data[sid]
+            return None
+        # 参照されたら期限を延ばし、LRU の末尾へ
+        self._data[sid] = (time.time() + self.ttl, data)
+        self._data.move_to_end(sid)
+        return dict(data)
+
+    def set(self, sid: str, data: dict) -> None:
+        self._data[sid] = (time.time() + self.ttl, dict(data))
+        self._data.move_to_end(sid)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, sid: str) -> None:
+        self._data.pop(sid, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore(SessionStore):
+    # 1 ファイルの SQLite に JSON で保存。期限の延長は残りが半分を切ったときだけ書く
+    blocking = True
+
+    def __init__(self, path: str = "sessions.db", ttl: int = DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._writes = 0
+
+    def get(self, sid: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT data, expires FROM sessions WHERE id = ?", (sid,)).fetchone()
+            if row is None:
+                return None
+            data, expires = row
+            if expires < now:
+                self._conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+                return None
+            if expires - now < self.ttl / 2:
+                self._conn.execute("UPDATE sessions SET expires = ? WHERE id = ?", (now + self.ttl, sid))
+        return json.loads(data)
+
+    def set(self, sid: str, data: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)",
+                (sid, json.dumps(data, ensure_ascii=False, separators=(",", ":")), now + self.ttl),
+            )
+            # ときどき期限切れを掃除
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._conn.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+
+class _SessionDict(dict):
+    # 変更があったときだけストアへ書き戻すための印付き dict
+    modified = False
+
+    def _touch(self, fn, *a, **kw):
+        self.modified = True
+        return fn(self, *a, **kw)
+
+    def __setitem__(self, k, v): self._touch(dict.__setitem__, k, v)
+    def __delitem__(self, k): self._touch(dict.__delitem__, k)
+    def pop(self, *a): return self._touch(dict.pop, *a)
+    def popitem(self): return self._touch(dict.popitem)
+    def setdefault(self, *a): return self._touch(dict.setdefault, *a)
+    def update(self, *a, **kw): self._touch(dict.update, *a, **kw)
+    def clear(self): self._touch(dict.clear)
+
+
+def regenerate_id(request: Request) -> None:
+    # ログイン直後などに ID を振り直す（セッション固定攻撃対策）。中身は引き継ぐ
+    request.scope["session_regenerate"] = True
+
+
+class ServerSessionMiddleware:
+    # Starlette の SessionMiddleware と同じく scope["session"] に dict を置く（request.session で使える）
+    def __init__(self, app, store: SessionStore, session_cookie: str = "session", max_age: int = DEFAULT_TTL,
+                 path: str = "/", same_site: str = "lax", https_only: bool = False):
+        self.app, self.store = app, store
+        self.cookie, self.max_age, self.path = session_cookie, max_age, path
+        flags = f"httponly; samesite={same_site}"
+        self.flags = flags + ("; secure" if https_only else "")
+
+    async def _call(self, fn, *args):
+        if self.store.blocking:
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        sid = HTTPConnection(scope).cookies.get(self.cookie)
+        data = await self._call(self.store.get, sid) if sid else None
+        if data is None:
+            sid = None
+        session = _SessionDict(data or {})
+        scope["session"] = session
+
+        async def send_wrapper(message):
+            nonlocal sid
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                regenerate = scope.get("session_regenerate")
+                if session.modified or regenerate:
+                    if not session:
+                        if sid:
+                            await self._call(self.store.delete, sid)
+                            headers.append("Set-Cookie", self._cookie("null", max_age=0))
+                        sid = None
+                    else:
+                        if sid and regenerate:
+                            await self._call(self.store.delete, sid)
+                            sid = None
+                        sid = sid or secrets.token_urlsafe(32)
+                        await self._call(self.store.set, sid, dict(session))
+                if sid:
+                    headers.append("Set-Cookie", self._cookie(sid, self.max_age))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _cookie(self, value: str, max_age: int) -> str:
+        return f"{self.cookie}={value}; path={self.path}; Max-Age={max_age}; {self.flags}"
+
+
+def build_store(backend: Optional[str] = None) -> Optional[SessionStore]:
+    # 環境変数からストアを作る（cookie の場合は None：旧来の SessionMiddleware を使う）
+    backend = backend or os.getenv("SESSION_BACKEND", "sqlite")
+    ttl = int(os.getenv("SESSION_TTL", str(DEFAULT_TTL)))
+    if backend == "memory":
+        return MemoryStore(ttl, int(os.getenv("SESSION_MAX_ENTRIES", "100000")))
+    if backend == "sqlite":
+        return SQLiteStore(os.getenv("SESSION_DB", "sessions.db"), ttl)
+    return None
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# app/templating.py
+# Jinja2 環境の生成。
+# - バイトコードキャッシュ（FileSystemBytecodeCache）：コンパイル結果をファイルに保存し、
+#   別ワーカー・再起動後はパースとコンパイルを飛ばして読み込むだけ（元ファイルのチェックサムで照合）
+# - auto_reload：既定は off（本番）。開発でテンプレートの変更を即反映したいときは TEMPLATE_AUTO_RELOAD=1
+# - warm()：起動時に app/templates の全テンプレートを読み込んでおく（最初のリクエストで compile しない）
+# - 事前コンパイル（デプロイ時に 1 回）：キャッシュを作り直し、ワーカーは最初から温かい状態で起動する
+#   python -m app.templating [--check]
+# - build_token()：テンプレート・アセットの manifest・画面の辞書から作るデプロイの識別子（起動時に 1 回）。
+#   ETag と描画キャッシュのキーに混ぜ、デプロイで HTML が変わったら古い 304 / キャッシュを返さない
+# - stream_response()：generate() の出力を StreamingResponse で流す（全件表示用）。
+#   ナビ（</nav>）まで描いたら一度送り、以降は STREAM_CHUNK ごとにまとめて送る
+#   TEMPLATE_CACHE_DIR   = バイトコードの保存先（既定 app/.template_cache、空文字で無効）
+#   TEMPLATE_AUTO_RELOAD = 1 でファイル更新を監視（既定 0）
+#   TEMPLATE_STREAMING   = 0 で全件表示も一括描画（既定 1）
+
+import argparse, hashlib, json, os, shutil, sys, time
+from pathlib import Path
+from typing import Callable, Optional
+
+import jinja2
+from fastapi.templating import Jinja2Templates
+from starlette.responses import StreamingResponse
+
+TEMPLATES_DIR = "app/templates"
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", "app/.template_cache")
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "0") == "1"
+TEMPLATE_STREAMING = os.getenv("TEMPLATE_STREAMING", "1") == "1"
+
+# ストリーミングで 1 回に送る大きさ（文字数の目安）と、最初に送る区切り
+STREAM_CHUNK = 16 * 1024
+STREAM_FIRST_FLUSH = "</nav>"
+
+# 読み込み対象（*.bak などは除く）
+TEMPLATE_SUFFIXES = (".html",)
+
+
+def build_env(directory: str = TEMPLATES_DIR, cache_dir: Optional[str] = TEMPLATE_CACHE_DIR,
+              auto_reload: bool = TEMPLATE_AUTO_RELOAD) -> jinja2.Environment:
+    bytecode_cache = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(directory),
+        autoescape=True,  # Jinja2Templates(directory=...) の既定と同じ
+        auto_reload=auto_reload,
+        bytecode_cache=bytecode_cache,
+        cache_size=-1,  # テンプレート数は少ないので全部メモリに置く
+    )
+
+
+def build_templates(**kw) -> Jinja2Templates:
+    return Jinja2Templates(env=build_env(**kw))
+
+
+def template_names(env: jinja2.Environment) -> list[str]:
+    return env.list_templates(filter_func=lambda name: name.endswith(TEMPLATE_SUFFIXES))
+
+
+def warm(env: jinja2.Environment) -> list[str]:
+    # 全テンプレートを読み込む（バイトコードキャッシュがあればそこから、無ければコンパイルして保存）
+    names = template_names(env)
+    for name in names:
+        env.get_template(name)
+    return names
+
+
+def build_token(manifest: dict, directory: str = TEMPLATES_DIR) -> str:
+    # テンプレートの中身（部品も含む）・アセットの manifest（指紋付きの名前）・i18n.py の辞書のハッシュ（短縮）
+    from . import i18n
+    h = hashlib.sha256()
+    root = Path(directory)
+    for p in sorted(root.rglob("*")):
+        if p.is_file() and p.name.endswith(TEMPLATE_SUFFIXES):
+            h.update(p.relative_to(root).as_posix().encode("utf-8") + b"\0" + p.read_bytes() + b"\0")
+    h.update(json.dumps(manifest, sort_keys=True).encode("utf-8"))
+    h.update(Path(i18n.__file__).read_bytes())
+    return h.hexdigest()[:8]
+
+
+def stream_chunks(template: jinja2.Template, context: dict, close: Optional[Callable[[], None]] = None):
+    # generate() の細かい断片をまとめて bytes で返す。終わったら（途中で切断されても）close を呼ぶ
+    buf, size, head_sent = [], 0, False
+    try:
+        for piece in template.generate(context):
+            buf.append(piece)
+            size += len(piece)
+            if size >= STREAM_CHUNK or (not head_sent and STREAM_FIRST_FLUSH in piece):
+                head_sent = True
+                yield "".join(buf).encode("utf-8")
+                buf, size = [], 0
+        if buf:
+            yield "".join(buf).encode("utf-8")
+    finally:
+        if close is not None:
+            close()
+
+
+def stream_response(templates: Jinja2Templates, name: str, context: dict,
+                    close: Optional[Callable[[], None]] = None) -> StreamingResponse:
+    # 同期のジェネレータなので、Starlette が 1 チャンクずつスレッドプールで進める（DB の取り出しも含む）
+    return StreamingResponse(stream_chunks(templates.get_template(name), context, close), media_type="text/html")
+
+
+def compile_all(directory: str = TEMPLATES_DIR, cache_dir: str = TEMPLATE_CACHE_DIR) -> list[tuple[str, float]]:
+    # キャッシュを作り直す。(テンプレート名, コンパイルにかかった ms) のリスト
+    if not cache_dir:
+        raise SystemExit("TEMPLATE_CACHE_DIR が空です")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    env = build_env(directory, cache_dir, auto_reload=False)
+    timings = []
+    for name in template_names(env):
+        t0 = time.perf_counter()
+        env.get_template(name)
+        timings.append((name, (time.perf_counter() - t0) * 1000))
+    return timings
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="テンプレートを事前コンパイルしてバイトコードキャッシュに書き出す")
+    ap.add_argument("--check", action="store_true", help="書き出した後、キャッシュから全件読み込めるか確かめる")
+    args = ap.parse_args(argv)
+    timings = compile_all()
+    for name, ms in timings:
+        print(f"{name:<24}{ms:>8.1f} ms")
+    print(f"{len(timings)} templates -> {TEMPLATE_CACHE_DIR}")
+    if args.check:
+        env = build_env(auto_reload=False)
+        misses = []
+        # キャッシュから読めなければ compile が呼ばれる
+        original = env.compile
+        env.compile = lambda *a, **kw: misses.append(a) or original(*a, **kw)
+        warm(env)
+        print("check: ok" if not misses else f"check: {len(misses)} templates were recompiled")
+        return 1 if misses else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
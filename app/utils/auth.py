@@ -1,9 +0,0 @@
-# app/utils/auth.py
-from passlib.context import CryptContext
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(plain: str) -> str:
-    return pwd_ctx.hash(plain)
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_ctx.verify(plain, hashed)
\ No newline at end of file
@@ -1,18 +1,13 @@
 # セキュリティ共通関数（パスワードハッシュ、検証コード生成/検証）
 
 import hashlib, hmac, secrets, string
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(raw: str) -> str:
-    # パスワードをbcryptでハッシュ化
-    return pwd_ctx.hash(raw)
-
-def verify_password(raw: str, hashed: str) -> bool:
-    # パスワード照合
-    return pwd_ctx.verify(raw, hashed)
+# パスワードのハッシュ化／照合は services/passwords に一本化（同期版を再公開）
+from ..services.passwords import (  # noqa: F401
+    hash_password_sync as hash_password,
+    verify_password_sync as verify_password,
+)
 
 def now_utc():
     # UTC現在時刻
@@ -32,4 +27,4 @@ def sha256_hex(text: str) -> str:
 
 def consteq(a: str, b: str) -> bool:
     # タイミング攻撃対策の比較
-    return hmac.compare_digest(a, b)
\ No newline at end of file
+    return hmac.compare_digest(a, b)
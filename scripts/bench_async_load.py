@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_async_load.py
+# 同時接続の負荷テスト。uvicorn を別プロセスで起動し、asyncio の最小 HTTP クライアントで
+# keep-alive 接続を --connections 本張って、旅程詳細の表示（95%）と項目の移動（5%）を叩き続ける。
+# --before REV を付けると、その版のツリー（git archive）も同じ条件で測って並べる。
+#   python scripts/bench_async_load.py [--connections 500] [--seconds 15] [--before <rev>]
+
+import argparse, asyncio, json, os, random, statistics, subprocess, sys, tempfile, time
+import http.cookiejar, urllib.error, urllib.parse, urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+SEED = (
+    "from app.db import engine, Base, SessionLocal\n"
+    "from app.models import User\n"
+    "from app.routers.auth import seed_template_for_user\n"
+    "from app.services.passwords import hash_password_sync\n"
+    "Base.metadata.create_all(engine)\n"
+    "with SessionLocal() as s:\n"
+    "    u = User(login_id='loaduser', login_id_norm='loaduser', password_hash=hash_password_sync('password1'))\n"
+    "    s.add(u); s.flush(); seed_template_for_user(s, u); s.commit()\n"
+    "    print(u.trips[0].id, ','.join(str(i.id) for i in u.trips[0].items))\n"
+)
+
+
+def export_tree(rev: str) -> Path:
+    # 指定の版を一時ディレクトリに展開
+    dest = Path(tempfile.mkdtemp())
+    archive = subprocess.run(["git", "archive", rev], cwd=ROOT, check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", str(dest)], input=archive, check=True)
+    return dest
+
+
+def login(base: str) -> str:
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    data = urllib.parse.urlencode({"login_id": "loaduser", "password": "password1"}).encode()
+    opener.open(f"{base}/login", data=data, timeout=60).read()
+    return next(c.value for c in jar if c.name == "session")
+
+
+def wait_ready(base: str, timeout: float = 60, path: str = "/login") -> None:
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            urllib.request.urlopen(f"{base}{path}", timeout=1)
+            return
+        except urllib.error.HTTPError:
+            return  # 404 などでも応答があれば起動済み
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def _read_response(reader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {k.lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+async def _connection(port: int, cookie: str, trip_id: int, item_ids: list[int], deadline: float,
+                      lat: dict, counts: dict) -> None:
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        counts["connect_error"] += 1
+        return
+    try:
+        while time.perf_counter() < deadline:
+            r = random.random()
+            kind = "write" if r >= 0.95 else "read"
+            body = b""
+            if r < 0.90:
+                line = f"GET /trips/{trip_id} HTTP/1.1"
+            elif r < 0.95:
+                line = "GET /trips HTTP/1.1"
+            else:
+                a, b = random.sample(item_ids, 2)
+                body = json.dumps({"id": a, "prev": b, "next": None}).encode()
+                line = f"POST /trips/{trip_id}/items/move HTTP/1.1"
+            req = (f"{line}\r\nHost: bench\r\nCookie: session={cookie}\r\n"
+                   f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+            t0 = time.perf_counter()
+            writer.write(req)
+            await writer.drain()
+            status = await _read_response(reader)
+            lat[kind].append((time.perf_counter() - t0) * 1000)
+            counts["ok" if status < 400 or status == 409 else "error"] += 1
+    except (OSError, asyncio.IncompleteReadError):
+        counts["error"] += 1
+    finally:
+        writer.close()
+
+
+async def _load(port: int, cookie: str, trip_id: int, item_ids: list[int], connections: int, seconds: float):
+    lat: dict = {"read": [], "write": []}
+    counts = {"ok": 0, "error": 0, "connect_error": 0}
+    deadline = time.perf_counter() + seconds
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_connection(port, cookie, trip_id, item_ids, deadline, lat, counts)
+                           for _ in range(connections)))
+    return lat, counts, time.perf_counter() - t0
+
+
+def run(tree: Path, label: str, port: int, connections: int, seconds: float) -> dict:
+    tmp = Path(tempfile.mkdtemp())
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp / 'load.db'}", "SESSION_BACKEND": "memory",
+           "PASSWORD_ROUNDS": "10"}
+    out = subprocess.run([sys.executable, "-c", SEED], cwd=tree, env=env, check=True,
+                         capture_output=True, text=True).stdout.split()
+    trip_id, item_ids = int(out[0]), [int(i) for i in out[1].split(",")]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning",
+         "--backlog", str(max(2048, connections * 2))],
+        cwd=tree, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base)
+        cookie = login(base)
+        lat, counts, spent = asyncio.run(_load(port, cookie, trip_id, item_ids, connections, seconds))
+    finally:
+        server.terminate()
+        server.wait()
+    result = {"label": label, "rps": counts["ok"] / spent, "errors": counts["error"] + counts["connect_error"]}
+    for kind, xs in lat.items():
+        xs.sort()
+        result[f"{kind}_p50"] = statistics.median(xs) if xs else 0
+        result[f"{kind}_p99"] = xs[int(len(xs) * 0.99)] if xs else 0
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--connections", type=int, default=500)
+    ap.add_argument("--seconds", type=float, default=15)
+    ap.add_argument("--before", help="比較対象の版（例: 非同期化前のコミット）")
+    ap.add_argument("--port", type=int, default=8790)
+    args = ap.parse_args()
+
+    targets = [(export_tree(args.before), args.before)] if args.before else []
+    targets.append((ROOT, "current"))
+    print(f"{'tree':<12}{'req/s':>8}{'read p50':>10}{'read p99':>10}{'write p50':>11}{'write p99':>11}{'errors':>8}")
+    for i, (tree, label) in enumerate(targets):
+        r = run(tree, label, args.port + i, args.connections, args.seconds)
+        print(f"{r['label']:<12}{r['rps']:>8.1f}{r['read_p50']:>10.1f}{r['read_p99']:>10.1f}"
+              f"{r['write_p50']:>11.1f}{r['write_p99']:>11.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_batch_api.py
+# 項目を N 件追加するコストの比較（TestClient、一時 DB）。
+#   form   : 画面と同じ POST /trips/{id}/items を N 回（毎回 303 → 詳細ページを再描画）
+#   api    : POST /api/v1/trips/{id}/items を N 回
+#   batch  : POST /api/v1/batch を 1 回（N 件の create_item）
+# リクエスト数・書き込みトランザクション数・合計時間を並べる。
+#   python scripts/bench_batch_api.py [--items 10] [--repeat 20]
+
+import argparse, os, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # テンプレートの相対パス用
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'batch.db'}"
+os.environ.setdefault("SESSION_BACKEND", "memory")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import db  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import SORT_GAP, Trip, User  # noqa: E402
+from app.services.passwords import hash_password_sync  # noqa: E402
+
+
+def _counting_writes():
+    # run_write の呼び出し回数（＝書き込みトランザクション数）を数える
+    calls = [0]
+    original = db.run_write
+
+    async def counted(fn, *args):
+        calls[0] += 1
+        return await original(fn, *args)
+    return calls, original, counted
+
+
+def run(client: TestClient, trip_id: int, mode: str, n: int) -> int:
+    # 発行したリクエスト数（リダイレクト先も数える）
+    if mode == "form":
+        for i in range(n):
+            client.post(f"/trips/{trip_id}/items", data={"title": f"form {i}", "time": "10:00"})
+        return n * 2
+    if mode == "api":
+        for i in range(n):
+            client.post(f"/api/v1/trips/{trip_id}/items", json={"title": f"api {i}", "time": "10:00"})
+        return n
+    ops = [{"op": "create_item", "trip_id": trip_id, "title": f"batch {i}", "time": "10:00"} for i in range(n)]
+    assert client.post("/api/v1/batch", json={"ops": ops}).json()["ok"]
+    return 1
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    from app.routers import api, trips
+    calls, original, counted = _counting_writes()
+    api.run_write = trips.run_write = counted
+
+    with TestClient(app) as client:
+        with SessionLocal() as s:
+            u = User(login_id="batch", login_id_norm="batch", password_hash=hash_password_sync("password1"))
+            s.add(u); s.flush()
+            t = Trip(user_id=u.id, title="バッチ", sort_order=SORT_GAP)
+            s.add(t); s.commit()
+            trip_id = t.id
+        client.post("/login", data={"login_id": "batch", "password": "password1"})
+        calls[0] = 0
+
+        print(f"{args.items} items, median of {args.repeat}")
+        print(f"{'mode':<8}{'requests':>10}{'writes':>8}{'ms':>10}")
+        for mode in ("form", "api", "batch"):
+            times, writes, reqs = [], 0, 0
+            for _ in range(args.repeat):
+                calls[0] = 0
+                t0 = time.perf_counter()
+                reqs = run(client, trip_id, mode, args.items)
+                times.append((time.perf_counter() - t0) * 1000)
+                writes = calls[0]
+            times.sort()
+            print(f"{mode:<8}{reqs:>10}{writes:>8}{times[len(times) // 2]:>10.1f}")
+    api.run_write = trips.run_write = original
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_cold_start.py
+# ワーカー起動直後の「最初のリクエスト」の遅さを測る。uvicorn を毎回新しいプロセスで起動し、
+# 起動完了（/__metrics が応答。METRICS_TOKEN なしなので 404）までの時間と、/login・/trips・/trips/{id} の 1 回目と 2 回目の応答時間を並べる。
+#   before      : --before REV のツリー（テンプレートは最初のリクエストでコンパイル）
+#   cold        : 現在のツリー、バイトコードキャッシュ空（起動時に全件コンパイル）
+#   precompiled : 現在のツリー、python -m app.templating で事前コンパイル済み
+#   python scripts/bench_cold_start.py [--before <rev>] [--runs 3]
+
+import argparse, os, statistics, subprocess, sys, tempfile, time
+import http.cookiejar, urllib.parse, urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_async_load import ROOT, SEED, export_tree, wait_ready  # noqa: E402
+
+STEPS = ("/login", "/trips", "/trips/{trip_id}")
+
+
+def _timed(opener, url: str, data: bytes | None = None) -> float:
+    t0 = time.perf_counter()
+    opener.open(url, data=data, timeout=60).read()
+    return (time.perf_counter() - t0) * 1000
+
+
+def run_once(tree: Path, env: dict, port: int) -> dict:
+    server_t0 = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=tree, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base, path="/__metrics")  # テンプレートを使わない応答で起動完了を待つ
+        result = {"startup": (time.perf_counter() - server_t0) * 1000}
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        result["/login"] = _timed(opener, f"{base}/login")
+        result["/login 2nd"] = _timed(opener, f"{base}/login")
+        data = urllib.parse.urlencode({"login_id": "loaduser", "password": "password1"}).encode()
+        opener.open(f"{base}/login", data=data, timeout=60).read()  # → /trips（ここでは数えない）
+        for step in STEPS[1:]:
+            url = base + step.format(trip_id=env["BENCH_TRIP_ID"])
+            result[step] = _timed(opener, url)
+            result[f"{step} 2nd"] = _timed(opener, url)
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+
+def prepare(tree: Path, precompile: bool) -> dict:
+    tmp = Path(tempfile.mkdtemp())
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp / 'cold.db'}", "SESSION_BACKEND": "memory",
+           "PASSWORD_ROUNDS": "10", "PAGE_CACHE": "off", "TEMPLATE_CACHE_DIR": str(tmp / "template_cache")}
+    out = subprocess.run([sys.executable, "-c", SEED], cwd=tree, env=env, check=True,
+                         capture_output=True, text=True).stdout.split()
+    env["BENCH_TRIP_ID"] = out[0]
+    if precompile:
+        subprocess.run([sys.executable, "-m", "app.templating"], cwd=tree, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+    return env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--before", help="比較対象の版（例: このコミットの親）")
+    ap.add_argument("--runs", type=int, default=3, help="モードごとの起動回数（中央値を出す）")
+    ap.add_argument("--port", type=int, default=8795)
+    args = ap.parse_args()
+
+    modes = [("before", export_tree(args.before), False)] if args.before else []
+    modes += [("cold", ROOT, False), ("precompiled", ROOT, True)]
+    cols = ["startup", *(c for s in STEPS for c in (s, f"{s} 2nd"))]
+    print(f"{'mode':<13}" + "".join(f"{c.replace('{trip_id}', 'N'):>17}" for c in cols) + "   (ms, median)")
+    for label, tree, precompile in modes:
+        runs = []
+        for i in range(args.runs):
+            env = prepare(tree, precompile)  # 起動ごとに新しい DB と空のキャッシュディレクトリ
+            runs.append(run_once(tree, env, args.port + i))
+        print(f"{label:<13}" + "".join(f"{statistics.median(r[c] for r in runs):>17.1f}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_compression.py
+# 圧縮レベルごとの「転送量」と「CPU 時間」の比較。
+# 一時 DB に項目の多い旅程を作り、TestClient で実際の trip_detail.html と items.json を取得して、
+# gzip（と brotli があれば br）の各レベルで 1 回で圧縮した場合と、4 KiB ごとに流した場合（ミドルウェアと同じ
+# SYNC_FLUSH 区切り）のサイズ・圧縮時間・回線速度ごとの転送時間を並べる。
+#   python scripts/bench_compression.py [--items 300] [--kbps 1600,10000] [--repeat 50]
+
+import argparse, os, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # テンプレートの相対パス用
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'compression.db'}"
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ["PAGE_CACHE"] = "off"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.compression import BrotliEncoder, GzipEncoder, brotli  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Item, SORT_GAP, Trip, User  # noqa: E402
+from app.services.passwords import hash_password_sync  # noqa: E402
+
+NOTE = "旅館で晩ご飯。温泉街を散策し、お土産やご当地グルメを楽しめます（{n}）"
+CHUNK = 4096
+
+
+def fetch_pages(items: int) -> dict[str, bytes]:
+    with TestClient(app) as client:
+        with SessionLocal() as s:
+            u = User(login_id="compress", login_id_norm="compress", password_hash=hash_password_sync("password1"))
+            s.add(u); s.flush()
+            t = Trip(user_id=u.id, title="圧縮ベンチ", description="説明" * 50, sort_order=SORT_GAP)
+            s.add(t); s.flush()
+            s.add_all(Item(trip_id=t.id, title=f"項目 {i}", time="10:00", note=NOTE.format(n=i),
+                           sort_order=(i + 1) * SORT_GAP) for i in range(items))
+            s.commit()
+            trip_id = t.id
+        client.post("/login", data={"login_id": "compress", "password": "password1"})
+        identity = {"Accept-Encoding": "identity"}
+        return {
+            "trip_detail.html": client.get(f"/trips/{trip_id}", headers=identity).content,
+            "items.json": client.get(f"/trips/{trip_id}/items.json?limit=500", headers=identity).content,
+        }
+
+
+def codecs():
+    yield from ((f"gzip-{lv}", lambda lv=lv: GzipEncoder(lv)) for lv in (1, 4, 6, 9))
+    if brotli is not None:
+        yield from ((f"br-{q}", lambda q=q: BrotliEncoder(q)) for q in (1, 4, 6, 11))
+
+
+def measure(make, body: bytes, streamed: bool, repeat: int) -> tuple[int, float]:
+    # (圧縮後のバイト数, 1 回あたりの ms)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        enc = make()
+        if streamed:
+            out = [enc.chunk(body[i:i + CHUNK]) for i in range(0, len(body), CHUNK)]
+            out.append(enc.finish())
+            size = sum(map(len, out))
+        else:
+            size = len(enc.finish(body))
+    return size, (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=300)
+    ap.add_argument("--kbps", default="1600,10000", help="転送時間を出す回線速度（kbit/s）")
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+    speeds = [int(k) for k in args.kbps.split(",")]
+
+    for name, body in fetch_pages(args.items).items():
+        print(f"\n{name}: {len(body):,} bytes")
+        print(f"{'codec':<9}{'mode':<8}{'bytes':>9}{'ratio':>7}{'cpu ms':>8}"
+              + "".join(f"{f'@{k}k ms':>11}" for k in speeds))
+
+        def row(label, mode, size, cpu):
+            wire = "".join(f"{size * 8 / k:>11.1f}" for k in speeds)  # bytes*8 / (kbit/s) = ms
+            print(f"{label:<9}{mode:<8}{size:>9,}{size / len(body):>7.2f}{cpu:>8.2f}{wire}")
+
+        row("identity", "-", len(body), 0.0)
+        for label, make in codecs():
+            for streamed in (False, True):
+                size, cpu = measure(make, body, streamed, args.repeat)
+                row(label, "stream" if streamed else "whole", size, cpu)
+    if brotli is None:
+        print("\n(brotli が無いので gzip のみ: pip install brotli)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_i18n.py
+# i18n マイクロベンチ：従来の get_L（毎回 dict を作り直す）と
+# import 時に構築済みのカタログを返す現行 get_L を比較する。
+#   python scripts/bench_i18n.py [--n 20000]
+
+import argparse, sys, timeit, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.i18n import STRINGS, LANGS, get_L  # noqa: E402
+
+
+def legacy_get_L(lang: str):
+    # 旧実装そのまま（比較用）
+    return {k: (v.get(lang) or v.get("ja") or k) for k, v in STRINGS.items()}
+
+
+def measure(fn, n: int):
+    langs = sorted(LANGS)
+
+    def run():
+        for i in range(n):
+            fn(langs[i % len(langs)])
+
+    # 時間（最良値）
+    best = min(timeit.repeat(run, number=1, repeat=5))
+
+    # 割り当て（呼び出し中に確保されたバイト数の累計）
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [fn(langs[i % len(langs)]) for i in range(1000)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(s.size_diff for s in after.compare_to(before, "filename") if s.size_diff > 0)
+    del keep
+    return best / n * 1e9, allocated / 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    args = ap.parse_args()
+
+    print(f"keys={len(STRINGS)} langs={len(LANGS)} calls={args.n}")
+    print(f"{'impl':<10}{'ns/call':>12}{'bytes/call':>14}")
+    for name, fn in (("legacy", legacy_get_L), ("catalog", get_L)):
+        ns, b = measure(fn, args.n)
+        print(f"{name:<10}{ns:>12.0f}{b:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
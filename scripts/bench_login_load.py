@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_login_load.py
+# ログイン集中時の負荷ベンチ。uvicorn を別プロセスで起動し、
+# ログインを並列で叩き続けながら /trips の応答時間（p50 / p99）を測る。
+# PASSWORD_EXECUTOR ごと（shared＝旧来の共有スレッドプール / thread / process）に比較する。
+#   python scripts/bench_login_load.py [--modes shared,thread,process] [--logins 16] [--seconds 10]
+
+import argparse, os, statistics, subprocess, sys, tempfile, threading, time
+import http.cookiejar, urllib.error, urllib.parse, urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *a, **kw):
+        return None
+
+
+def _client(follow: bool = True):
+    handlers = [urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())]
+    if not follow:
+        handlers.append(_NoRedirect())
+    return urllib.request.build_opener(*handlers)
+
+
+def _login(opener, base: str) -> int:
+    data = urllib.parse.urlencode({"login_id": "benchuser", "password": "password1"}).encode()
+    try:
+        return opener.open(f"{base}/login", data=data, timeout=30).status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def seed(db_url: str) -> None:
+    # 子プロセスで作る（このプロセスに app.db のエンジンを残さない）
+    code = (
+        "from app.db import engine, Base, SessionLocal\n"
+        "from app.models import User\n"
+        "from app.routers.auth import seed_template_for_user\n"
+        "from app.services.passwords import hash_password_sync\n"
+        "Base.metadata.create_all(engine)\n"
+        "with SessionLocal() as s:\n"
+        "    u = User(login_id='benchuser', login_id_norm='benchuser', password_hash=hash_password_sync('password1'))\n"
+        "    s.add(u); s.flush(); seed_template_for_user(s, u); s.commit()\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env={**os.environ, "DATABASE_URL": db_url}, check=True)
+
+
+def wait_ready(base: str, timeout: float = 30) -> None:
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            urllib.request.urlopen(f"{base}/login", timeout=1)
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def probe(opener, base: str, seconds: float) -> list[float]:
+    lat = []
+    end = time.time() + seconds
+    while time.time() < end:
+        t0 = time.perf_counter()
+        opener.open(f"{base}/trips", timeout=60).read()
+        lat.append((time.perf_counter() - t0) * 1000)
+    return lat
+
+
+def pct(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+def run_mode(mode: str, port: int, logins: int, seconds: float) -> dict:
+    tmp = Path(tempfile.mkdtemp())
+    db_url = f"sqlite:///{tmp / 'bench.db'}"
+    seed(db_url)
+    env = {**os.environ, "DATABASE_URL": db_url, "PASSWORD_EXECUTOR": mode, "SESSION_DB": str(tmp / "sessions.db")}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base)
+        page = _client()
+        _login(page, base)
+        idle = probe(page, base, min(3.0, seconds))
+
+        stop = threading.Event()
+        counts = {"ok": 0, "503": 0}
+
+        def hammer():
+            c = _client(follow=False)
+            while not stop.is_set():
+                key = {303: "ok", 503: "503"}.get(_login(c, base), "other")
+                counts[key] = counts.get(key, 0) + 1
+
+        threads = [threading.Thread(target=hammer, daemon=True) for _ in range(logins)]
+        for t in threads:
+            t.start()
+        time.sleep(1)  # 立ち上がりを待つ
+        busy = probe(page, base, seconds)
+        stop.set()
+        for t in threads:
+            t.join(timeout=60)
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "mode": mode,
+        "idle_p50": statistics.median(idle), "idle_p99": pct(idle, 0.99),
+        "busy_p50": statistics.median(busy), "busy_p99": pct(busy, 0.99),
+        "logins_per_s": counts["ok"] / (seconds + 1), "shed": counts["503"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modes", default="shared,thread,process")
+    ap.add_argument("--logins", type=int, default=16, help="並列ログインのクライアント数")
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+
+    print(f"{'mode':<9}{'idle p50':>10}{'idle p99':>10}{'busy p50':>10}{'busy p99':>10}{'login/s':>9}{'503':>6}")
+    for i, mode in enumerate(args.modes.split(",")):
+        r = run_mode(mode, args.port + i, args.logins, args.seconds)
+        print(f"{r['mode']:<9}{r['idle_p50']:>10.1f}{r['idle_p99']:>10.1f}{r['busy_p50']:>10.1f}"
+              f"{r['busy_p99']:>10.1f}{r['logins_per_s']:>9.1f}{r['shed']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_mail.py
+# メール送信キューのスループット（msgs/sec）を測る。
+# ローカルに最小限の SMTP サーバ（aiosmtpd 相当の受け側）を立て、
+# 接続確立（TLS＋認証の代わり）とコマンド往復に人工的な遅延を入れて比較する。
+#   per-message : 旧実装と同じく 1 通ごとに接続して送る
+#   queue xN    : services.mailer のキュー（常時接続 N 本）
+#   python scripts/bench_mail.py [--messages 200] [--connect-ms 80] [--rtt-ms 2] [--pools 1,2,4]
+#   python scripts/bench_mail.py --check   # 一時エラーの再送とデッドレター、想定外の例外や書けないデッドレターの
+#                                          # ファイルでもワーカーが止まらないことを確認（失敗で終了コード 1）
+
+import argparse, asyncio, json, smtplib, sys, tempfile, threading, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services import mailer  # noqa: E402
+
+
+class SinkServer:
+    # 受けたメールを数えるだけの SMTP サーバ。reject(rcpt) が返すコードで失敗も再現する
+    def __init__(self, connect_ms: float = 0, rtt_ms: float = 0, reject=None):
+        self.connect_s, self.rtt_s = connect_ms / 1000, rtt_ms / 1000
+        self.reject = reject or (lambda rcpt: None)
+        self.received: list[str] = []
+        self.connections = 0
+        self.loop = asyncio.new_event_loop()
+        self.port = 0
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.connect_s)
+        writer.write(b"220 sink ESMTP\r\n")
+        rcpts: list[str] = []
+        try:
+            while line := await reader.readline():
+                cmd = line.decode(errors="replace").strip()
+                verb = cmd[:4].upper()
+                await asyncio.sleep(self.rtt_s)
+                if verb == "EHLO":
+                    writer.write(b"250-sink\r\n250 8BITMIME\r\n")
+                elif verb == "RCPT":
+                    rcpt = cmd.split(":", 1)[1].strip(" <>")
+                    code = self.reject(rcpt)
+                    if code:
+                        writer.write(f"{code} rejected\r\n".encode())
+                    else:
+                        rcpts.append(rcpt)
+                        writer.write(b"250 ok\r\n")
+                elif verb == "DATA":
+                    writer.write(b"354 go ahead\r\n")
+                    while (await reader.readline()) != b".\r\n":
+                        pass
+                    self.received += rcpts
+                    rcpts = []
+                    writer.write(b"250 queued\r\n")
+                elif verb == "RSET":
+                    rcpts = []
+                    writer.write(b"250 ok\r\n")
+                elif verb == "QUIT":
+                    writer.write(b"221 bye\r\n")
+                    break
+                else:  # HELO / MAIL / NOOP
+                    writer.write(b"250 ok\r\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def start(self) -> "SinkServer":
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            server = self.loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return self
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def bench_per_message(sink: SinkServer, n: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        with smtplib.SMTP("127.0.0.1", sink.port) as s:
+            s.send_message(mailer.build_message(f"u{i}@example.com", "bench", "body"))
+    return time.perf_counter() - t0
+
+
+def bench_queue(sink: SinkServer, n: int, pool: int) -> float:
+    q = mailer.MailQueue(host="127.0.0.1", port=sink.port, user=None, starttls=False, pool_size=pool)
+
+    async def run():
+        await q.start()
+        t0 = time.perf_counter()
+        for i in range(n):
+            q.enqueue(f"u{i}@example.com", "bench", "body")
+        await q.join()
+        spent = time.perf_counter() - t0
+        await q.stop()
+        return spent
+
+    return asyncio.run(run())
+
+
+def check() -> int:
+    # temp@ は 2 回 451（一時エラー）→ 3 回目で成功、bad@ は 550（恒久エラー）→ デッドレター
+    attempts: dict[str, int] = {}
+
+    def reject(rcpt):
+        attempts[rcpt] = attempts.get(rcpt, 0) + 1
+        if rcpt == "temp@example.com" and attempts[rcpt] <= 2:
+            return 451
+        if rcpt == "bad@example.com":
+            return 550
+        return None
+
+    sink = SinkServer(reject=reject).start()
+    dead = Path(tempfile.mkdtemp()) / "dead.jsonl"
+    q = mailer.MailQueue(host="127.0.0.1", port=sink.port, user=None, starttls=False,
+                         pool_size=2, backoff=0.05, max_attempts=5, dead_letter=str(dead))
+
+    async def run():
+        await q.start()
+        for to in ("ok@example.com", "temp@example.com", "bad@example.com"):
+            q.enqueue(to, "check", "body")
+        await asyncio.wait_for(q.join(), 10)
+        await q.stop()
+
+    asyncio.run(run())
+    sink.stop()
+    dead_rows = [json.loads(l) for l in dead.read_text(encoding="utf-8").splitlines()] if dead.exists() else []
+    results = {
+        "delivered ok@ and temp@": sorted(sink.received) == ["ok@example.com", "temp@example.com"],
+        "temp@ retried twice": attempts.get("temp@example.com") == 3,
+        "bad@ dead-lettered once": [r["to"] for r in dead_rows] == ["bad@example.com"] and attempts.get("bad@example.com") == 1,
+    }
+    results.update(check_faults())
+    for name, ok in results.items():
+        print(f"[{'ok' if ok else 'NG'}] {name}")
+    return 0 if all(results.values()) else 1
+
+
+def check_faults() -> dict[str, bool]:
+    # ワーカー 1 本で：最初のバッチは _send_batch が想定外の例外、デッドレターのファイルは書けない場所
+    sink = SinkServer(reject=lambda rcpt: 550 if rcpt == "bad@example.com" else None).start()
+    q = mailer.MailQueue(host="127.0.0.1", port=sink.port, user=None, starttls=False, pool_size=1, batch=1,
+                         backoff=0.05, max_attempts=3, dead_letter=str(Path(tempfile.mkdtemp()) / "no" / "dead.jsonl"))
+    send_batch, calls = q._send_batch, []
+
+    def flaky(conn, batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("unexpected")
+        return send_batch(conn, batch)
+
+    q._send_batch = flaky
+
+    async def run():
+        await q.start()
+        for to in ("first@example.com", "bad@example.com", "after@example.com"):
+            q.enqueue(to, "check", "body")
+        try:
+            await asyncio.wait_for(q.join(), 10)
+            joined = True
+        except asyncio.TimeoutError:
+            joined = False
+        alive = not q._workers[0].done()
+        await q.stop()
+        return joined, alive
+
+    joined, alive = asyncio.run(run())
+    sink.stop()
+    return {
+        "join returns after an unexpected exception and an unwritable dead-letter file": joined,
+        "the worker survives both": alive,
+        "the failed batch is retried and later mail still goes out":
+            sorted(sink.received) == ["after@example.com", "first@example.com"],
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=200)
+    ap.add_argument("--connect-ms", type=float, default=80, help="接続ごとの遅延（TLS＋認証の代わり）")
+    ap.add_argument("--rtt-ms", type=float, default=2, help="SMTP コマンド 1 往復の遅延")
+    ap.add_argument("--pools", default="1,2,4")
+    ap.add_argument("--check", action="store_true")
+    args = ap.parse_args()
+    if args.check:
+        return check()
+
+    sink = SinkServer(args.connect_ms, args.rtt_ms).start()
+    n = args.messages
+    print(f"{'mode':<14}{'seconds':>9}{'msgs/s':>9}{'conns':>7}")
+    spent = bench_per_message(sink, n)
+    print(f"{'per-message':<14}{spent:>9.2f}{n / spent:>9.1f}{sink.connections:>7}")
+    for pool in map(int, args.pools.split(",")):
+        before = sink.connections
+        spent = bench_queue(sink, n, pool)
+        print(f"{f'queue x{pool}':<14}{spent:>9.2f}{n / spent:>9.1f}{sink.connections - before:>7}")
+    sink.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_page_cache.py
+# 描画済みページキャッシュの確認とベンチ。TestClient で一時 DB に対して
+#   1) 更新（項目追加・編集・削除・並べ替え・旅程編集）の直後に古いページが返らないこと
+#   2) ヒット時に SQL が 0 文であること
+# を確かめ（失敗で終了コード 1）、バックエンドごとに /trips と /trips/{id} の 1 リクエストあたりの時間を測る。
+#   python scripts/bench_page_cache.py [--requests 500] [--backends off,memory,disk]
+
+import argparse, os, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+TMP = Path(tempfile.mkdtemp())
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # テンプレートの相対パス用
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP / 'page_cache_bench.db'}"
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ["PAGE_CACHE_DB"] = str(TMP / "page_cache.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.db import SessionLocal, async_read_engine, engine, read_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import User  # noqa: E402
+from app.routers.auth import seed_template_for_user  # noqa: E402
+from app.services import page_cache  # noqa: E402
+from app.services.passwords import hash_password_sync  # noqa: E402
+
+statements: list[str] = []
+
+
+def _record(conn, cursor, statement, *_a):
+    statements.append(statement)
+
+
+def check(client, trip_id: int, item_ids: list[int]) -> int:
+    # 各更新のあとにページへ反映されているか（＝版が進んだか）を見る
+    failed = 0
+
+    def expect(label, cond):
+        nonlocal failed
+        failed += not cond
+        print(f"[{'ok' if cond else 'NG'}] {label}")
+
+    detail, listing = f"/trips/{trip_id}", "/trips"
+    client.get(detail); client.get(listing)
+    statements.clear()
+    client.get(detail); client.get(listing)
+    expect("hit: no SQL", not statements)
+
+    client.post(f"{detail}/items", data={"title": "キャッシュ確認A"})
+    expect("create_item", "キャッシュ確認A" in client.get(detail).text)
+    client.post(f"{detail}/items/{item_ids[0]}/edit", data={"title": "キャッシュ確認B"})
+    expect("edit_item", "キャッシュ確認B" in client.get(detail).text)
+    client.post(f"{detail}/items/{item_ids[0]}/delete")
+    expect("delete_item", "キャッシュ確認B" not in client.get(detail).text)
+
+    before = client.get(detail).text
+    rest = item_ids[1:]
+    client.post(f"{detail}/items/reorder", json={"ids": rest[::-1]})
+    expect("reorder_items", client.get(detail).text != before)
+
+    client.post(f"{detail}/edit", data={"title": "キャッシュ確認C"})
+    expect("edit_trip (detail)", "キャッシュ確認C" in client.get(detail).text)
+    expect("edit_trip (list)", "キャッシュ確認C" in client.get(listing).text)
+
+    client.post("/trips", data={"title": "キャッシュ確認D"})
+    expect("create_trip (list)", "キャッシュ確認D" in client.get(listing).text)
+    return failed
+
+
+def login_seeded(client, login_id: str) -> tuple[int, list[int]]:
+    # テンプレート旅程つきのユーザーを作ってログイン。(trip_id, item id の一覧) を返す
+    with SessionLocal() as s:
+        u = User(login_id=login_id, login_id_norm=login_id, password_hash=hash_password_sync("password1"))
+        s.add(u); s.flush()
+        seed_template_for_user(s, u)
+        s.commit()
+        trip_id, item_ids = u.trips[0].id, [i.id for i in u.trips[0].items]
+    client.post("/login", data={"login_id": login_id, "password": "password1"})
+    return trip_id, item_ids
+
+
+def bench(client, path: str, n: int) -> float:
+    client.get(path)  # 温め（キャッシュありならここで乗る）
+    t0 = time.perf_counter()
+    for _ in range(n):
+        client.get(path)
+    return (time.perf_counter() - t0) / n * 1000
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--backends", default="off,memory,disk")
+    args = ap.parse_args()
+
+    for eng in {engine, read_engine, async_read_engine.sync_engine}:
+        event.listen(eng, "before_cursor_execute", _record)
+
+    failed = 0
+    with TestClient(app) as client:
+        for kind in ("memory", "disk"):
+            page_cache.backend = page_cache.build_backend(kind)
+            print(f"-- check ({kind})")
+            failed += check(client, *login_seeded(client, f"check_{kind}"))
+
+        trip_id, _ = login_seeded(client, "bench")
+
+        print(f"{'backend':<9}{'/trips ms':>11}{'/trips/{id} ms':>16}")
+        for kind in args.backends.split(","):
+            page_cache.backend = page_cache.build_backend(kind)
+            lst = bench(client, "/trips", args.requests)
+            det = bench(client, f"/trips/{trip_id}", args.requests)
+            print(f"{kind:<9}{lst:>11.2f}{det:>16.2f}")
+    hits, misses = page_cache.HITS.value, page_cache.MISSES.value
+    print(f"hits={hits} misses={misses}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_read_write_split.py
+# 読み書き分離のベンチ。書き手（並べ替え／移動）を常に走らせながら、
+# 読み手スレッド数を 1 → 2 → 4 → 8 と増やして旅程詳細の読み取りスループットを測る。
+#   shared : 読み書き共用のエンジン 1 つ（分離前）
+#   split  : db.make_engines の読み取り専用エンジン + 単一書き込み接続
+#   python scripts/bench_read_write_split.py [--workers 1,2,4,8] [--writers 2] [--seconds 5]
+
+import argparse, random, sys, tempfile, threading, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db import make_engine, make_engines  # noqa: E402
+from app.services import ordering, pages  # noqa: E402
+from stress_sqlite import seed  # noqa: E402
+
+
+def engines(mode: str, url: str):
+    if mode == "split":
+        return make_engines(url)
+    shared = make_engine(url)
+    return shared, shared
+
+
+def run(mode: str, workers: int, writers: int, seconds: float, users: int, items: int) -> dict:
+    url = f"sqlite:///{Path(tempfile.mkdtemp()) / 'split.db'}"
+    write_engine, read_engine = engines(mode, url)
+    Write = sessionmaker(bind=write_engine, autoflush=False, future=True)
+    Read = sessionmaker(bind=read_engine, autoflush=False, future=True)
+    targets, item_ids = seed(Write, users, items)
+
+    stop = threading.Event()
+    stats = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def count(key):
+        with lock:
+            stats[key] += 1
+
+    def reader():
+        while not stop.is_set():
+            uid, tid = random.choice(targets)
+            with Read() as s:
+                try:
+                    pages.trip_detail(s, uid, tid)
+                    count("reads")
+                except OperationalError:
+                    count("errors")
+
+    def writer():
+        while not stop.is_set():
+            uid, tid = random.choice(targets)
+            ids = item_ids[tid]
+            with Write() as s:
+                try:
+                    if random.random() < 0.5:
+                        ordering.reorder_items(s, uid, tid, random.sample(ids, len(ids)))
+                    else:
+                        a, b = random.sample(ids, 2)
+                        ordering.move_item(s, uid, tid, a, b, None)
+                    s.commit()
+                    count("writes")
+                except OperationalError:
+                    s.rollback()
+                    count("errors")
+
+    threads = [threading.Thread(target=reader) for _ in range(workers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    spent = time.perf_counter() - t0
+    for e in {write_engine, read_engine}:
+        e.dispose()
+    return {**stats, "reads_s": stats["reads"] / spent, "writes_s": stats["writes"] / spent}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modes", default="shared,split")
+    ap.add_argument("--workers", default="1,2,4,8", help="読み手スレッド数")
+    ap.add_argument("--writers", type=int, default=2)
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--items", type=int, default=200)
+    args = ap.parse_args()
+
+    print(f"{'mode':<8}{'workers':>8}{'reads/s':>9}{'writes/s':>10}{'errors':>8}")
+    for mode in args.modes.split(","):
+        for n in map(int, args.workers.split(",")):
+            r = run(mode, n, args.writers, args.seconds, args.users, args.items)
+            print(f"{mode:<8}{n:>8}{r['reads_s']:>9.1f}{r['writes_s']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
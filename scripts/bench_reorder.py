@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_reorder.py
+# 並べ替えベンチ：旧実装（id ごとに session.get → N+1）と
+# services/ordering の一括 UPDATE を、10 / 100 / 1000 件でクエリ数・時間比較する。
+#   python scripts/bench_reorder.py [--sizes 10,100,1000] [--repeat 5]
+
+import argparse, random, sys, tempfile, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import create_engine, event, select  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from app.db import Base  # noqa: E402
+from app.models import User, Trip, Item  # noqa: E402
+from app.services import ordering  # noqa: E402
+
+
+def legacy_reorder_items(session: Session, user_id: int, trip_id: int, ids: list[int]) -> None:
+    # 旧 routers/trips.py の実装そのまま（比較用）
+    my_ids = set([i for i in session.execute(
+        select(Item.id).join(Trip, Item.trip_id == Trip.id).where(Trip.user_id == user_id, Item.trip_id == trip_id)
+    ).scalars().all()])
+    order = 0
+    for iid in ids:
+        if iid in my_ids:
+            it = session.get(Item, iid)
+            it.sort_order = order
+            order += 1
+    session.commit()
+
+
+def bulk_reorder_items(session: Session, user_id: int, trip_id: int, ids: list[int]) -> None:
+    ordering.reorder_items(session, user_id, trip_id, ids)
+    session.commit()
+
+
+def setup(n: int):
+    path = Path(tempfile.mkdtemp()) / "bench.db"
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, future=True)
+    with SessionLocal() as s:
+        u = User(login_id="bench", login_id_norm="bench", password_hash="x")
+        s.add(u); s.flush()
+        t = Trip(user_id=u.id, title="bench", sort_order=0)
+        s.add(t); s.flush()
+        s.add_all([Item(trip_id=t.id, title=f"item {i}", sort_order=i) for i in range(n)])
+        s.commit()
+        ids = list(s.execute(select(Item.id).where(Item.trip_id == t.id)).scalars())
+        return engine, SessionLocal, u.id, t.id, ids
+
+
+def run(fn, n: int, repeat: int):
+    engine, SessionLocal, uid, tid, ids = setup(n)
+    counter = {"n": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(*_a, **_kw):
+        counter["n"] += 1
+
+    times, queries = [], []
+    rnd = random.Random(0)
+    for _ in range(repeat):
+        order = ids[:]
+        rnd.shuffle(order)
+        counter["n"] = 0
+        with SessionLocal() as s:
+            t0 = time.perf_counter()
+            fn(s, uid, tid, order)
+            times.append(time.perf_counter() - t0)
+        queries.append(counter["n"])
+    engine.dispose()
+    return max(queries), min(times) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,100,1000")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'items':>6}  {'impl':<8}{'queries':>9}{'ms':>10}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        for name, fn in (("legacy", legacy_reorder_items), ("bulk", bulk_reorder_items)):
+            q, ms = run(fn, n, args.repeat)
+            print(f"{n:>6}  {name:<8}{q:>9}{ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_search.py
+# 全文検索（services.search）の計測。一時 DB に項目を N 件（既定 100 万件）入れて比べる。
+#   - 索引の作成：トリガー無しで一括投入 → rebuild の時間と、索引の分だけ増えたファイルサイズ
+#   - 書き込みの上乗せ：トリガーあり／なしで項目を追加したときの 1 件あたりの時間
+#   - 検索：同じ語を FTS5（trigram + bm25）と LIKE のフォールバックで引いたときの時間（1 ユーザー分）
+#     件数が一致することも確かめる（FTS は上位 limit 件なので、件数は limit を大きくして比べる）
+#     3 文字未満の語だけの検索は search() が LIKE に回すので、両列ともほぼ同じになる
+#     LIKE は順位を付けず先頭 limit 件で止まるので、多くの行に一致するありふれた語では FTS（全一致を順位付け）より速い。
+#     FTS の時間は一致した件数に比例し、LIKE の時間はユーザーの行数に比例する（--users を減らすと差が見える）
+#   python scripts/bench_search.py [--items 1000000] [--users 100] [--repeat 5]
+
+import argparse, os, random, statistics, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'search.db'}"
+
+from app.db import Base, SessionLocal, engine  # noqa: E402
+from app import models  # noqa: E402,F401
+from app.migrations import run_migrations  # noqa: E402
+from app.services import search  # noqa: E402
+
+PLACES = ["京都", "大阪", "札幌", "那覇", "金沢", "箱根", "奈良", "福岡", "仙台", "長崎", "Kyoto", "Osaka",
+          "Sapporo", "Naha", "Kanazawa", "Hakone", "台北", "高雄", "上海", "北京"]
+WORDS = ["清水寺", "金閣寺", "ホテル", "チェックイン", "空港", "新幹線", "ラーメン", "寿司", "温泉", "美術館",
+         "museum", "station", "breakfast", "dinner", "hotel", "airport", "ticket", "夜市", "博物館", "公園"]
+
+QUERIES = [
+    ("3+ 文字 1 語", "金閣寺"),
+    ("3+ 文字 2 語", "ホテル 温泉"),
+    ("英語", "museum"),
+    ("2 文字のみ", "京都"),
+    ("混在", "京都 ラーメン"),
+    ("まれな語", "No.4242"),
+    ("該当なし", "存在しない語"),
+]
+
+
+def text(rnd: random.Random, n: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(n))
+
+
+def load(n_items: int, n_users: int, rnd: random.Random) -> None:
+    # トリガーを外した状態で一括投入（1 ユーザー 10 旅行）
+    trips_per_user = 10
+    items_per_trip = max(1, n_items // (n_users * trips_per_user))
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO users(login_id, login_id_norm, password_hash, email_verified, trips_revision, changes_floor)"
+            " VALUES (?, ?, 'x', 0, 0, 0)", [(f"user{u}", f"user{u}") for u in range(n_users)]
+        )
+        trips = [(u + 1, f"{rnd.choice(PLACES)} {rnd.choice(WORDS)} {t}", text(rnd, 6), t * 1024)
+                 for u in range(n_users) for t in range(trips_per_user)]
+        conn.exec_driver_sql("INSERT INTO trips(user_id, title, description, sort_order, revision)"
+                             " VALUES (?, ?, ?, ?, 0)", trips)
+        batch = []
+        for trip_id in range(1, len(trips) + 1):
+            for k in range(items_per_trip):
+                note = f"{text(rnd, 4)} No.{rnd.randrange(10**5)}"
+                batch.append((trip_id, f"{rnd.choice(PLACES)} {rnd.choice(WORDS)}", note, k * 1024))
+            if len(batch) >= 50_000:
+                conn.exec_driver_sql("INSERT INTO items(trip_id, title, note, sort_order) VALUES (?, ?, ?, ?)", batch)
+                batch = []
+        if batch:
+            conn.exec_driver_sql("INSERT INTO items(trip_id, title, note, sort_order) VALUES (?, ?, ?, ?)", batch)
+
+
+def drop_index() -> None:
+    with engine.begin() as conn:
+        for name in search._TRIGGERS:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {search.FTS_TABLE}")
+
+
+def db_size() -> int:
+    # 使用中のページ分（空きページは除く）
+    with engine.connect() as conn:
+        pages, free, size = (conn.exec_driver_sql(f"PRAGMA {p}").scalar()
+                             for p in ("page_count", "freelist_count", "page_size"))
+    return (pages - free) * size
+
+
+def insert_cost(rnd: random.Random, n: int) -> float:
+    # 項目 n 件を 100 件ずつのトランザクションで追加（1 件あたり µs）
+    rows = [(rnd.randint(1, 10), f"{rnd.choice(PLACES)} 追加", text(rnd, 4), 10**9 + i) for i in range(n)]
+    t0 = time.perf_counter()
+    for i in range(0, n, 100):
+        with engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO items(trip_id, title, note, sort_order) VALUES (?, ?, ?, ?)",
+                                 rows[i:i + 100])
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def timed(fn, repeat: int) -> tuple[float, object]:
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times), result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=1_000_000)
+    ap.add_argument("--users", type=int, default=100)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    rnd = random.Random(1)
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    with engine.connect() as conn:
+        if not search.supported(conn):
+            sys.exit("FTS5（trigram）が使えない SQLite です")
+    drop_index()
+
+    t0 = time.perf_counter()
+    load(args.items, args.users, rnd)
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT count(*) FROM items").scalar()
+    print(f"load: {rows} items / {args.users} users in {time.perf_counter() - t0:.1f} s")
+    base = db_size()
+    plain = insert_cost(rnd, 2000)
+
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        indexed = search.rebuild(conn)
+    print(f"rebuild: {indexed} rows in {time.perf_counter() - t0:.1f} s")
+    size = db_size()
+    print(f"db size: {base / 2**20:.1f} MiB -> {size / 2**20:.1f} MiB (index +{(size - base) / 2**20:.1f} MiB)")
+    with_triggers = insert_cost(rnd, 2000)
+    print(f"insert item: {plain:.1f} µs without triggers, {with_triggers:.1f} µs with triggers")
+    with engine.connect() as conn:
+        indexed, rows = search.counts(conn)
+    print(f"index rows {indexed} / table rows {rows}: {'ok' if indexed == rows else 'MISMATCH'}")
+
+    user_id = 1
+    print(f"\n{'query':<14} {'fts ms':>8} {'like ms':>8} {'hits':>6}  check")
+    with SessionLocal() as s:
+        for label, q in QUERIES:
+            fts_ms, hits = timed(lambda: search.search(s, user_id, q, use_fts=True), args.repeat)
+            like_ms, _ = timed(lambda: search.search(s, user_id, q, use_fts=False), args.repeat)
+            every_fts = {(h.kind, h.id) for h in search.search(s, user_id, q, limit=10**7, use_fts=True)}
+            every_like = {(h.kind, h.id) for h in search.search(s, user_id, q, limit=10**7, use_fts=False)}
+            ok = "ok" if every_fts == every_like else f"NG ({len(every_fts)} vs {len(every_like)})"
+            print(f"{label:<14} {fts_ms:8.2f} {like_ms:8.2f} {len(every_fts):6d}  {ok}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_streaming.py
+# 全件表示（?all=1）のストリーミング描画と一括描画の比較。
+# 旅行 --rows 件のユーザーと、項目 --rows 件の旅程を 1 つ作り、uvicorn を 1 計測ごとに新しく起動して
+# TEMPLATE_STREAMING=1 / 0 で /trips?all=1 と /trips/{id}?all=1 を 1 回取得する。
+#   ttfb  : リクエスト送信から本文の最初のバイトまで
+#   total : 本文の最後まで
+#   peak  : そのリクエストの間に増えたサーバーの最大 RSS（/proc/<pid>/status の VmHWM − 直前の VmRSS）
+# 圧縮の影響を除くため Accept-Encoding: identity、ページキャッシュは off。
+#   python scripts/bench_streaming.py [--rows 5000] [--runs 3]
+
+import argparse, http.client, os, statistics, subprocess, sys, tempfile, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_async_load import ROOT, login, wait_ready  # noqa: E402
+
+SEED = (
+    "import sys\n"
+    "from app.db import engine, Base, SessionLocal\n"
+    "from app.models import Item, SORT_GAP, Trip, User\n"
+    "from app.services.passwords import hash_password_sync\n"
+    "n = int(sys.argv[1])\n"
+    "Base.metadata.create_all(engine)\n"
+    "with SessionLocal() as s:\n"
+    "    u = User(login_id='loaduser', login_id_norm='loaduser', password_hash=hash_password_sync('password1'))\n"
+    "    s.add(u); s.flush()\n"
+    "    s.add_all(Trip(user_id=u.id, title=f'旅行 {i}', description='温泉街を散策' * 10,\n"
+    "                   sort_order=(i + 2) * SORT_GAP) for i in range(n))\n"
+    "    t = Trip(user_id=u.id, title='長い旅程', sort_order=SORT_GAP); s.add(t); s.flush()\n"
+    "    s.add_all(Item(trip_id=t.id, title=f'項目 {i}', time='10:00', note='旅館で晩ご飯（{}）'.format(i),\n"
+    "                   sort_order=(i + 1) * SORT_GAP) for i in range(n))\n"
+    "    s.commit()\n"
+    "    print(t.id)\n"
+)
+
+
+def _status_kb(pid: int, field: str) -> int:
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith(field + ":"):
+            return int(line.split()[1])
+    return 0
+
+
+def _reset_hwm(pid: int) -> None:
+    # VmHWM を現在の RSS に戻す（Linux 4.0+。権限が無ければ差分が大きめに出るだけ）
+    try:
+        Path(f"/proc/{pid}/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def fetch(port: int, path: str, cookie: str) -> tuple[float, float, int]:
+    # (ttfb ms, total ms, 本文バイト数)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    t0 = time.perf_counter()
+    conn.request("GET", path, headers={"Cookie": f"session={cookie}", "Accept-Encoding": "identity"})
+    resp = conn.getresponse()
+    first = resp.read1(65536)
+    ttfb = time.perf_counter() - t0
+    size = len(first) + len(resp.read())
+    total = time.perf_counter() - t0
+    conn.close()
+    assert resp.status == 200, resp.status
+    return ttfb * 1000, total * 1000, size
+
+
+def run_once(env: dict, port: int, path: str) -> dict:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base)
+        cookie = login(base)
+        fetch(port, "/trips", cookie)  # テンプレートと接続を温める（先頭ページだけ）
+        _reset_hwm(server.pid)
+        rss = _status_kb(server.pid, "VmRSS")
+        ttfb, total, size = fetch(port, path, cookie)
+        peak = _status_kb(server.pid, "VmHWM") - rss
+    finally:
+        server.terminate()
+        server.wait()
+    return {"ttfb": ttfb, "total": total, "bytes": size, "peak": peak / 1024}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000, help="旅行の件数と、1 つの旅程の項目数")
+    ap.add_argument("--runs", type=int, default=3, help="組み合わせごとの起動回数（中央値を出す）")
+    ap.add_argument("--port", type=int, default=8805)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp())
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp / 'streaming.db'}", "SESSION_BACKEND": "memory",
+           "PASSWORD_ROUNDS": "10", "PAGE_CACHE": "off", "TEMPLATE_CACHE_DIR": str(tmp / "template_cache")}
+    trip_id = subprocess.run([sys.executable, "-c", SEED, str(args.rows)], cwd=ROOT, env=env, check=True,
+                             capture_output=True, text=True).stdout.split()[0]
+
+    print(f"{'page':<18}{'mode':<11}{'ttfb ms':>9}{'total ms':>10}{'bytes':>12}{'peak MiB':>10}   (median of {args.runs})")
+    port = args.port
+    for page, path in (("/trips?all=1", "/trips?all=1"), ("/trips/N?all=1", f"/trips/{trip_id}?all=1")):
+        for mode, flag in (("buffered", "0"), ("streaming", "1")):
+            runs = []
+            for _ in range(args.runs):
+                runs.append(run_once({**env, "TEMPLATE_STREAMING": flag}, port, path))
+                port += 1
+            m = {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+            print(f"{page:<18}{mode:<11}{m['ttfb']:>9.1f}{m['total']:>10.1f}{int(m['bytes']):>12,}{m['peak']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_suggest.py
+# 項目タイトルの入力補完（services.suggest）の計測。
+#   1. 1 ユーザーあたりのメモリ：タイトル数ごとに索引を作り、tracemalloc の実測と推定（Titles.nbytes）を並べる
+#   2. 1 打鍵あたりの時間：実在のタイトルを 1 文字ずつ打ったときの suggest() の p50 / p99
+#   3. ルート経由（TestClient、一時 DB）：初回（索引の作成）と 2 回目以降の時間、2 回目以降の SQL 文の数（0 のはず）、
+#      項目の追加・編集・削除が作り直しなしで候補に反映されること
+#   4. 上限：小さい上限の Suggester に作成・追加・削除・破棄をランダムに流し、差分で持っている合計（nbytes）が
+#      各ユーザーの Titles.nbytes の合計と一致し続け、上限を超えたら古い順に捨てられること。
+#      LRU の先頭にいるユーザーが追加を続けても、他のユーザーが捨てられて上限に収まること
+#   python scripts/bench_suggest.py [--sizes 100,1000,10000,50000] [--keys 2000]
+
+import argparse, os, random, statistics, sys, tempfile, time, tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # テンプレートの相対パス用
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'suggest.db'}"
+os.environ.setdefault("SESSION_BACKEND", "memory")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.db import SessionLocal, async_read_engine, engine, read_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import SORT_GAP, Item, Trip, User  # noqa: E402
+from app.services import suggest  # noqa: E402
+from app.services.passwords import hash_password_sync  # noqa: E402
+
+PLACES = ["京都", "大阪", "札幌", "那覇", "金沢", "箱根", "奈良", "福岡", "Kyoto", "Osaka", "Taipei", "台北"]
+KINDS = ["駅", "ホテル", "空港", "ラーメン", "寿司", "温泉", "美術館", "Museum", "Station", "Cafe", "夜市", "公園"]
+
+
+def titles(rnd: random.Random, n: int) -> list[tuple[str, int]]:
+    # 重ならないタイトル n 個と使用回数（多くは 1 回、一部はよく使う）
+    out = {}
+    while len(out) < n:
+        t = f"{rnd.choice(PLACES)} {rnd.choice(KINDS)} {rnd.randrange(10 * n)}"
+        out[t] = 1 if rnd.random() < 0.8 else rnd.randint(2, 30)
+    return list(out.items())
+
+
+def memory(sizes: list[int], rnd: random.Random) -> None:
+    print(f"{'titles':>8} {'measured':>12} {'estimated':>12} {'per title':>10}")
+    for n in sizes:
+        rows = titles(rnd, n)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        index = suggest.build(rows)
+        measured = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        print(f"{n:8d} {measured / 1024:10.1f} KiB {index.nbytes / 1024:10.1f} KiB {measured / n:8.0f} B")
+
+
+def keystrokes(n: int, keys: int, rnd: random.Random) -> None:
+    rows = titles(rnd, n)
+    index = suggest.build(rows)
+    times = []
+    for title, _ in rnd.sample(rows, min(keys, len(rows))):
+        for i in range(1, len(title) + 1):
+            t0 = time.perf_counter()
+            index.suggest(title[:i])
+            times.append((time.perf_counter() - t0) * 1e6)
+    times.sort()
+    print(f"{n} titles, {len(times)} keystrokes: p50 {statistics.median(times):.1f} µs, "
+          f"p99 {times[int(len(times) * 0.99)]:.1f} µs, max {times[-1]:.1f} µs")
+
+
+def route(n: int, rnd: random.Random) -> None:
+    statements = []
+    for eng in {engine, read_engine, async_read_engine.sync_engine}:
+        event.listen(eng, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    with TestClient(app) as c:
+        with SessionLocal() as s:
+            u = User(login_id="suggest", login_id_norm="suggest", password_hash=hash_password_sync("password1"))
+            s.add(u); s.flush()
+            trip = Trip(user_id=u.id, title="候補", sort_order=0)
+            s.add(trip); s.flush()
+            s.add_all(Item(trip_id=trip.id, title=t, sort_order=k * SORT_GAP)
+                      for k, (t, used) in enumerate(titles(rnd, n)) for _ in range(used))
+            s.commit()
+            trip_id = trip.id
+        c.post("/login", data={"login_id": "suggest", "password": "password1"})
+
+        def get(q):
+            t0 = time.perf_counter()
+            r = c.get("/items/suggest.json", params={"q": q})
+            return (time.perf_counter() - t0) * 1000, r.json()["titles"]
+
+        del statements[:]
+        cold, _ = get("京都")
+        cold_sql = len(statements)
+        del statements[:]
+        warm = sorted(get(q)[0] for q in ["京", "京都", "京都 ホ", "kyo", "Kyoto S", "ラーメン", "museum"] * 20)
+        print(f"route ({n} titles): first {cold:.1f} ms ({cold_sql} SQL), "
+              f"then p50 {statistics.median(warm):.2f} ms ({len(statements)} SQL)")
+
+        # 追加・編集・削除が索引に入ること（作り直しなし）
+        builds = suggest.BUILDS.value
+        c.post(f"/trips/{trip_id}/items", data={"title": "伏見稲荷大社 千本鳥居"})
+        ok = get("伏見")[1][:1] == ["伏見稲荷大社 千本鳥居"] and get("千本鳥")[1] == ["伏見稲荷大社 千本鳥居"]
+        with SessionLocal() as s:
+            item_id = s.query(Item.id).filter(Item.title == "伏見稲荷大社 千本鳥居").scalar()
+        c.post(f"/trips/{trip_id}/items/{item_id}/edit", data={"title": "伏見稲荷 朝"})
+        ok = ok and get("伏見")[1] == ["伏見稲荷 朝"]
+        c.post(f"/trips/{trip_id}/items/{item_id}/delete")
+        ok = ok and get("伏見")[1] == []
+        ok = ok and suggest.BUILDS.value == builds
+        print(f"[{'ok' if ok else 'NG'}] create / edit / delete reflected without a rebuild")
+        if not ok:
+            sys.exit(1)
+
+
+def bound(rnd: random.Random, steps: int = 20_000) -> None:
+    rows = titles(rnd, 200)
+    index = suggest.Suggester(max_bytes=8 * suggest.build(rows).nbytes)
+    drift = over = 0
+    for _ in range(steps):
+        user_id, op = rnd.randrange(20), rnd.random()
+        if op < 0.05:
+            index.begin(user_id)
+            index.install(user_id, suggest.build(rnd.sample(rows, rnd.randrange(1, len(rows)))))
+        elif op < 0.6:
+            index.added(user_id, rnd.choice(rows)[0] + rnd.choice(("", " 2", " 朝")))
+        elif op < 0.95:
+            index.removed(user_id, rnd.choice(rows)[0])
+        else:
+            index.forget(user_id)
+        drift += index.nbytes != sum(t.nbytes for t in index._users.values())
+        over += index.nbytes > index.max_bytes and len(index._users) > 1
+    ok = not drift and not over and suggest.EVICTIONS.value > 0
+    print(f"[{'ok' if ok else 'NG'}] running total matches the per-user sum after {steps} updates"
+          f" ({len(index._users)} users, {index.nbytes / 1024:.0f} / {index.max_bytes / 1024:.0f} KiB)")
+    # LRU の先頭（いちばん古い）ユーザーが追加を続ける
+    index = suggest.Suggester(max_bytes=3 * suggest.build(rows).nbytes)
+    for user_id in (1, 2):
+        index.begin(user_id)
+        index.install(user_id, suggest.build(rows))
+    for k in range(2000):
+        index.added(1, f"追加 {k} 番目の項目")
+    head_ok = index.nbytes <= index.max_bytes or list(index._users) == [1]
+    print(f"[{'ok' if head_ok else 'NG'}] a user at the LRU head that keeps adding still evicts the others"
+          f" (users {list(index._users)}, {index.nbytes / 1024:.0f} / {index.max_bytes / 1024:.0f} KiB)")
+    if not ok or not head_ok:
+        sys.exit(1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100,1000,10000,50000")
+    ap.add_argument("--keys", type=int, default=2000, help="打鍵を計る元のタイトル数")
+    args = ap.parse_args()
+    rnd = random.Random(1)
+    sizes = [int(s) for s in args.sizes.split(",")]
+    memory(sizes, rnd)
+    print()
+    for n in sizes:
+        keystrokes(n, args.keys, rnd)
+    print()
+    route(10_000, rnd)
+    bound(rnd)
+    print(f"\ncap: SUGGEST_MAX_BYTES = {suggest.index.max_bytes / 2**20:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# scripts/bench_transfer.py
+# エクスポート／インポート（services.transfer）の計測。一時 DB の 1 ユーザーに項目を N 件（既定 100 万件）入れて、
+#   - エクスポート（CSV / NDJSON、ファイルへ書き出し）
+#   - インポート（書き出した CSV を別のユーザーへ取り込み。検索の索引のトリガーあり／なし）
+#   - 比較用：全件をリストに読んでから書く、ORM で 1 件ずつ add して取り込む（件数は --naive 件）
+# の 1 秒あたりの行数と、Python のメモリのピーク（tracemalloc）を並べる。取り込んだ内容が元と一致することも確かめる。
+# tracemalloc を付けると数倍遅くなるので、時間は付けずに 1 回、ピークは付けてもう 1 回計る（取り込みは間で消す）。
+#   python scripts/bench_transfer.py [--items 1000000] [--naive 50000]
+
+import argparse, os, sys, tempfile, time, tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+TMP = Path(tempfile.mkdtemp())
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP / 'transfer.db'}"
+
+from sqlalchemy import select  # noqa: E402
+
+from app import models  # noqa: E402,F401
+from app.db import Base, ReadSessionLocal, SessionLocal, engine  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.models import SORT_GAP, Item, Trip  # noqa: E402
+from app.services import search, transfer  # noqa: E402
+
+TRIPS = 1000
+
+
+def seed(n_items: int) -> int:
+    with engine.begin() as conn:
+        for u in ("source", "target", "naive"):
+            conn.exec_driver_sql(
+                "INSERT INTO users(login_id, login_id_norm, password_hash, email_verified, trips_revision, changes_floor)"
+                " VALUES (?, ?, 'x', 0, 0, 0)", (u, u))
+        conn.exec_driver_sql("INSERT INTO trips(user_id, title, description, sort_order, revision) VALUES (1, ?, ?, ?, 0)",
+                             [(f"旅行 {t}", "説明", (t + 1) * SORT_GAP) for t in range(TRIPS)])
+        per_trip = n_items // TRIPS
+        for t in range(1, TRIPS + 1):
+            conn.exec_driver_sql(
+                "INSERT INTO items(trip_id, title, date, time, note, sort_order) VALUES (?, ?, ?, ?, ?, ?)",
+                [(t, f"項目 {t}-{k} 京都 清水寺", "2025-05-01", "09:00", "メモ、\"引用\"、改行\nあり", (k + 1) * SORT_GAP)
+                 for k in range(per_trip)])
+    return per_trip * TRIPS
+
+
+def measure(label: str, rows: int, fn, reset=None):
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    if reset:
+        reset()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<34} {rows:>9} rows {elapsed:7.2f} s {rows / elapsed:>10,.0f} rows/s  peak {peak / 2**20:7.1f} MiB")
+    return result
+
+
+def export_to(path: Path, chunks) -> None:
+    with ReadSessionLocal() as session, open(path, "wb") as f:
+        for chunk in chunks(session):
+            f.write(chunk)
+
+
+def export_naive(path: Path) -> None:
+    # 比較用：全行をリストに読んでから 1 つの文字列にして書く
+    with ReadSessionLocal() as session:
+        rows = session.execute(select(*(getattr(Item, f) for f in transfer.ITEM_FIELDS))).all()
+        text = transfer.BOM + ",".join(transfer.ITEM_FIELDS) + "\n" + "".join(
+            ",".join("" if v is None else str(v) for v in r) + "\n" for r in rows)
+    path.write_bytes(text.encode("utf-8"))
+
+
+def import_from(user_id: int, trips_path: Path, items_path: Path) -> dict:
+    with SessionLocal() as session, open(trips_path, "rb") as t, open(items_path, "rb") as i:
+        records = (r for f, kind in ((t, "trip"), (i, "item")) for r in transfer.read_csv(f, kind, f.name))
+        counts = transfer.import_user(session, user_id, records)
+        session.commit()
+    return counts
+
+
+def clear(user_id: int) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM items WHERE trip_id IN (SELECT id FROM trips WHERE user_id = ?)", (user_id,))
+        conn.exec_driver_sql("DELETE FROM trips WHERE user_id = ?", (user_id,))
+
+
+def import_naive(user_id: int, trips_path: Path, items_path: Path, limit: int) -> None:
+    # 比較用：ORM で 1 件ずつ add（trip ごとに flush して id を得る）
+    import csv
+    with SessionLocal() as session:
+        ids = {}
+        with open(trips_path, encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                trip = Trip(user_id=user_id, title=row["title"], sort_order=int(row["sort_order"]))
+                session.add(trip); session.flush()
+                ids[int(row["id"])] = trip.id
+        with open(items_path, encoding="utf-8-sig", newline="") as f:
+            for n, row in enumerate(csv.DictReader(f)):
+                if n >= limit:
+                    break
+                session.add(Item(trip_id=ids[int(row["trip_id"])], title=row["title"], time=row["time"] or None,
+                                 note=row["note"] or None, sort_order=int(row["sort_order"])))
+        session.commit()
+
+
+def contents(user_id: int) -> list:
+    with ReadSessionLocal() as s:
+        trips = s.execute(select(Trip.title, Trip.sort_order).where(Trip.user_id == user_id)
+                          .order_by(Trip.sort_order, Trip.id)).all()
+        items = s.execute(select(Item.title, Item.date, Item.time, Item.note, Item.sort_order)
+                          .join(Trip, Trip.id == Item.trip_id).where(Trip.user_id == user_id)
+                          .order_by(Trip.sort_order, Trip.id, Item.sort_order, Item.id)).all()
+    return [tuple(r) for r in trips] + [tuple(r) for r in items]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=1_000_000)
+    ap.add_argument("--naive", type=int, default=50_000, help="比較用の素朴な実装で扱う件数")
+    args = ap.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    with engine.begin() as conn:
+        fts = search.installed(conn)
+        if fts:
+            for name in search._TRIGGERS:  # 元データはトリガーなしで入れる
+                conn.exec_driver_sql(f"DROP TRIGGER {name}")
+    n = seed(args.items)
+    print(f"{n} items in {TRIPS} trips  (sqlite {TMP})\n")
+
+    trips_csv, items_csv, nd = TMP / "trips.csv", TMP / "items.csv", TMP / "all.ndjson"
+    measure("export trips.csv", TRIPS, lambda: export_to(trips_csv, lambda s: transfer.export_csv(s, "trips", 1)))
+    measure("export items.csv (streaming)", n, lambda: export_to(items_csv, lambda s: transfer.export_csv(s, "items", 1)))
+    measure("export .ndjson (streaming)", n + TRIPS, lambda: export_to(nd, lambda s: transfer.export_ndjson(s, 1)))
+    measure("export items.csv (list in memory)", n, lambda: export_naive(TMP / "naive.csv"))
+    print(f"  sizes: items.csv {items_csv.stat().st_size / 2**20:.1f} MiB, all.ndjson {nd.stat().st_size / 2**20:.1f} MiB\n")
+
+    counts = measure("import csv (no search triggers)", n + TRIPS, lambda: import_from(2, trips_csv, items_csv),
+                     reset=lambda: clear(2))
+    ok = counts == {"trips": TRIPS, "items": n} and contents(1) == contents(2)
+    print(f"  [{'ok' if ok else 'NG'}] imported rows match the source (values and sort_order)")
+    if fts:
+        clear(2)
+        with engine.begin() as conn:
+            search.install(conn)
+        measure("import csv (search triggers on)", n + TRIPS, lambda: import_from(2, trips_csv, items_csv),
+                reset=lambda: clear(2))
+    m = min(args.naive, n)
+    measure("import ORM add() one by one", m + TRIPS, lambda: import_naive(3, trips_csv, items_csv, m),
+            reset=lambda: clear(3))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
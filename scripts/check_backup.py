@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# scripts/check_backup.py
+# オンラインバックアップ（services.backup）を書き込みが続いている最中に取り、整合していることを確かめる。
+#   1. 一時 DB に項目を N 件入れ、書き込みスレッドがアプリと同じ書き込みエンジンで 1 トランザクションずつ
+#      「項目を 2 件（別々の旅行に）追加 + users.trips_revision に通し番号」を書き続ける
+#   2. その間に小さいステップ（--pages）でスナップショットを何度か取る。やり直しの回数と、
+#      バックアップ中／なしの書き込み 1 回あたりの時間（p50 / p99 / max）を並べる
+#   3. 各スナップショット：integrity_check / foreign_key_check が通る、通し番号 n に対して w1..wn の項目が
+#      2 件ずつちょうど揃っている（途中のトランザクションが半分だけ入っていない）
+#   4. 復元：書き込みを止めて最初のスナップショットを書き戻し、中身がスナップショットと一致する、
+#      戻す前の DB が pre-restore として残る、同期の floor が戻す前のカーソルより先に進む
+#   5. 保持数（keep）を超えた古いものが消える、定期実行のタスクが間隔ごとに取る
+#   python scripts/check_backup.py [--items 200000] [--snapshots 3] [--pages 64]
+
+import argparse, asyncio, gzip, os, shutil, sqlite3, statistics, sys, tempfile, threading, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+TMP = Path(tempfile.mkdtemp())
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP / 'travel.db'}"
+os.environ["PAGE_CACHE_DB"] = str(TMP / "page_cache.db")
+
+from app import models  # noqa: E402,F401
+from app.db import Base, engine  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.models import SORT_GAP  # noqa: E402
+from app.services import backup, changelog  # noqa: E402
+
+OUT = TMP / "backups"
+TRIPS = 100
+failed = []
+
+
+def report(ok: bool, label: str) -> None:
+    print(f"[{'ok' if ok else 'NG'}] {label}")
+    if not ok:
+        failed.append(label)
+
+
+def seed(n_items: int) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO users(login_id, login_id_norm, password_hash, email_verified, trips_revision, changes_floor)"
+            " VALUES ('backup', 'backup', 'x', 0, 0, 0)")
+        conn.exec_driver_sql("INSERT INTO trips(user_id, title, sort_order, revision) VALUES (1, ?, ?, 0)",
+                             [(f"旅行 {t}", t * SORT_GAP) for t in range(TRIPS)])
+        per_trip = n_items // TRIPS
+        conn.exec_driver_sql(
+            "INSERT INTO items(trip_id, title, note, sort_order) VALUES (?, ?, ?, ?)",
+            [(t, f"既存 {t}-{k}", "メモ " * 10, k * SORT_GAP) for t in range(1, TRIPS + 1) for k in range(per_trip)])
+
+
+class Writer(threading.Thread):
+    # 書き込みを続けるスレッド。times に 1 トランザクションの時間（ms）と、そのときバックアップ中だったか
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.n = 0
+        self.times: list[tuple[float, bool]] = []
+        self.backing_up = False
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            n = self.n + 1
+            t0 = time.perf_counter()
+            with engine.begin() as conn:
+                conn.exec_driver_sql(
+                    "INSERT INTO items(trip_id, title, sort_order) VALUES (?, ?, ?), (?, ?, ?)",
+                    (1 + n % TRIPS, f"w{n}", 10**9 + n, 1 + (n + 1) % TRIPS, f"w{n}", 10**9 + n))
+                conn.exec_driver_sql("UPDATE users SET trips_revision = ? WHERE id = 1", (n,))
+                changelog.record(conn, 1, [(changelog.TRIP_ORDER, 1)])
+            self.times.append(((time.perf_counter() - t0) * 1000, self.backing_up))
+            self.n = n
+            time.sleep(0.001)
+
+
+def consistent(path: Path) -> tuple[bool, int, int]:
+    # (通し番号と w 項目が揃っているか, 通し番号, 項目数)
+    raw = TMP / "verify.db"
+    with gzip.open(path, "rb") as f, open(raw, "wb") as out:
+        shutil.copyfileobj(f, out)
+    conn = sqlite3.connect(raw)
+    try:
+        n = conn.execute("SELECT trips_revision FROM users WHERE id = 1").fetchone()[0]
+        written = conn.execute("SELECT title, count(*) FROM items WHERE title LIKE 'w%' GROUP BY title").fetchall()
+        items = conn.execute("SELECT count(*) FROM items").fetchone()[0]
+    finally:
+        conn.close()
+        raw.unlink()
+    return dict(written) == {f"w{k}": 2 for k in range(1, n + 1)}, n, items
+
+
+def percentiles(times: list[float]) -> str:
+    if not times:
+        return "-"
+    times = sorted(times)
+    return (f"p50 {statistics.median(times):.2f} ms, p99 {times[int(len(times) * 0.99)]:.2f} ms,"
+            f" max {times[-1]:.2f} ms ({len(times)} tx)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=200_000)
+    ap.add_argument("--snapshots", type=int, default=3)
+    ap.add_argument("--pages", type=int, default=64, help="1 ステップのページ数（小さいほど書き込みと重なる）")
+    args = ap.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    seed(args.items)
+    db_path = backup.database_path()
+    print(f"db {db_path.stat().st_size / 2**20:.1f} MiB, {args.items} items\n")
+
+    writer = Writer()
+    writer.start()
+    time.sleep(1.0)  # バックアップなしの書き込み時間
+    taken = []
+    for _ in range(args.snapshots):
+        started = writer.n
+        writer.backing_up = True
+        snap = backup.take(db_path, OUT, keep=None, pages=args.pages, sleep_ms=1)
+        writer.backing_up = False
+        taken.append((snap, started))
+        print(f"  {snap.path.name}: {snap.pages} pages, {snap.size / 2**20:.1f} MiB gz, {snap.seconds:.2f} s,"
+              f" restarts {snap.restarts}, writer at #{writer.n}")
+        time.sleep(0.3)
+    writer.stopped.set()
+    writer.join()
+
+    print(f"  writes without backup: {percentiles([t for t, b in writer.times if not b])}")
+    print(f"  writes during backup:  {percentiles([t for t, b in writer.times if b])}")
+    report(any(b for _, b in writer.times), "writes kept committing while snapshots were taken")
+    report(all(not backup.check(s.path) for s, _ in taken), "every snapshot passes integrity_check / foreign_key_check")
+    results = [consistent(s.path) for s, _ in taken]
+    report(all(ok for ok, _, _ in results),
+           "every snapshot holds whole transactions only (" + ", ".join(f"#{n}" for _, n, _ in results) + ")")
+    report(all(n > started for (_, n, _), (_, started) in zip(results, taken)),
+           "snapshots include writes committed after the copy started")
+
+    # 復元（最初のスナップショットへ）。サーバーは止まっている前提なのでエンジンを閉じてから
+    with engine.connect() as conn:
+        seq = conn.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").scalar()
+    engine.dispose()
+    target = taken[0][0]
+    before = backup.restore(target.path, db_path, OUT)
+    backup.clear_page_cache()
+    conn = sqlite3.connect(db_path)
+    try:
+        n = conn.execute("SELECT trips_revision FROM users WHERE id = 1").fetchone()[0]
+        items = conn.execute("SELECT count(*) FROM items").fetchone()[0]
+        floor = conn.execute("SELECT changes_floor FROM users WHERE id = 1").fetchone()[0]
+        integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    report((n, items) == results[0][1:] and integrity == "ok",
+           f"restore brings back snapshot #{results[0][1]} ({items} items)")
+    report(before is not None and before.exists() and before not in backup.snapshots(OUT, db_path.stem),
+           "the database before the restore is kept as pre-restore (outside retention)")
+    report(floor > seq, f"sync floor {floor} is past every cursor issued before the restore ({seq})")
+
+    # 保持
+    for _ in range(4):
+        backup.take(db_path, OUT, keep=3, pages=args.pages)
+    report(len(backup.snapshots(OUT, db_path.stem)) == 3, "retention keeps the newest 3 snapshots")
+
+    # 定期実行
+    async def scheduled():
+        backup.BACKUP_INTERVAL_MIN, backup.BACKUP_DIR = 0.5 / 60, str(OUT)
+        before = backup.SNAPSHOTS.value
+        await backup.start()
+        deadline = time.monotonic() + 60
+        while backup.SNAPSHOTS.value - before < 2 and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        await backup.stop()
+        return backup.SNAPSHOTS.value - before
+    report(asyncio.run(scheduled()) >= 2, "the scheduled task takes a snapshot every interval")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# scripts/check_full_render_cleanup.py
+# 全件表示（?all=1）で流し始める前に失敗したとき、読み取り用セッション（の接続）が閉じられることの確認。
+# 接続を借りたあとの版の読み込み・旅行の見出しの読み込みで例外を起こし、応答が 500 になったあとで
+# 読み取り用エンジンのプールから借りたままの接続が残っていないこと。正常な取得の後も同じ。
+#   python scripts/check_full_render_cleanup.py
+
+import os, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # テンプレートの相対パス用
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'cleanup.db'}"
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ["PAGE_CACHE"] = "off"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from app.db import SessionLocal, read_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import User  # noqa: E402
+from app.routers.auth import seed_template_for_user  # noqa: E402
+from app.services import pages, revisions  # noqa: E402
+from app.services.passwords import hash_password_sync  # noqa: E402
+
+failed = []
+
+
+def report(ok: bool, label: str) -> None:
+    print(f"[{'ok' if ok else 'NG'}] {label}")
+    if not ok:
+        failed.append(label)
+
+
+def broken(session, *_a):
+    # 接続を借りてから失敗する
+    session.execute(text("SELECT 1"))
+    raise RuntimeError("database is locked")
+
+
+def main():
+    with TestClient(app, raise_server_exceptions=False) as c:
+        with SessionLocal() as s:
+            u = User(login_id="cleanup", login_id_norm="cleanup", password_hash=hash_password_sync("password1"))
+            s.add(u); s.flush(); seed_template_for_user(s, u); s.commit()
+            trip_id = u.trips[0].id
+        c.post("/login", data={"login_id": "cleanup", "password": "password1"})
+
+        for path, module, name in (("/trips?all=1", revisions, "list_revision"),
+                                   (f"/trips/{trip_id}?all=1", pages, "trip_header")):
+            original = getattr(module, name)
+            setattr(module, name, broken)
+            try:
+                r = c.get(path)
+            finally:
+                setattr(module, name, original)
+            report(r.status_code == 500 and read_engine.pool.checkedout() == 0,
+                   f"{path} failing in {name} -> {r.status_code}, {read_engine.pool.checkedout()} connections left")
+            r = c.get(path)
+            report(r.status_code == 200 and read_engine.pool.checkedout() == 0,
+                   f"{path} afterwards -> {r.status_code}, {read_engine.pool.checkedout()} connections left")
+        r = c.get("/trips/999999?all=1")
+        report(r.status_code == 404 and read_engine.pool.checkedout() == 0, f"a missing trip -> {r.status_code}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
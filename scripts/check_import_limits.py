@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# scripts/check_import_limits.py
+# 画面からの取り込み（POST /import）の確認。
+#   - Content-Length が IMPORT_MAX_BYTES を超える／行数が IMPORT_MAX_ROWS を超えると 413、何も書かない
+#   - 不正な行がファイルの最後にあっても、書き込みスレッドには 1 チャンクも渡らない（検証が先に全部終わる）
+#   - 検証済みの行はチャンク（IMPORT_CHUNK 行）ごとに別々の run_write で書かれ、中身は元と一致する
+#   - 途中のチャンクで失敗したら書いた分は消え、一覧の版は進む（途中の一覧がキャッシュに残らない）
+#   python scripts/check_import_limits.py
+
+import io, os, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # テンプレートの相対パス用
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'import.db'}"
+os.environ.setdefault("SESSION_BACKEND", "memory")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Item, Trip, User  # noqa: E402
+from app.services import transfer  # noqa: E402
+from app.services.passwords import hash_password_sync  # noqa: E402
+
+TRIPS, ITEMS = 10, 25
+failed = []
+
+
+def report(ok: bool, label: str) -> None:
+    print(f"[{'ok' if ok else 'NG'}] {label}")
+    if not ok:
+        failed.append(label)
+
+
+def files(bad_last: bool = False) -> dict:
+    trips = "id,user_id,title,start_date,end_date,description,sort_order\n" + "".join(
+        f"{t},1,旅行 {t},2025-05-01,,説明,{t * 1024}\n" for t in range(1, TRIPS + 1))
+    items = "id,trip_id,title,date,time,note,sort_order\n" + "".join(
+        f"{k},{k % TRIPS + 1},項目 {k},,09:00,,{k * 1024}\n" for k in range(1, ITEMS + 1))
+    if bad_last:
+        items += f"{ITEMS + 1},1,,,,,0\n"  # title が空
+    return {"trips": ("trips.csv", io.BytesIO(trips.encode()), "text/csv"),
+            "items": ("items.csv", io.BytesIO(items.encode()), "text/csv")}
+
+
+def stored(user_id: int) -> tuple[int, int, int]:
+    # (旅行数, 項目数, 一覧の版)
+    with SessionLocal() as s:
+        trips = s.execute(select(func.count()).select_from(Trip).where(Trip.user_id == user_id)).scalar()
+        items = s.execute(select(func.count()).select_from(Item).join(Trip, Trip.id == Item.trip_id)
+                          .where(Trip.user_id == user_id)).scalar()
+        return trips, items, s.get(User, user_id).trips_revision
+
+
+def main():
+    calls = []
+    write_chunk = transfer.write_chunk
+
+    def counted(session, user_id, chunk, trip_ids):
+        calls.append(len(chunk[1]))
+        return write_chunk(session, user_id, chunk, trip_ids)
+
+    transfer.write_chunk = counted
+    with TestClient(app, raise_server_exceptions=False) as c:
+        with SessionLocal() as s:
+            u = User(login_id="importer", login_id_norm="importer", password_hash=hash_password_sync("password1"))
+            s.add(u); s.commit()
+            user_id = u.id
+        c.post("/login", data={"login_id": "importer", "password": "password1"})
+        before = stored(user_id)
+
+        max_bytes, transfer.IMPORT_MAX_BYTES = transfer.IMPORT_MAX_BYTES, 200
+        r = c.post("/import", files=files())
+        transfer.IMPORT_MAX_BYTES = max_bytes
+        report(r.status_code == 413 and r.json()["ok"] is False, f"an upload over IMPORT_MAX_BYTES -> {r.status_code}")
+
+        max_rows, transfer.IMPORT_MAX_ROWS = transfer.IMPORT_MAX_ROWS, TRIPS + ITEMS - 1
+        r = c.post("/import", files=files())
+        transfer.IMPORT_MAX_ROWS = max_rows
+        report(r.status_code == 413 and "rows" in r.json()["error"]["detail"],
+               f"more rows than IMPORT_MAX_ROWS -> {r.status_code} {r.json()['error']}")
+
+        r = c.post("/import", files=files(bad_last=True))
+        report(r.status_code == 422 and r.json()["error"]["line"] == ITEMS + 2,
+               f"a bad last row -> {r.status_code} {r.json()['error']}")
+        report(not calls and stored(user_id) == before, "nothing reached the writer before validation finished")
+
+        chunk, transfer.IMPORT_CHUNK = transfer.IMPORT_CHUNK, 4
+        r = c.post("/import", files=files())
+        report(r.status_code == 200 and r.json() == {"ok": True, "trips": TRIPS, "items": ITEMS},
+               f"import in chunks of 4 -> {r.status_code} {r.json()}")
+        report(len(calls) > 2 and max(calls) <= 4 and sum(calls) == TRIPS + ITEMS,
+               f"one write per chunk ({len(calls)} writes: {calls})")
+        after = stored(user_id)
+        report(after[:2] == (TRIPS, ITEMS) and after[2] != before[2], f"rows and revision after the import {after}")
+
+        # 3 つ目のチャンクで失敗
+        calls.clear()
+
+        def flaky(session, user_id, chunk, trip_ids):
+            calls.append(len(chunk[1]))
+            if len(calls) == 3:
+                raise RuntimeError("disk full")
+            return write_chunk(session, user_id, chunk, trip_ids)
+
+        transfer.write_chunk = flaky
+        r = c.post("/import", files=files())
+        transfer.write_chunk, transfer.IMPORT_CHUNK = write_chunk, chunk
+        left = stored(user_id)
+        report(r.status_code == 500 and left[:2] == after[:2] and left[2] != after[2],
+               f"a failed chunk removes what was written and moves the revision on -> {r.status_code} {left}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
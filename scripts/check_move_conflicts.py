@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# scripts/check_move_conflicts.py
+# 1 件移動（services.ordering.move_trip / move_item）に食い違った前後が来たときの確認。
+# 古いタブからのドラッグなどで prev が next より後ろにある組（交差した組）を送ると、
+# 振り直し（rebalance）をしても間に入れる位置がない。500 ではなく 409 を返し、並びが変わらないこと。
+#   - ordering の関数は None を返す
+#   - 画面の並べ替え API（/trips/move・/trips/{id}/items/move）は 409
+#   - POST /api/v1/batch は操作ごとのエラー（index と 409）を返し、同じバッチの他の操作も反映しない
+#   python scripts/check_move_conflicts.py
+
+import os, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # テンプレートの相対パス用
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'move.db'}"
+os.environ.setdefault("SESSION_BACKEND", "memory")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import SORT_GAP, Item, Trip, User  # noqa: E402
+from app.services import ordering  # noqa: E402
+from app.services.passwords import hash_password_sync  # noqa: E402
+
+failed = []
+
+
+def report(ok: bool, label: str) -> None:
+    print(f"[{'ok' if ok else 'NG'}] {label}")
+    if not ok:
+        failed.append(label)
+
+
+def seed() -> tuple[int, list[int], list[int]]:
+    # (user_id, 旅行の id（並び順）, 1 件目の旅行の項目の id（並び順）)
+    with SessionLocal() as s:
+        u = User(login_id="mover", login_id_norm="mover", password_hash=hash_password_sync("password1"))
+        s.add(u); s.flush()
+        trips = [Trip(user_id=u.id, title=f"旅行 {k}", sort_order=(k + 1) * SORT_GAP) for k in range(4)]
+        s.add_all(trips); s.flush()
+        items = [Item(trip_id=trips[0].id, title=f"項目 {k}", sort_order=(k + 1) * SORT_GAP) for k in range(4)]
+        s.add_all(items)
+        s.commit()
+        return u.id, [t.id for t in trips], [i.id for i in items]
+
+
+def order(model, *where) -> list[int]:
+    with SessionLocal() as s:
+        return list(s.execute(select(model.id).where(*where).order_by(model.sort_order, model.id)).scalars())
+
+
+def main():
+    with TestClient(app) as c:
+        user_id, trips, items = seed()
+        c.post("/login", data={"login_id": "mover", "password": "password1"})
+        trip_order, item_order = order(Trip, Trip.user_id == user_id), order(Item, Item.trip_id == trips[0])
+
+        # 関数を直接：trips[0] を「trips[3] の後・trips[1] の前」へ（交差）
+        with SessionLocal() as s:
+            moved = ordering.move_trip(s, user_id, trips[0], trips[3], trips[1])
+            s.rollback()
+        report(moved is None, "move_trip with a crossed prev/next returns None")
+        with SessionLocal() as s:
+            moved = ordering.move_item(s, user_id, trips[0], items[0], items[3], items[1])
+            s.rollback()
+        report(moved is None, "move_item with a crossed prev/next returns None")
+
+        r = c.post("/trips/move", json={"id": trips[0], "prev": trips[3], "next": trips[1]})
+        report(r.status_code == 409, f"POST /trips/move with a crossed pair -> {r.status_code}")
+        r = c.post(f"/trips/{trips[0]}/items/move", json={"id": items[0], "prev": items[3], "next": items[1]})
+        report(r.status_code == 409, f"POST /trips/{{id}}/items/move with a crossed pair -> {r.status_code}")
+        report(order(Trip, Trip.user_id == user_id) == trip_order
+               and order(Item, Item.trip_id == trips[0]) == item_order, "the order is unchanged")
+
+        # バッチ：1 件目（改名）は正しいが、2 件目の移動が交差 → 全体が 409、改名も残らない
+        for label, op in (
+            ("move_trip", {"op": "move_trip", "id": trips[0], "prev": trips[3], "next": trips[1]}),
+            ("move_item", {"op": "move_item", "trip_id": trips[0], "id": items[0], "prev": items[3], "next": items[1]}),
+        ):
+            r = c.post("/api/v1/batch", json={"ops": [{"op": "update_trip", "id": trips[2], "title": "改名"}, op]})
+            body = r.json()
+            report(r.status_code == 409 and body.get("ok") is False
+                   and body.get("error") == {"index": 1, "status": 409, "detail": "stale neighbours"},
+                   f"batch {label} with a crossed pair -> {r.status_code} {body.get('error')}")
+        with SessionLocal() as s:
+            title = s.get(Trip, trips[2]).title
+        report(title == "旅行 2" and order(Trip, Trip.user_id == user_id) == trip_order
+               and order(Item, Item.trip_id == trips[0]) == item_order, "a failed batch leaves nothing behind")
+
+        # 正しい組はそのまま通る
+        r = c.post("/trips/move", json={"id": trips[0], "prev": trips[1], "next": trips[2]})
+        report(r.status_code == 200 and order(Trip, Trip.user_id == user_id)[:3] == [trips[1], trips[0], trips[2]],
+               "a valid pair still moves the trip")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# scripts/check_query_counts.py
+# 画面 1 リクエストあたりの SQL 文の数を数えて固定値と比較する（増えたら終了コード 1）。
+# 条件付き GET（ETag 一致で 304）の件数と、更新後・デプロイ後（build_token が変わる）に ETag が変わることも確かめる。
+# 一時 DB に対して TestClient で実際にルートを叩く（httpx が必要）。
+#   python scripts/check_query_counts.py [-v]
+
+import argparse, os, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # テンプレートの相対パス用
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'counts.db'}"
+os.environ.setdefault("SESSION_BACKEND", "memory")  # セッション表の読み書きは数えない（別 DB）
+os.environ["PAGE_CACHE"] = "off"  # 描画キャッシュに当たると 0 件になるので、常に描画側を数える
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.services.passwords import hash_password_sync  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.db import SessionLocal, async_read_engine, engine, read_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import User  # noqa: E402
+from app.routers.auth import seed_template_for_user  # noqa: E402
+from app.services import revisions  # noqa: E402
+
+# パス → 期待する SQL 文の数
+EXPECTED = {
+    "/trips": 2,            # 版（ETag）+ カード一覧（ユーザーはセッションのプリンシパル）
+    "/trips/{trip_id}": 1,  # trip ⟕ items（版も同じ行から）
+}
+
+# If-None-Match が一致したとき：版を 1 行読むだけで 304（項目の読み込み・描画なし）
+CONDITIONAL = {
+    "/trips": 1,
+    "/trips/{trip_id}": 1,
+}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, *_a):
+        statements.append(statement)
+
+    # 読み取り用と書き込み用、同期・非同期のすべてを数える（同じエンジンなら 1 回だけ）
+    for eng in {engine, read_engine, async_read_engine.sync_engine}:
+        event.listen(eng, "before_cursor_execute", _record)
+
+    failed = 0
+    with TestClient(app) as client:
+        with SessionLocal() as s:
+            u = User(login_id="counts", login_id_norm="counts", password_hash=hash_password_sync("password1"))
+            s.add(u); s.flush()
+            seed_template_for_user(s, u)
+            s.commit()
+            trip_id = u.trips[0].id
+        client.post("/login", data={"login_id": "counts", "password": "password1"})
+
+        for route, expected in EXPECTED.items():
+            statements.clear()
+            r = client.get(route.format(trip_id=trip_id))
+            n = len(statements)
+            ok = r.status_code == 200 and n == expected
+            failed += not ok
+            print(f"[{'ok' if ok else 'NG'}] {route}: {n} statements (expected {expected}, status {r.status_code})")
+            if not ok or args.verbose:
+                for st in statements:
+                    print("      " + " ".join(st.split())[:160])
+
+        for route, expected in CONDITIONAL.items():
+            path = route.format(trip_id=trip_id)
+            etag = client.get(path).headers.get("etag")
+            statements.clear()
+            r = client.get(path, headers={"If-None-Match": etag or ""})
+            n = len(statements)
+            ok = etag is not None and r.status_code == 304 and not r.content and n == expected
+            failed += not ok
+            print(f"[{'ok' if ok else 'NG'}] {route} (If-None-Match): {n} statements "
+                  f"(expected {expected}, status {r.status_code})")
+            if not ok or args.verbose:
+                for st in statements:
+                    print("      " + " ".join(st.split())[:160])
+
+        # 更新すると ETag が変わる（古い ETag では 200 が返る）
+        detail = f"/trips/{trip_id}"
+        etags = {p: client.get(p).headers.get("etag") for p in ("/trips", detail)}
+        client.post(f"{detail}/edit", data={"title": "etag"})
+        for p, old in etags.items():
+            r = client.get(p, headers={"If-None-Match": old or ""})
+            ok = r.status_code == 200 and r.headers.get("etag") != old
+            failed += not ok
+            print(f"[{'ok' if ok else 'NG'}] {p} after edit: status {r.status_code}")
+
+        # デプロイ（テンプレート・アセットの変更）でも ETag が変わる
+        etags = {p: client.get(p).headers.get("etag") for p in ("/trips", detail)}
+        revisions.set_build("nextdeploy")
+        for p, old in etags.items():
+            r = client.get(p, headers={"If-None-Match": old or ""})
+            ok = r.status_code == 200 and "nextdeploy" in r.headers.get("etag", "")
+            failed += not ok
+            print(f"[{'ok' if ok else 'NG'}] {p} after a new build: status {r.status_code}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# scripts/check_query_plans.py
+# ホットなクエリの実行計画チェック（SQLite の EXPLAIN QUERY PLAN）。
+# 一時 B-tree ソート（USE TEMP B-TREE）や全件走査（SCAN）に落ちたら終了コード 1。
+#   python scripts/check_query_plans.py [-v]
+
+import argparse, sys, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import create_engine, select, text, tuple_  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db import Base  # noqa: E402
+from app.models import User, Trip, Item, SORT_GAP  # noqa: E402
+from app.services import ordering  # noqa: E402
+
+
+def is_bad(step: str) -> bool:
+    # SCAN CONSTANT ROW は FROM なしの SELECT（スカラーサブクエリの外側）なので対象外
+    return "TEMP B-TREE" in step or (step.startswith("SCAN ") and step != "SCAN CONSTANT ROW")
+
+
+def hot_queries(user_id: int, trip_id: int):
+    # (名前, ステートメント) — 画面・並べ替え・末尾追加で毎回走るもの
+    return [
+        ("trips_list", select(Trip).where(Trip.user_id == user_id).order_by(Trip.sort_order, Trip.id)),
+        ("trip_items", select(Item).where(Item.trip_id == trip_id).order_by(Item.sort_order, Item.id)),
+        ("trip_detail", select(Trip.id, Item.id).outerjoin(Item, Item.trip_id == Trip.id)
+            .where(Trip.id == trip_id, Trip.user_id == user_id).order_by(Item.sort_order, Item.id)),
+        ("items_page", select(Item.id).where(Item.trip_id == trip_id, tuple_(Item.sort_order, Item.id) > tuple_(SORT_GAP, 0))
+            .order_by(Item.sort_order, Item.id).limit(100)),
+        ("trips_page", select(Trip.id).where(Trip.user_id == user_id, tuple_(Trip.sort_order, Trip.id) > tuple_(SORT_GAP, 0))
+            .order_by(Trip.sort_order, Trip.id).limit(60)),
+        ("trip_append_key", select(ordering.trip_append_key(user_id))),
+        ("item_append_key", select(ordering.item_append_key(trip_id))),
+        ("rebalance_items", select(Item.id).where(Item.trip_id == trip_id).order_by(Item.sort_order, Item.id)),
+    ]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    path = Path(tempfile.mkdtemp()) / "plans.db"
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine, future=True)
+    with SessionLocal() as s:
+        # 統計が偏らない程度のデータを入れて ANALYZE
+        users = [User(login_id=f"u{i}", login_id_norm=f"u{i}", password_hash="x") for i in range(20)]
+        s.add_all(users); s.flush()
+        trips = [Trip(user_id=u.id, title="t", sort_order=(n + 1) * SORT_GAP) for u in users for n in range(10)]
+        s.add_all(trips); s.flush()
+        s.add_all([Item(trip_id=t.id, title="i", sort_order=(n + 1) * SORT_GAP) for t in trips for n in range(20)])
+        s.commit()
+        s.execute(text("ANALYZE"))
+        uid, tid = users[0].id, trips[0].id
+
+    failed = 0
+    with engine.connect() as conn:
+        for name, stmt in hot_queries(uid, tid):
+            compiled = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")]
+            bad = [p for p in plan if is_bad(p)]
+            status = "NG" if bad else "ok"
+            failed += bool(bad)
+            print(f"[{status}] {name}")
+            if bad or args.verbose:
+                for p in plan:
+                    print(f"      {p}")
+    engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# scripts/check_sync_replay.py
+# 差分同期（GET /api/v1/sync）の検証。一時 DB に対して画面のフォーム・並べ替え API・/api/v1 の単発／バッチを
+# 乱数で混ぜて更新し、その合間に端末役のクライアントが since=<cursor> で差分だけを取り込む。
+# 取り込んだ手元の状態が DB の内容（旅行・項目の全列と並び順）と完全に一致することを確かめる。
+#   - 少ない limit でページ送り（more）を通す
+#   - 途中で圧縮（同じ行の古い記録を消す）しても、そのまま差分で追いつけること
+#   - 保持期間切れの圧縮後は reset（全件）で取り直すこと
+#   - 途中から参加したクライアント（since=0）も一致すること
+#   python scripts/check_sync_replay.py [--steps 400] [--seed 1]
+
+import argparse, os, random, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # テンプレートの相対パス用
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'sync.db'}"
+os.environ.setdefault("SESSION_BACKEND", "memory")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.db import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Change, Item, Trip, User  # noqa: E402
+from app.routers.auth import seed_template_for_user  # noqa: E402
+from app.services import changelog  # noqa: E402
+from app.services.passwords import hash_password_sync  # noqa: E402
+
+TRIP_FIELDS = ("title", "start_date", "end_date", "description", "sort_order")
+ITEM_FIELDS = ("trip_id", "title", "date", "time", "note", "sort_order")
+
+
+class Replica:
+    # 端末側：SyncOut をそのまま当てるだけの手元の状態
+    def __init__(self, client: TestClient, limit: int):
+        self.client, self.limit = client, limit
+        self.cursor = 0
+        self.trips: dict[int, dict] = {}
+        self.items: dict[int, dict] = {}
+        self.resets = self.pulls = 0
+
+    def pull(self) -> None:
+        while True:
+            d = self.client.get("/api/v1/sync", params={"since": self.cursor, "limit": self.limit}).json()
+            self.pulls += 1
+            if d["reset"]:
+                self.trips, self.items = {}, {}
+                self.resets += 1
+            for t in d["trips"]:
+                self.trips[t["id"]] = {k: t[k] for k in TRIP_FIELDS}
+            for it in d["items"]:
+                self.items[it["id"]] = {k: it[k] for k in ITEM_FIELDS}
+            for tid in d["deleted_trips"]:
+                self.trips.pop(tid, None)
+                self.items = {i: it for i, it in self.items.items() if it["trip_id"] != tid}
+            for iid in d["deleted_items"]:
+                self.items.pop(iid, None)
+            for tid, key in d["trip_order"] or []:
+                if tid in self.trips:
+                    self.trips[tid]["sort_order"] = key
+            for pairs in d["item_order"].values():
+                for iid, key in pairs:
+                    if iid in self.items:
+                        self.items[iid]["sort_order"] = key
+            self.cursor = d["cursor"]
+            if not d["more"]:
+                return
+
+
+def db_state(user_id: int) -> tuple[dict, dict]:
+    with SessionLocal() as s:
+        trips = {t.id: {k: getattr(t, k) for k in TRIP_FIELDS}
+                 for t in s.execute(select(Trip).where(Trip.user_id == user_id)).scalars()}
+        items = {i.id: {k: getattr(i, k) for k in ITEM_FIELDS}
+                 for i in s.execute(select(Item).where(Item.trip_id.in_(trips))).scalars()}
+    # API と同じく日付は ISO 文字列で比べる
+    for row in (*trips.values(), *items.values()):
+        for k, v in row.items():
+            if hasattr(v, "isoformat"):
+                row[k] = v.isoformat()
+    return trips, items
+
+
+def check(label: str, replica: Replica, user_id: int) -> None:
+    trips, items = db_state(user_id)
+    ok = replica.trips == trips and replica.items == items
+    print(f"[{'ok' if ok else 'NG'}] {label}: {len(trips)} trips, {len(items)} items, cursor {replica.cursor}")
+    if not ok:
+        for name, mine, real in (("trips", replica.trips, trips), ("items", replica.items, items)):
+            for k in sorted(set(mine) | set(real)):
+                if mine.get(k) != real.get(k):
+                    print(f"    {name} {k}: replica={mine.get(k)} db={real.get(k)}")
+        sys.exit(1)
+
+
+def mutate(c: TestClient, rnd: random.Random, user_id: int, n: int) -> str:
+    trips, items = db_state(user_id)
+    trip_ids = sorted(trips)
+    by_trip: dict[int, list[int]] = {}
+    for iid, it in sorted(items.items(), key=lambda kv: (kv[1]["sort_order"], kv[0])):
+        by_trip.setdefault(it["trip_id"], []).append(iid)
+    kinds = ["form_create_trip", "api_create_item", "form_create_item", "batch"]
+    if trip_ids:
+        kinds += ["form_edit_trip", "api_patch_trip", "form_reorder_trips", "api_move_trip", "form_delete_trip"]
+    if items:
+        kinds += ["form_edit_item", "api_patch_item", "form_reorder_items", "form_move_item"] * 2
+        kinds += ["form_delete_item", "api_delete_item"]
+    kind = rnd.choice(kinds)
+    tid = rnd.choice(trip_ids) if trip_ids else None
+    if kind in ("form_edit_item", "api_patch_item", "form_delete_item", "api_delete_item",
+                "form_reorder_items", "form_move_item"):
+        tid = rnd.choice(sorted(by_trip))
+    ids = by_trip.get(tid, [])
+    iid = rnd.choice(ids) if ids else None
+
+    if kind == "form_create_trip":
+        c.post("/trips", data={"title": f"旅行 {n}", "start_date": "2025-05-01", "description": f"説明 {n}"})
+    elif kind == "form_edit_trip":
+        c.post(f"/trips/{tid}/edit", data={"title": f"編集 {n}", "end_date": "2025-05-03"})
+    elif kind == "api_patch_trip":
+        c.patch(f"/api/v1/trips/{tid}", json={"description": None if n % 3 == 0 else f"API {n}"})
+    elif kind == "form_reorder_trips":
+        shuffled = trip_ids[:]
+        rnd.shuffle(shuffled)
+        c.post("/trips/reorder", json={"ids": shuffled})
+    elif kind == "api_move_trip":
+        others = [t for t in trip_ids if t != tid]
+        if others:
+            prev = rnd.choice(others + [None])
+            c.post("/api/v1/batch", json={"ops": [{"op": "move_trip", "id": tid, "prev": prev, "next": None}]})
+    elif kind == "form_delete_trip":
+        if len(trip_ids) > 2 and rnd.random() < 0.4:
+            c.post(f"/trips/{tid}/delete")
+    elif kind == "form_create_item":
+        c.post(f"/trips/{tid}/items", data={"title": f"項目 {n}", "time": "09:00"})
+    elif kind == "api_create_item":
+        if tid is not None:
+            c.post(f"/api/v1/trips/{tid}/items", json={"title": f"API 項目 {n}", "date": "2025-05-02"})
+    elif kind == "form_edit_item":
+        c.post(f"/trips/{tid}/items/{iid}/edit", data={"title": f"項目編集 {n}", "note": f"メモ {n}"})
+    elif kind == "api_patch_item":
+        c.patch(f"/api/v1/trips/{tid}/items/{iid}", json={"time": f"{n % 24:02d}:00"})
+    elif kind == "form_delete_item":
+        c.post(f"/trips/{tid}/items/{iid}/delete")
+    elif kind == "api_delete_item":
+        c.delete(f"/api/v1/trips/{tid}/items/{iid}")
+    elif kind == "form_reorder_items":
+        shuffled = ids[:]
+        rnd.shuffle(shuffled)
+        c.post(f"/trips/{tid}/items/reorder", json={"ids": shuffled})
+    elif kind == "form_move_item":
+        if len(ids) > 1:
+            others = [i for i in ids if i != iid]
+            k = rnd.randrange(len(others) + 1)
+            prev, nxt = (others[k - 1] if k else None), (others[k] if k < len(others) else None)
+            c.post(f"/trips/{tid}/items/move", json={"id": iid, "prev": prev, "next": nxt})
+    elif kind == "batch":
+        ops = [{"op": "create_trip", "title": f"バッチ {n}", "ref": "t"},
+               {"op": "create_item", "trip_id": "t", "title": "a", "ref": "a"},
+               {"op": "create_item", "trip_id": "t", "title": "b", "ref": "b"},
+               {"op": "reorder_items", "trip_id": "t", "ids": ["b", "a"]},
+               {"op": "update_item", "trip_id": "t", "id": "a", "note": "バッチ"}]
+        if iid is not None:
+            ops.append({"op": "delete_item", "trip_id": tid, "id": iid})
+        c.post("/api/v1/batch", json={"ops": ops})
+    return kind
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--steps", type=int, default=400)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    rnd = random.Random(args.seed)
+
+    with TestClient(app) as c:
+        with SessionLocal() as s:
+            u = User(login_id="syncuser", login_id_norm="syncuser", password_hash=hash_password_sync("password1"))
+            s.add(u); s.flush(); seed_template_for_user(s, u); s.commit()
+            user_id = u.id
+        c.post("/login", data={"login_id": "syncuser", "password": "password1"})
+
+        a = Replica(c, limit=7)
+        a.pull()
+        check("initial snapshot", a, user_id)
+        for n in range(1, args.steps + 1):
+            mutate(c, rnd, user_id, n)
+            if n % 25 == 0:
+                a.pull()
+                check(f"after {n} steps", a, user_id)
+            if n == args.steps // 2:
+                with engine.begin() as conn:
+                    merged, dropped = changelog.compact(conn, retention_days=30)
+                print(f"     compact: merged {merged}, expired {dropped}")
+
+        late = Replica(c, limit=1000)
+        late.pull()
+        check("late client (since=0)", late, user_id)
+
+        # 取り込み前の変更を残したまま全部期限切れにする → 古いカーソルは reset で取り直し
+        for n in range(args.steps + 1, args.steps + 11):
+            mutate(c, rnd, user_id, n)
+        with SessionLocal() as s:
+            logged = len(s.execute(select(Change.id).where(Change.user_id == user_id)).all())
+        with engine.begin() as conn:
+            merged, dropped = changelog.compact(conn, retention_days=-1)
+        print(f"     compact (expire all): merged {merged}, expired {dropped} of {logged}")
+        resets = a.resets
+        a.pull()
+        check("after expiry (reset)", a, user_id)
+        assert a.resets == resets + 1, "expected a reset after the log was expired"
+        for n in range(args.steps + 11, args.steps + 21):
+            mutate(c, rnd, user_id, n)
+        a.pull()
+        check("incremental after reset", a, user_id)
+        assert a.resets == resets + 1, "unexpected reset"
+        late.pull()
+        check("late client after expiry", late, user_id)
+        print(f"pulls: {a.pulls} (limit 7), resets: {a.resets}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# scripts/stress_sqlite.py
+# SQLite の並行読み書きストレス。読み手（旅程詳細の表示）と書き手（並べ替え／移動）を
+# スレッドで同時に走らせ、DB_PROFILE ごとの処理数と "database is locked" の件数を比べる。
+#   python scripts/stress_sqlite.py [--profiles legacy,tuned] [--readers 8] [--writers 4] [--seconds 10]
+
+import argparse, random, sys, tempfile, threading, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db import Base, make_engine  # noqa: E402
+from app.models import User, Trip, Item, SORT_GAP  # noqa: E402
+from app.services import ordering, pages  # noqa: E402
+
+
+def setup(profile: str, users: int, items: int):
+    url = f"sqlite:///{Path(tempfile.mkdtemp()) / 'stress.db'}"
+    engine = make_engine(url, profile)
+    Session = sessionmaker(bind=engine, autoflush=False, future=True)
+    targets, item_ids = seed(Session, users, items)
+    return engine, Session, targets, item_ids
+
+
+def seed(Session, users: int, items: int):
+    # ユーザーごとに trip 1 件 + items 件。((user_id, trip_id) の一覧, trip_id → item id) を返す
+    Base.metadata.create_all(Session.kw["bind"])
+    targets = []
+    with Session() as s:
+        for u in range(users):
+            user = User(login_id=f"stress{u}", login_id_norm=f"stress{u}", password_hash="x")
+            s.add(user); s.flush()
+            trip = Trip(user_id=user.id, title="t", sort_order=SORT_GAP)
+            s.add(trip); s.flush()
+            s.add_all(Item(trip_id=trip.id, title=f"i{i}", sort_order=(i + 1) * SORT_GAP) for i in range(items))
+            targets.append((user.id, trip.id))
+        s.commit()
+        item_ids = {tid: s.execute(select(Item.id).where(Item.trip_id == tid)).scalars().all() for _, tid in targets}
+    return targets, item_ids
+
+
+def run(profile: str, readers: int, writers: int, seconds: float, users: int, items: int) -> dict:
+    engine, Session, targets, item_ids = setup(profile, users, items)
+    stop = threading.Event()
+    stats = {"reads": 0, "writes": 0, "locked": 0, "other": 0}
+    lock = threading.Lock()
+
+    def count(key):
+        with lock:
+            stats[key] += 1
+
+    def attempt(fn):
+        try:
+            fn()
+        except OperationalError as e:
+            count("locked" if "locked" in str(e) or "busy" in str(e) else "other")
+            return False
+        return True
+
+    def reader():
+        while not stop.is_set():
+            uid, tid = random.choice(targets)
+            with Session() as s:
+                if attempt(lambda: pages.trip_detail(s, uid, tid)):
+                    count("reads")
+
+    def writer():
+        while not stop.is_set():
+            uid, tid = random.choice(targets)
+            ids = item_ids[tid]
+            with Session() as s:
+                def op():
+                    if random.random() < 0.5:
+                        shuffled = random.sample(ids, len(ids))
+                        ordering.reorder_items(s, uid, tid, shuffled)
+                    else:
+                        a, b = random.sample(ids, 2)
+                        ordering.move_item(s, uid, tid, a, b, None)
+                    s.commit()
+                if attempt(op):
+                    count("writes")
+                else:
+                    s.rollback()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    spent = time.perf_counter() - t0
+    engine.dispose()
+    return {"profile": profile, **stats, "reads_s": stats["reads"] / spent, "writes_s": stats["writes"] / spent}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profiles", default="legacy,tuned")
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--writers", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--items", type=int, default=200)
+    args = ap.parse_args()
+
+    print(f"{'profile':<9}{'reads/s':>9}{'writes/s':>10}{'locked':>8}{'other':>7}")
+    for profile in args.profiles.split(","):
+        r = run(profile, args.readers, args.writers, args.seconds, args.users, args.items)
+        print(f"{r['profile']:<9}{r['reads_s']:>9.1f}{r['writes_s']:>10.1f}{r['locked']:>8}{r['other']:>7}")
+
+
+if __name__ == "__main__":
+    main()